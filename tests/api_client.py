@@ -0,0 +1,176 @@
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from .metrics import normalize_route
+
+# Размер пула по умолчанию: сколько keep-alive соединений держим на один хост
+DEFAULT_POOL_SIZE = 10
+# Таймаут по умолчанию, если вызывающий код не передал свой
+DEFAULT_TIMEOUT = 10
+# Время установления соединений в текущем потоке за время текущего запроса
+_connect_timing = threading.local()
+
+
+def auth_headers(token):
+    """Стандартные заголовки запроса к API с токеном авторизации."""
+    return {
+        "Authorization": f"Bearer {token}",
+        "Content-Type": "application/json"
+    }
+
+
+class ConnectionStats:
+    """
+    Потокобезопасные счетчики соединений клиента.
+    opened - сколько раз реально устанавливалось TCP/TLS соединение,
+    requests - сколько HTTP запросов отправлено; разница - переиспользованные соединения.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.requests = 0
+
+    def record_connect(self):
+        with self._lock:
+            self.opened += 1
+
+    def record_request(self):
+        with self._lock:
+            self.requests += 1
+
+    @property
+    def reused(self):
+        return max(self.requests - self.opened, 0)
+
+    def as_dict(self):
+        with self._lock:
+            return {"opened": self.opened, "requests": self.requests, "reused": max(self.requests - self.opened, 0)}
+
+
+def _counting_pool_class(pool_cls, connection_cls, stats):
+    """
+    Создает класс пула urllib3, соединения которого отмечают каждое установление в stats
+    и добавляют его длительность к счетчику текущего потока.
+    """
+
+    class CountingConnection(connection_cls):
+        def connect(self):
+            stats.record_connect()
+            started = time.perf_counter()
+            try:
+                super().connect()
+            finally:
+                _connect_timing.seconds = getattr(_connect_timing, "seconds", 0.0) + time.perf_counter() - started
+
+    return type(f"Counting{pool_cls.__name__}", (pool_cls,), {"ConnectionCls": CountingConnection})
+
+
+class PooledAdapter(HTTPAdapter):
+    """Транспортный адаптер requests, считающий открытые соединения и отправленные запросы."""
+
+    def __init__(self, stats, **kwargs):
+        # stats нужен до super().__init__, так как он вызывает init_poolmanager
+        self.stats = stats
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _counting_pool_class(HTTPConnectionPool, HTTPConnection, self.stats),
+            "https": _counting_pool_class(HTTPSConnectionPool, HTTPSConnection, self.stats),
+        }
+
+    def send(self, request, **kwargs):
+        self.stats.record_request()
+        return super().send(request, **kwargs)
+
+
+class ApiClient(requests.Session):
+    """
+    HTTP-клиент к API Mattermost с общим пулом keep-alive соединений.
+    Заголовок авторизации задается один раз, таймаут по умолчанию применяется,
+    если вызывающий код не передал свой. Счетчики соединений доступны через connection_stats.
+    Если задан recorder (MetricsRecorder), для каждого запроса по его маршруту записываются
+    полное время, время до первого байта ответа и время установления нового соединения.
+    Если задана cassette (Cassette), запросы записываются в нее или воспроизводятся из нее.
+    Если задан limiter (rate_limit.AdaptiveLimiter), запросы идут через его окно конкурентности и частоту,
+    а ответы 429 повторяются; в recorder попадает каждая попытка, повторенные 429 - как сдерживание (throttled).
+    """
+
+    def __init__(self, token=None, pool_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT, recorder=None, cassette=None,
+                 limiter=None):
+        super().__init__()
+        self.default_timeout = timeout
+        self.recorder = recorder
+        self.limiter = limiter
+        self.connection_stats = ConnectionStats()
+        # pool_block=True: при нехватке соединений поток ждет свободное, а не открывает лишнее
+        adapter = PooledAdapter(self.connection_stats, pool_connections=pool_size, pool_maxsize=pool_size, pool_block=True)
+        if cassette is not None:
+            adapter = cassette.adapter(adapter)
+        self.mount("http://", adapter)
+        self.mount("https://", adapter)
+        self.headers.update({"Content-Type": "application/json"})
+        if token:
+            self.set_token(token)
+
+    def set_token(self, token):
+        """Задает токен авторизации для всех последующих запросов клиента."""
+        self.headers.update(auth_headers(token))
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.default_timeout)
+        attempt, delay = 0, 0.0
+        while True:
+            generation = self.limiter.acquire(delay) if self.limiter is not None else None
+            response = None
+            try:
+                response, timing = self._timed_request(method, url, **kwargs)
+            finally:
+                delay = self.limiter.release(generation, response, attempt) if self.limiter is not None else None
+            if timing is not None:
+                # Повторяемый ответ 429 - сдерживание, а не ошибка маршрута: recorder учитывает его отдельно
+                self.recorder.record(timing.pop("route"), timing.pop("duration"), status=response.status_code,
+                                     throttled=delay is not None, **timing)
+            if delay is None:
+                return response
+            response.close()
+            attempt += 1
+
+    def _timed_request(self, method, url, **kwargs):
+        """
+        Выполняет одну попытку запроса; возвращает ответ и его времена для recorder (None без recorder).
+        Попытка, завершившаяся исключением, записывается в recorder сразу.
+        """
+        if self.recorder is None:
+            return super().request(method, url, **kwargs), None
+        route = normalize_route(method, url)
+        _connect_timing.seconds = 0.0
+        started = time.perf_counter()
+        try:
+            response = super().request(method, url, **kwargs)
+        except requests.exceptions.RequestException as e:
+            self.recorder.record(route, time.perf_counter() - started, error=type(e).__name__, connect=_connect_timing.seconds)
+            raise
+        # elapsed у requests - время от отправки запроса до разбора заголовков ответа, включая установление
+        # нового соединения; оно записывается отдельно (connect), поэтому из TTFB вычитается
+        connect = _connect_timing.seconds
+        return response, {"route": route, "duration": time.perf_counter() - started, "connect": connect,
+                          "ttfb": max(response.elapsed.total_seconds() - connect, 0.0)}
+
+
+def login(client, base_url, login_id, password, timeout=15):
+    """
+    Логин через POST /users/login; возвращает токен из заголовка Token.
+    HTTP-ошибки поднимаются как requests.exceptions.HTTPError.
+    """
+    response = client.post(f"{base_url}/api/v4/users/login", json={"login_id": login_id, "password": password}, timeout=timeout)
+    response.raise_for_status()
+    token = response.headers.get("Token")
+    if not token:
+        raise requests.exceptions.HTTPError(f"В ответе на логин нет токена. Статус: {response.status_code}", response=response)
+    return token
@@ -0,0 +1,176 @@
+"""
+Бенчмарки горячих операций тестового набора с проверкой регрессий относительно сохраненного baseline.
+
+Запуск (переменные окружения те же, что у тестов):
+    python -m tests.bench                       # сравнить с tests/perf_baseline.json
+    python -m tests.bench --update-baseline     # записать текущие результаты как новый baseline
+    python -m tests.bench --tolerance 0.3 --p95-tolerance 0.5 --samples 50
+
+Каждая операция сначала прогревается, затем выполняется последовательно заданное число раз.
+Медиана и p95 каждого маршрута API сравниваются с baseline; выход с кодом 1, если какой-либо
+маршрут стал медленнее допуска (и одновременно больше чем на --min-delta-ms).
+Маршруты baseline, которых нет в замере, перечисляются отдельно.
+
+В репозитории лежит baseline, снятый на фейковом сервере (MATTERMOST_FAKE_SERVER=1): он ловит регрессии
+на стороне клиента и тестовой обвязки без Docker. Для настоящего сервера baseline записывается
+с --update-baseline (в тот же файл или в --baseline) и коммитится; сравнивать настоящий сервер
+с baseline фейкового (и наоборот) команда отказывается.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from .api_client import ApiClient
+from .fake_server import SERVER_VERSION as FAKE_SERVER_VERSION
+from .metrics import MetricsRecorder
+from .scenarios import SCENARIOS, ScenarioContext, available_scenarios
+from .token_cache import end_session, session_token
+from . import settings
+
+BASELINE_FORMAT = 1
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "perf_baseline.json")
+# Операции бенчмарка - сценарии, из которых состоят функциональные тесты
+BENCHMARKS = ("login", "create_channel", "post_message", "read_posts", "add_remove_member")
+
+
+def server_version(client):
+    """Версия сервера Mattermost из заголовка X-Version-Id (None, если сервер его не отдает)."""
+    response = client.get(f"{settings.BASE_URL}/api/v4/system/ping", timeout=10)
+    return response.headers.get("X-Version-Id")
+
+
+def run_benchmarks(names=BENCHMARKS, warmup=5, samples=30):
+    """
+    Прогревает и затем замеряет каждую операцию последовательно.
+    Возвращает (сводка MetricsRecorder по маршрутам, версия сервера).
+    """
+    client = ApiClient()
+    anon_client = ApiClient()
+    ctx = ScenarioContext(client, anon_client, settings.BASE_URL, settings.TEAM_ID, settings.LOGIN_ID,
+                          settings.PASSWORD, settings.OTHER_USER_ID)
+    recorder = MetricsRecorder()
+    try:
+        client.set_token(session_token(client, settings.BASE_URL, settings.LOGIN_ID, settings.PASSWORD))
+        version = server_version(client)
+        ctx.setup()
+        for name in available_scenarios({name: 1 for name in names}, settings.OTHER_USER_ID):
+            operation = SCENARIOS[name][0]
+            print(f"Бенчмарк {name}: прогрев {warmup}, замеров {samples}")
+            for _ in range(warmup):
+                operation(ctx)
+            client.recorder = anon_client.recorder = recorder
+            try:
+                for _ in range(samples):
+                    operation(ctx)
+            finally:
+                client.recorder = anon_client.recorder = None
+    finally:
+        # Рабочий канал удаляется, а сессия завершается, даже если операция упала посреди замера
+        try:
+            ctx.teardown()
+        finally:
+            end_session(client, settings.BASE_URL)
+            client.close()
+            anon_client.close()
+    return recorder.summary(), version
+
+
+def compare(current, baseline_routes, tolerance, p95_tolerance, min_delta):
+    """
+    Сравнивает текущие p50/p95 маршрутов с baseline.
+    Возвращает строки сравнения; у регрессировавших маршрутов status == "REGRESSION",
+    у маршрутов baseline, которых нет в текущем замере, - "missing" (без текущих значений).
+    """
+    rows = []
+    for route, stats in current.items():
+        base = baseline_routes.get(route)
+        row = {"route": route, "p50": stats["p50"], "p95": stats["p95"], "status": "new"}
+        if base:
+            row.update(base_p50=base["p50"], base_p95=base["p95"], status="ok")
+            slower_p50 = stats["p50"] > base["p50"] * (1 + tolerance) and stats["p50"] - base["p50"] > min_delta
+            slower_p95 = stats["p95"] > base["p95"] * (1 + p95_tolerance) and stats["p95"] - base["p95"] > min_delta
+            if slower_p50 or slower_p95:
+                row["status"] = "REGRESSION"
+        rows.append(row)
+    for route, base in baseline_routes.items():
+        if route not in current:
+            rows.append({"route": route, "p50": None, "p95": None, "base_p50": base["p50"], "base_p95": base["p95"], "status": "missing"})
+    return rows
+
+
+def load_baseline(path):
+    with open(path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("format") != BASELINE_FORMAT:
+        raise ValueError(f"Неподдерживаемый формат baseline {baseline.get('format')!r} в {path}")
+    return baseline
+
+
+def save_baseline(path, summary, version, samples):
+    baseline = {
+        "format": BASELINE_FORMAT,
+        "server_version": version,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "samples": samples,
+        "routes": {route: {"p50": stats["p50"], "p95": stats["p95"]} for route, stats in summary.items()},
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(baseline, f, ensure_ascii=False, indent=2)
+
+
+def format_comparison(rows):
+    def ms(value):
+        return f"{value * 1000:9.1f}" if value is not None else f"{'-':>9}"
+
+    header = f"{'Маршрут':<48} {'p50 мс':>9} {'база':>9} {'p95 мс':>9} {'база':>9}  Статус"
+    lines = [header, "-" * len(header)]
+    for row in rows:
+        lines.append(f"{row['route']:<48} {ms(row['p50'])} {ms(row.get('base_p50'))} {ms(row['p95'])} {ms(row.get('base_p95'))}  {row['status']}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарки операций API с проверкой регрессий относительно baseline")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="файл baseline (JSON)")
+    parser.add_argument("--update-baseline", action="store_true", help="записать текущие результаты в baseline")
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS, help="запустить только указанные операции")
+    parser.add_argument("--warmup", type=int, default=5, help="прогревочных повторов на операцию")
+    parser.add_argument("--samples", type=int, default=30, help="замеров на операцию")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="допустимый рост медианы (0.2 = +20%%)")
+    parser.add_argument("--p95-tolerance", type=float, default=0.3, help="допустимый рост p95")
+    parser.add_argument("--min-delta-ms", type=float, default=2.0, help="рост меньше этого значения не считается регрессией")
+    args = parser.parse_args(argv)
+    if settings.missing_required():
+        parser.error(f"Не установлены обязательные переменные окружения: {', '.join(settings.missing_required())}")
+    if not args.update_baseline and not os.path.exists(args.baseline):
+        parser.error(f"Baseline {args.baseline} не найден; создайте его запуском с --update-baseline")
+
+    summary, version = run_benchmarks(args.only or BENCHMARKS, warmup=args.warmup, samples=args.samples)
+    if args.update_baseline:
+        save_baseline(args.baseline, summary, version, args.samples)
+        print(format_comparison(compare(summary, {}, 0, 0, 0)))
+        print(f"Baseline сохранен в {args.baseline} (версия сервера: {version or 'неизвестна'})")
+        return 0
+
+    baseline = load_baseline(args.baseline)
+    if (baseline.get("server_version") == FAKE_SERVER_VERSION) != (version == FAKE_SERVER_VERSION):
+        print(f"Baseline {args.baseline} снят на версии {baseline.get('server_version') or 'неизвестна'}, а замер - на {version or 'неизвестной'}: "
+              "фейковый и настоящий сервер не сравниваются. Запишите baseline для этого сервера с --update-baseline")
+        return 2
+    rows = compare(summary, baseline["routes"], args.tolerance, args.p95_tolerance, args.min_delta_ms / 1000)
+    print(f"Версия сервера: {version or 'неизвестна'}, baseline снят на версии {baseline.get('server_version') or 'неизвестна'}")
+    print(format_comparison(rows))
+    missing = [row["route"] for row in rows if row["status"] == "missing"]
+    if missing:
+        print(f"В замере нет маршрутов из baseline (операция не запускалась или больше их не вызывает): {', '.join(missing)}")
+    regressions = [row["route"] for row in rows if row["status"] == "REGRESSION"]
+    if regressions:
+        print(f"Регрессия производительности: {', '.join(regressions)}")
+        return 1
+    print("Регрессий не обнаружено.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
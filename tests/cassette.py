@@ -0,0 +1,203 @@
+"""
+Запись и воспроизведение HTTP-взаимодействий тестов с сервером ("кассета").
+
+Запись с реального сервера (одним явным переключателем):
+    MATTERMOST_CASSETTE=tests/cassettes/suite.jsonl MATTERMOST_CASSETTE_RECORD=1 pytest tests/
+Воспроизведение без сети и без переменных окружения сервера:
+    MATTERMOST_CASSETTE=tests/cassettes/suite.jsonl pytest tests/
+
+Запрос сопоставляется с записью по методу, пути и параметрам запроса с учетом порядкового номера:
+идентификаторы каналов и постов в путях берутся из воспроизведенных ответов и совпадают с записанными.
+Случайные значения в телах запросов (имена каналов uuid4, тексты сообщений) подставляются шаблонно:
+строки, отличающиеся от записанного запроса, заменяются на текущие во всех последующих ответах.
+Пароли и токены в кассету не попадают.
+"""
+import json
+import os
+import threading
+from urllib.parse import parse_qsl, urlencode, urlsplit
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+CASSETTE_FORMAT = 1
+# Какие заголовки ответа сохраняются в кассете (остальные не нужны тестам)
+KEPT_RESPONSE_HEADERS = ("Content-Type", "Token", "X-Version-Id", "Retry-After",
+                         "X-RateLimit-Limit", "X-RateLimit-Remaining", "X-RateLimit-Reset")
+# Токен, который получают тесты при воспроизведении вместо настоящего
+REPLAY_TOKEN = "cassette-token"
+# Поля тел запросов с секретами: в кассете маскируются и не участвуют в шаблонной подстановке
+SECRET_FIELDS = ("password",)
+# Более короткие строки не подставляются: слишком велик риск заменить посторонний фрагмент ответа
+MIN_SUBSTITUTION_LENGTH = 6
+# Переменные окружения, которые сохраняются в кассете и восстанавливаются при воспроизведении
+RECORDED_SETTINGS = ("MATTERMOST_BASE_URL", "MATTERMOST_USER_LOGIN", "MATTERMOST_TEST_TEAM_ID", "MATTERMOST_OTHER_USER_ID",
+                     "MATTERMOST_OTHER_USER_LOGIN", "MATTERMOST_LOCKED_USER_LOGIN", "MATTERMOST_INACTIVE_USER_LOGIN")
+# Переменные с паролями, которые при воспроизведении получают фиктивные значения
+SECRET_SETTINGS = ("MATTERMOST_USER_PASSWORD", "MATTERMOST_OTHER_USER_PASSWORD", "MATTERMOST_LOCKED_USER_PASSWORD",
+                   "MATTERMOST_INACTIVE_USER_PASSWORD")
+
+
+class CassetteMissError(requests.exceptions.ConnectionError):
+    """Для запроса нет записи в кассете: в режиме воспроизведения он не может уйти в сеть."""
+
+
+def request_key(method, url):
+    """Ключ сопоставления: метод, путь и отсортированные параметры запроса (без хоста)."""
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return f"{method.upper()} {parts.path}" + (f"?{query}" if query else "")
+
+
+def _json_body(body):
+    if not body:
+        return None
+    try:
+        return json.loads(body.decode() if isinstance(body, bytes) else body)
+    except ValueError:
+        return None
+
+
+def _scrub(value):
+    """Копия тела запроса с замаскированными секретными полями."""
+    if isinstance(value, dict):
+        return {k: "***" if k in SECRET_FIELDS else _scrub(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_scrub(v) for v in value]
+    return value
+
+
+def _differing_strings(recorded, current, found):
+    """Собирает пары (записанная строка -> текущая) в одинаковых местах двух JSON-тел."""
+    if isinstance(recorded, dict) and isinstance(current, dict):
+        for key in recorded.keys() & current.keys():
+            if key not in SECRET_FIELDS:
+                _differing_strings(recorded[key], current[key], found)
+    elif isinstance(recorded, list) and isinstance(current, list):
+        for old, new in zip(recorded, current):
+            _differing_strings(old, new, found)
+    elif isinstance(recorded, str) and isinstance(current, str) and recorded != current and len(recorded) >= MIN_SUBSTITUTION_LENGTH:
+        found[recorded] = current
+    return found
+
+
+class Cassette:
+    """
+    Кассета HTTP-взаимодействий в формате JSONL: первая строка - метаданные и настройки,
+    далее по строке на взаимодействие. В режиме записи дополняется и сохраняется через save(),
+    в режиме воспроизведения отдает ответы без обращения к сети.
+    """
+
+    def __init__(self, path, record=False):
+        self.path = path
+        self.record = record
+        self._lock = threading.Lock()
+        self.settings = {}
+        self.interactions = []
+        self._by_key = {}
+        self._substitutions = {}
+        if not record:
+            self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            raise FileNotFoundError(f"Кассета {self.path} не найдена; запишите ее с MATTERMOST_CASSETTE_RECORD=1")
+        with open(self.path, encoding="utf-8") as f:
+            header = json.loads(f.readline())
+            if header.get("format") != CASSETTE_FORMAT:
+                raise ValueError(f"Неподдерживаемый формат кассеты {header.get('format')!r} в {self.path}")
+            self.settings = header["settings"]
+            self.interactions = [json.loads(line) for line in f if line.strip()]
+        for interaction in self.interactions:
+            self._by_key.setdefault(interaction["key"], []).append(interaction)
+
+    def replay_settings(self):
+        """Переменные окружения для воспроизведения: записанные настройки и фиктивные пароли."""
+        return dict(self.settings, **{name: "cassette" for name in SECRET_SETTINGS})
+
+    def adapter(self, inner):
+        """Транспортный адаптер поверх inner: пишет через него в кассету или воспроизводит из нее."""
+        return CassetteAdapter(self, inner)
+
+    def append(self, request, response):
+        headers = {k: response.headers[k] for k in KEPT_RESPONSE_HEADERS if k in response.headers}
+        if "Token" in headers:
+            headers["Token"] = REPLAY_TOKEN
+        interaction = {
+            "key": request_key(request.method, request.url),
+            "request": _scrub(_json_body(request.body)),
+            "status": response.status_code,
+            "reason": response.reason,
+            "headers": headers,
+            "body": response.text,
+        }
+        with self._lock:
+            self.interactions.append(interaction)
+
+    def play(self, request):
+        """Следующая по порядку запись для запроса; ответ с подставленными текущими значениями."""
+        key = request_key(request.method, request.url)
+        with self._lock:
+            queue = self._by_key.get(key)
+            if not queue:
+                raise CassetteMissError(f"В кассете {self.path} нет записи для {key}; перезапишите ее с MATTERMOST_CASSETTE_RECORD=1", request=request)
+            interaction = queue.pop(0)
+            current = _json_body(request.body)
+            if interaction["request"] is not None and current is not None:
+                self._substitutions.update(_differing_strings(interaction["request"], current, {}))
+            body = interaction["body"]
+            for old, new in self._substitutions.items():
+                # Строки в JSON ответа могут быть как с \u-экранированием, так и в UTF-8
+                for ensure_ascii in (True, False):
+                    body = body.replace(json.dumps(old, ensure_ascii=ensure_ascii)[1:-1], json.dumps(new, ensure_ascii=ensure_ascii)[1:-1])
+        response = requests.Response()
+        response.status_code = interaction["status"]
+        response.reason = interaction["reason"]
+        response.headers = CaseInsensitiveDict(interaction["headers"])
+        response._content = body.encode("utf-8")
+        response.encoding = "utf-8"
+        response.url = request.url
+        response.request = request
+        return response
+
+    def save(self):
+        """Сохраняет записанные взаимодействия и настройки окружения (без паролей)."""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        settings = {name: os.environ[name] for name in RECORDED_SETTINGS if os.getenv(name)}
+        with self._lock, open(self.path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"format": CASSETTE_FORMAT, "settings": settings}, ensure_ascii=False) + "\n")
+            for interaction in self.interactions:
+                f.write(json.dumps(interaction, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+
+class CassetteAdapter(BaseAdapter):
+    """Адаптер requests: при записи проксирует запросы в inner и сохраняет их, при воспроизведении отвечает из кассеты."""
+
+    def __init__(self, cassette, inner):
+        super().__init__()
+        self.cassette = cassette
+        self.inner = inner
+
+    def send(self, request, **kwargs):
+        if not self.cassette.record:
+            return self.cassette.play(request)
+        response = self.inner.send(request, **kwargs)
+        self.cassette.append(request, response)
+        return response
+
+    def close(self):
+        self.inner.close()
+
+
+def cassette_from_env():
+    """
+    Кассета из MATTERMOST_CASSETTE (None, если переменная не задана).
+    MATTERMOST_CASSETTE_RECORD=1 - перезаписать кассету, иначе воспроизводить ее.
+    """
+    path = os.getenv("MATTERMOST_CASSETTE")
+    if not path:
+        return None
+    record = os.getenv("MATTERMOST_CASSETTE_RECORD", "").lower() in ("1", "true", "yes")
+    return Cassette(path, record=record)
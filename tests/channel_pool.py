@@ -0,0 +1,164 @@
+import threading
+import uuid
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from .members import add_members, member_ids_among, remove_members
+
+# Префикс имен каналов, которые создает пул (по нему же их можно найти и удалить)
+CHANNEL_NAME_PREFIX = "test-auto-"
+# Префикс каналов test_create_channel_duplicate_name, которые тест создает и удаляет сам, без пула
+DUPLICATE_CHANNEL_PREFIX = "duplicate-test-"
+DEFAULT_POOL_SIZE = 4
+# Максимальный размер страницы участников канала в API v4
+MEMBERS_PER_PAGE = 200
+
+
+class ChannelPool:
+    """
+    Пул заранее созданных тестовых каналов на всю сессию.
+    Вместо POST/DELETE на каждый тест канал выдается из пула (acquire) и возвращается в него (release),
+    при возврате состав участников сбрасывается к исходному, а для постов запоминается водяной знак:
+    посты, созданные до выдачи канала, отсекаются параметром since.
+    Сброс проверяет только исходных участников, watched_user_ids и пользователей, отмеченных тестом через touch(),
+    одним запросом members/ids; полный список участников выгружается, только если после этого число
+    участников канала (GET /channels/{id}/stats) не совпало с исходным.
+    Все созданные каналы удаляются одним параллельным проходом в close().
+    """
+
+    def __init__(self, api_client, base_url, team_id, size=DEFAULT_POOL_SIZE, name_prefix=CHANNEL_NAME_PREFIX,
+                 watched_user_ids=()):
+        self.api_client = api_client
+        self.base_url = base_url
+        self.team_id = team_id
+        self.size = size
+        self.name_prefix = name_prefix
+        self.watched_user_ids = set(watched_user_ids)
+        self._lock = threading.Lock()
+        self._idle = []
+        self._created = {}
+        self._baseline_members = {}
+        self._watermarks = {}
+        self._touched = {}
+        self.hits = 0
+        self.creations = 0
+        self.resets = 0
+        self.full_resets = 0
+
+    def _create_channel(self):
+        channel_name = f"{self.name_prefix}{uuid.uuid4().hex[:8]}"
+        payload = {
+            "team_id": self.team_id,
+            "name": channel_name,
+            "display_name": f"Временный тестовый канал {channel_name}",
+            "type": "O"  # Публичный канал
+        }
+        response = self.api_client.post(f"{self.base_url}/api/v4/channels", json=payload, timeout=10)
+        response.raise_for_status()
+        channel = response.json()
+        members = self._member_ids(channel["id"])
+        with self._lock:
+            self._created[channel["id"]] = channel
+            self._baseline_members[channel["id"]] = members
+            self._watermarks[channel["id"]] = channel.get("last_post_at", 0) + 1
+            self.creations += 1
+        print(f"Пул каналов: создан канал ID={channel['id']}, Name={channel_name}")
+        return channel
+
+    def _member_ids(self, channel_id):
+        members_url = f"{self.base_url}/api/v4/channels/{channel_id}/members"
+        member_ids, page = set(), 0
+        while True:
+            response = self.api_client.get(members_url, params={"page": page, "per_page": MEMBERS_PER_PAGE}, timeout=10)
+            response.raise_for_status()
+            batch = response.json()
+            member_ids.update(member["user_id"] for member in batch)
+            if len(batch) < MEMBERS_PER_PAGE:
+                return member_ids
+            page += 1
+
+    def prefill(self):
+        """Создает недостающие до size каналы одним параллельным залпом."""
+        missing = self.size - len(self._idle)
+        if missing <= 0:
+            return
+        with ThreadPoolExecutor(max_workers=missing) as executor:
+            channels = list(executor.map(lambda _: self._create_channel(), range(missing)))
+        # Порядок выдачи не зависит от того, какой поток закончил первым: прогоны воспроизводимы
+        channels.sort(key=lambda channel: channel["id"])
+        with self._lock:
+            self._idle.extend(channels)
+
+    def acquire(self):
+        """Выдает чистый канал: из пула, если есть свободный, иначе создает новый."""
+        with self._lock:
+            if self._idle:
+                self.hits += 1
+                return dict(self._idle.pop())
+        return dict(self._create_channel())
+
+    def touch(self, channel_id, user_ids):
+        """Отмечает пользователей, членство которых тест меняет в канале: release() вернет им исходное состояние."""
+        with self._lock:
+            self._touched.setdefault(channel_id, set()).update(user_ids)
+
+    def _member_count(self, channel_id):
+        response = self.api_client.get(f"{self.base_url}/api/v4/channels/{channel_id}/stats", timeout=10)
+        response.raise_for_status()
+        return response.json()["member_count"]
+
+    def _restore_members(self, channel_id, current, baseline):
+        remove_members(self.api_client, self.base_url, channel_id, current - baseline)
+        add_members(self.api_client, self.base_url, channel_id, baseline - current)
+
+    def release(self, channel):
+        """
+        Возвращает канал в пул после теста: удаляет добавленных тестом участников, возвращает удаленных
+        исходных и сдвигает водяной знак постов. Архивированный тестом канал в пул не возвращается.
+        """
+        channel_id = channel["id"]
+        with self._lock:
+            touched = self._touched.pop(channel_id, set())
+        response = self.api_client.get(f"{self.base_url}/api/v4/channels/{channel_id}", timeout=10)
+        if response.status_code != 200 or response.json().get("delete_at"):
+            print(f"Пул каналов: канал {channel_id} удален или недоступен, в пул не возвращается.")
+            return
+        current = response.json()
+        baseline = self._baseline_members[channel_id]
+        candidates = baseline | self.watched_user_ids | touched
+        self._restore_members(channel_id, member_ids_among(self.api_client, self.base_url, channel_id, candidates), baseline)
+        if self._member_count(channel_id) != len(baseline):
+            # Тест поменял состав, не отметив пользователей через touch(): сброс по полному списку участников
+            self._restore_members(channel_id, self._member_ids(channel_id), baseline)
+            with self._lock:
+                self.full_resets += 1
+        with self._lock:
+            self._watermarks[channel_id] = current.get("last_post_at", 0) + 1
+            self._idle.append(self._created[channel_id])
+            self.resets += 1
+
+    def watermark(self, channel_id):
+        """Время (мс), начиная с которого посты канала относятся к текущему тесту; значение для параметра since."""
+        return self._watermarks[channel_id]
+
+    def close(self):
+        """Удаляет все созданные пулом каналы параллельно; ошибки удаления только выводятся."""
+        def delete(channel_id):
+            try:
+                response = self.api_client.delete(f"{self.base_url}/api/v4/channels/{channel_id}", timeout=10)
+            except requests.exceptions.RequestException as e:
+                print(f"Предупреждение: Ошибка при удалении тестового канала {channel_id}: {e}")
+                return
+            if response.status_code not in (200, 404):
+                print(f"Предупреждение: Не удалось удалить тестовый канал {channel_id}. Статус: {response.status_code}, Ответ: {response.text[:200]}")
+
+        channel_ids = list(self._created)
+        if channel_ids:
+            print(f"\nПул каналов: удаление {len(channel_ids)} тестовых каналов")
+            with ThreadPoolExecutor(max_workers=min(len(channel_ids), self.size or 1)) as executor:
+                list(executor.map(delete, channel_ids))
+        with self._lock:
+            self._idle.clear()
+            self._created.clear()
+
+    def stats(self):
+        return {"hits": self.hits, "creations": self.creations, "resets": self.resets, "full_resets": self.full_resets}
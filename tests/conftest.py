@@ -1,40 +1,71 @@
 import pytest
 import requests
 import os
-import uuid
+import html
+import json
 import time
-from dotenv import load_dotenv
+from .api_client import ApiClient, auth_headers
+from .channel_pool import ChannelPool, CHANNEL_NAME_PREFIX, DEFAULT_POOL_SIZE as DEFAULT_CHANNEL_POOL_SIZE
+from .parallel import WORKER_ID, is_worker, shared_value, worker_prefix
+from .metrics import MetricsRecorder, render_html_table as render_latency_table
+from .scaling import DEFAULT_RESULTS_FILE, load_results, render_html_table as render_scaling_table
+from .seeding import Dataset
+from .fake_server import enabled_from_env as fake_server_enabled
+from .rate_limit import AdaptiveLimiter, format_stats as format_throttle_stats
+from .token_cache import TokenCache, cache_path_from_env
+from .results_store import RequestTimings, ResultsStore, new_run_id, store_path_from_env, utc_now
+from .sweeper import DEFAULT_MIN_AGE, run_sweep, stages_from_env, format_results as format_sweep_results
+# Конфигурация из переменных окружения (тесты импортируют ее из conftest)
+from .settings import (
+    BASE_URL, LOGIN_ID, PASSWORD, TEAM_ID, OTHER_USER_ID, LOCKED_USER_LOGIN, LOCKED_USER_PASSWORD,
+    INACTIVE_USER_LOGIN, INACTIVE_USER_PASSWORD, POOL_SIZE, FAKE_SERVER, CASSETTE, missing_required,
+)
 
-load_dotenv()
+# Сколько тестовых каналов создавать заранее для пула каналов
+CHANNEL_POOL_SIZE = int(os.getenv("MATTERMOST_CHANNEL_POOL_SIZE", DEFAULT_CHANNEL_POOL_SIZE))
+# Результаты замера масштабирования (python -m tests.scaling) для таблицы в HTML-отчете
+SCALING_RESULTS_FILE = os.getenv("MATTERMOST_SCALING_RESULTS", DEFAULT_RESULTS_FILE)
+# Куда сохранить JSON с задержками по маршрутам, если отчет pytest-html не генерируется
+LATENCY_JSON = os.getenv("MATTERMOST_LATENCY_JSON")
+# Манифест засеянного набора данных (python -m tests.seeding) для тестов на больших объемах
+DATASET_MANIFEST = os.getenv("MATTERMOST_DATASET")
+# Кэш токена основного пользователя между прогонами (MATTERMOST_TOKEN_CACHE); с фейковым сервером
+# токены не переживают перезапуск, а с кассетой лишний запрос проверки сбил бы порядок взаимодействий
+_TOKEN_CACHE_PATH = cache_path_from_env()
+TOKEN_CACHE = TokenCache(_TOKEN_CACHE_PATH) if _TOKEN_CACHE_PATH and not fake_server_enabled() and CASSETTE is None else None
 
-# Получение конфигурации из переменных окружения
-BASE_URL = os.getenv("MATTERMOST_BASE_URL")
-LOGIN_ID = os.getenv("MATTERMOST_USER_LOGIN")
-PASSWORD = os.getenv("MATTERMOST_USER_PASSWORD")
-TEAM_ID = os.getenv("MATTERMOST_TEST_TEAM_ID")
-OTHER_USER_ID = os.getenv("MATTERMOST_OTHER_USER_ID")
-LOCKED_USER_LOGIN = os.getenv("MATTERMOST_LOCKED_USER_LOGIN")
-LOCKED_USER_PASSWORD = os.getenv("MATTERMOST_LOCKED_USER_PASSWORD")
-INACTIVE_USER_LOGIN = os.getenv("MATTERMOST_INACTIVE_USER_LOGIN")
-INACTIVE_USER_PASSWORD = os.getenv("MATTERMOST_INACTIVE_USER_PASSWORD")
+# Задержки всех HTTP-запросов тестов к API по нормализованным маршрутам (для отчета и JSON)
+REQUEST_METRICS = MetricsRecorder()
+# Те же задержки с разбивкой по тестам - для хранилища результатов (дальше передаются в REQUEST_METRICS)
+TEST_TIMINGS = RequestTimings(REQUEST_METRICS)
+# Хранилище результатов прогонов для трендов (python -m tests.trends), только по MATTERMOST_RESULTS_STORE;
+# задержки фейкового сервера и воспроизведенной кассеты не относятся к серверу, и такой прогон не пишется
+_RESULTS_STORE_PATH = store_path_from_env()
+RESULTS_STORE = (ResultsStore(_RESULTS_STORE_PATH) if _RESULTS_STORE_PATH and not fake_server_enabled()
+                 and (CASSETTE is None or CASSETTE.record) else None)
+# Идентификатор прогона в хранилище: контроллер xdist создает его и передает воркерам
+_RESULTS_RUN = {"id": None, "started": None}
+# Исход и длительность тестов, для которых еще не пришел отчет teardown
+_TEST_OUTCOMES = {}
+# Общий для клиентов тестов ограничитель конкурентности и частоты: ответы 429 повторяются,
+# а повторы и время ожидания попадают в отчет, чтобы медленный прогон не путали с медленным сервером
+RATE_LIMITER = AdaptiveLimiter(POOL_SIZE)
+# Уборка каналов, оставленных прерванными прогонами (python -m tests.sweeper): до тестов, после или both
+SWEEP_STAGES = stages_from_env()
+SWEEP_MIN_AGE = float(os.getenv("MATTERMOST_SWEEP_MIN_AGE", DEFAULT_MIN_AGE))
 
 # Проверка наличия обязательных переменных
-if not all([BASE_URL, LOGIN_ID, PASSWORD, TEAM_ID]):
+if missing_required():
     pytest.exit("ОШИБКА: Не установлены обязательные переменные окружения: MATTERMOST_BASE_URL, MATTERMOST_USER_LOGIN, MATTERMOST_USER_PASSWORD, MATTERMOST_TEST_TEAM_ID", returncode=1)
 
 
-@pytest.fixture(scope="session")
-def auth_token():
-    """
-    Фикстура для получения токена аутентификации один раз за сессию.
-    Проверяет успешный логин основного тестового пользователя.
-    """
+def _login(client):
+    """Логин основного тестового пользователя; возвращает токен или завершает тест с понятной ошибкой."""
     login_url = f"{BASE_URL}/api/v4/users/login"
     payload = {"login_id": LOGIN_ID, "password": PASSWORD}
-    headers = {"Content-Type": "application/json"}
     try:
         print(f"\nAttempting login for user: {LOGIN_ID} at {BASE_URL}")
-        response = requests.post(login_url, json=payload, headers=headers, timeout=15)
+        response = client.post(login_url, json=payload, timeout=15)
         response.raise_for_status() 
         token = response.headers.get("Token")
         if not token:
@@ -50,54 +81,244 @@ def auth_token():
     except Exception as e:
         pytest.fail(f"Неожиданная ошибка при аутентификации: {e}", pytrace=False)
 
+def _session_token(client):
+    """
+    Токен основного пользователя: из кэша на диске, если он еще действует (проверка GET /users/me),
+    иначе полный логин с сохранением токена в кэш.
+    """
+    if TOKEN_CACHE is None:
+        return _login(client)
+    try:
+        token, source = TOKEN_CACHE.login(client, BASE_URL, LOGIN_ID, PASSWORD, login_func=lambda c, *_: _login(c))
+    except requests.exceptions.RequestException as e:
+        # Проверка токена не удалась по сети или с ошибкой сервера - понятную ошибку даст обычный логин
+        print(f"\nПредупреждение: Не удалось проверить токен из кэша: {e}")
+        return _login(client)
+    if source == "cached":
+        print(f"\nТокен {LOGIN_ID} взят из кэша {TOKEN_CACHE.path}, логин не нужен.")
+    return token
+
+@pytest.fixture(scope="session")
+def anon_client():
+    """
+    Общий HTTP-клиент без авторизации (логин и проверки ошибок аутентификации).
+    Запросы, как и у api_client, попадают в статистику задержек по маршрутам.
+    """
+    client = ApiClient(pool_size=POOL_SIZE, recorder=TEST_TIMINGS, cassette=CASSETTE, limiter=RATE_LIMITER)
+    yield client
+    client.close()
+
+@pytest.fixture(scope="session")
+def auth_token(tmp_path_factory, anon_client):
+    """
+    Фикстура для получения токена аутентификации один раз за сессию.
+    Проверяет успешный логин основного тестового пользователя; токен переиспользуется
+    между прогонами через кэш на диске (MATTERMOST_TOKEN_CACHE, MATTERMOST_TOKEN_CACHE=off - отключить).
+    При параллельном прогоне (pytest-xdist) токен получает только первый воркер,
+    остальные берут его из общего файла прогона - без шторма логинов.
+    """
+    if not is_worker():
+        return _session_token(anon_client)
+    token_file = tmp_path_factory.getbasetemp().parent / "auth_token"
+    return shared_value(str(token_file), lambda: _session_token(anon_client))
+
 @pytest.fixture(scope="function")
 def headers(auth_token):
     """Фикстура для создания стандартных заголовков с токеном авторизации."""
-    return {
-        "Authorization": f"Bearer {auth_token}",
-        "Content-Type": "application/json"
-    }
+    return auth_headers(auth_token)
+
+@pytest.fixture(scope="session")
+def api_client(auth_token):
+    """
+    Общий HTTP-клиент на всю сессию с пулом keep-alive соединений.
+    Заголовки авторизации задаются один раз, соединения переиспользуются между тестами.
+    В конце сессии выводится статистика: сколько соединений открыто и сколько переиспользовано.
+    Время каждого запроса (соединение, TTFB, полное) записывается в REQUEST_METRICS и хранилище результатов.
+    """
+    client = ApiClient(auth_token, pool_size=POOL_SIZE, recorder=TEST_TIMINGS, cassette=CASSETTE, limiter=RATE_LIMITER)
+    yield client
+    stats = client.connection_stats.as_dict()
+    print(f"\nСтатистика соединений: запросов {stats['requests']}, открыто {stats['opened']}, переиспользовано {stats['reused']}")
+    client.close()
+
+@pytest.fixture(scope="session")
+def channel_pool(api_client):
+    """
+    Сессионный пул тестовых каналов: каналы создаются заранее одним параллельным залпом,
+    выдаются тестам по очереди и удаляются все вместе в конце сессии.
+    При параллельном прогоне у каждого воркера свой пул с собственным префиксом имен,
+    поэтому тесты участников OTHER_USER_ID в разных воркерах работают с разными каналами и не гоняются.
+    Членство OTHER_USER_ID сбрасывается при возврате канала всегда; других пользователей тест отмечает
+    через channel_pool.touch(channel_id, user_ids).
+    """
+    pool = ChannelPool(api_client, BASE_URL, TEAM_ID, size=CHANNEL_POOL_SIZE, name_prefix=worker_prefix(CHANNEL_NAME_PREFIX),
+                       watched_user_ids=[OTHER_USER_ID] if OTHER_USER_ID else ())
+    try:
+        print(f"\nСоздание пула из {CHANNEL_POOL_SIZE} тестовых каналов")
+        pool.prefill()
+    except requests.exceptions.RequestException as e:
+        pool.close()
+        pytest.fail(f"Не удалось создать пул тестовых каналов: {e}", pytrace=False)
+    yield pool
+    pool.close()
+    stats = pool.stats()
+    print(f"Статистика пула каналов: выдано из пула {stats['hits']}, создано {stats['creations']}, сбросов {stats['resets']} "
+          f"(из них по полному списку участников {stats['full_resets']})")
 
 @pytest.fixture(scope="function")
-def test_channel(headers):
-    """
-    Фикстура для создания временного тестового канала перед тестом
-    и его удаления после теста (cleanup).
-    """
-    channel_data = None # Инициализация на случай ошибки создания
-    channel_name = f"test-auto-{uuid.uuid4().hex[:8]}"
-    create_url = f"{BASE_URL}/api/v4/channels"
-    payload = {
-        "team_id": TEAM_ID,
-        "name": channel_name,
-        "display_name": f"Временный тестовый канал {channel_name}",
-        "type": "O"  # Публичный канал
-    }
+def test_channel(channel_pool):
+    """
+    Фикстура, выдающая тесту чистый временный канал из пула
+    и возвращающая его в пул после теста (участники сбрасываются к исходному составу).
+    """
     try:
-        print(f"\nСоздание тестового канала: {channel_name}")
-        response = requests.post(create_url, headers=headers, json=payload, timeout=10)
-        response.raise_for_status() # Проверка на ошибки создания
-        channel_data = response.json()
-        channel_id = channel_data['id']
-        print(f"Тестовый канал создан: ID={channel_id}, Name={channel_name}")
+        channel_data = channel_pool.acquire()
+    except requests.exceptions.RequestException as e:
+        pytest.fail(f"Не удалось создать тестовый канал: {e}", pytrace=False)
+    print(f"\nТестовый канал из пула: ID={channel_data['id']}, Name={channel_data['name']}")
 
-        yield channel_data  # Передаем данные канала в тест
+    yield channel_data  # Передаем данные канала в тест
 
+    try:
+        channel_pool.release(channel_data)
     except requests.exceptions.RequestException as e:
-        pytest.fail(f"Не удалось создать тестовый канал: {e}", pytrace=False)
-    finally:
-        # Очистка: удаление канала после выполнения теста
-        if channel_data and 'id' in channel_data:
-            channel_id = channel_data['id']
-            delete_url = f"{BASE_URL}/api/v4/channels/{channel_id}"
-            try:
-                print(f"\nУдаление тестового канала: {channel_id}")
-                del_response = requests.delete(delete_url, headers=headers, timeout=10)
-                if del_response.status_code == 200:
-                    print(f"Тестовый канал {channel_id} успешно удален.")
-                elif del_response.status_code == 404:
-                     print(f"Тестовый канал {channel_id} уже был удален или не найден.")
-                else:
-                    print(f"Предупреждение: Не удалось удалить тестовый канал {channel_id}. Статус: {del_response.status_code}, Ответ: {del_response.text[:200]}")
-            except requests.exceptions.RequestException as e:
-                print(f"Предупреждение: Ошибка при удалении тестового канала {channel_id}: {e}")
\ No newline at end of file
+        print(f"Предупреждение: Не удалось сбросить тестовый канал {channel_data['id']} для повторного использования: {e}")
+
+
+@pytest.fixture(scope="session")
+def seeded_dataset():
+    """
+    Засеянный набор данных по манифесту MATTERMOST_DATASET: каналы и пользователи нужного размера
+    (dataset.channel_with_posts(n), dataset.user_in_channels(m)). Без манифеста тест пропускается.
+    """
+    if not DATASET_MANIFEST:
+        pytest.skip("Не задан MATTERMOST_DATASET с манифестом набора данных (python -m tests.seeding)")
+    return Dataset.load(DATASET_MANIFEST)
+
+
+def _latency_json_path(config):
+    """Путь JSON-файла задержек: рядом с HTML-отчетом (<отчет>.latency.json) или из MATTERMOST_LATENCY_JSON."""
+    if LATENCY_JSON:
+        return LATENCY_JSON
+    html_path = config.getoption("htmlpath", None)
+    return f"{os.path.splitext(html_path)[0]}.latency.json" if html_path else None
+
+
+def pytest_configure(config):
+    # Записи кассеты сопоставляются по порядку запросов, который детерминирован только в последовательном прогоне
+    if CASSETTE is not None and config.getoption("numprocesses", None):
+        raise pytest.UsageError("Режим кассеты (MATTERMOST_CASSETTE) поддерживает только последовательный прогон, уберите -n")
+    _RESULTS_RUN["id"] = config.workerinput["results_run"] if hasattr(config, "workerinput") else new_run_id()
+
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_configure_node(node):
+    """Передает воркеру pytest-xdist идентификатор прогона в хранилище результатов."""
+    node.workerinput["results_run"] = _RESULTS_RUN["id"]
+
+
+def _sweep(stage):
+    """
+    Уборка оставленных тестами каналов на этапе stage, если он включен в MATTERMOST_SWEEP.
+    Выполняется только на контроллере xdist (до запуска воркеров и после их завершения) и не в режиме кассеты:
+    запросы уборки не записываются, а при воспроизведении сервера нет.
+    """
+    if stage not in SWEEP_STAGES or is_worker() or CASSETTE is not None:
+        return
+    print(f"\nУборка тестовых каналов ({stage}), старше {SWEEP_MIN_AGE:g} с")
+    try:
+        print(format_sweep_results(run_sweep(min_age=SWEEP_MIN_AGE)))
+    except requests.exceptions.RequestException as e:
+        print(f"Предупреждение: Уборка тестовых каналов не выполнена: {e}")
+
+
+def _server_version():
+    """Версия сервера из X-Version-Id; запрос идет мимо кассеты и статистики."""
+    try:
+        return requests.get(f"{BASE_URL}/api/v4/system/ping", timeout=10).headers.get("X-Version-Id")
+    except requests.exceptions.RequestException:
+        return None
+
+
+def pytest_sessionstart(session):
+    _RESULTS_RUN["started"] = time.perf_counter()
+    _sweep("start")
+    if RESULTS_STORE is not None and not is_worker():
+        RESULTS_STORE.append({"type": "run", "run": _RESULTS_RUN["id"], "started": utc_now(), "version": _server_version(),
+                              "base_url": BASE_URL, "workers": session.config.getoption("numprocesses", None) or 1})
+
+
+def pytest_runtest_logreport(report):
+    """
+    Сразу после теста дописывает в хранилище результатов его исход, длительность и задержки запросов.
+    Исход - по фазе call, а если до нее не дошло (пропуск, ошибка фикстуры) - по setup; запись - на teardown,
+    чтобы в нее попали и запросы очистки. Контроллер xdist отчеты воркеров не пишет: воркеры пишут их сами.
+    """
+    if hasattr(report, "node"):
+        return
+    if report.when == "call" or report.outcome != "passed":
+        _TEST_OUTCOMES.setdefault(report.nodeid, (report.outcome, report.duration))
+    if report.when != "teardown":
+        return
+    outcome, duration = _TEST_OUTCOMES.pop(report.nodeid, (report.outcome, report.duration))
+    timings = TEST_TIMINGS.take()
+    if RESULTS_STORE is not None:
+        RESULTS_STORE.append({"type": "test", "run": _RESULTS_RUN["id"], "test": report.nodeid, "outcome": outcome,
+                              "duration": round(duration, 6), "worker": WORKER_ID, "requests": timings})
+
+
+def pytest_unconfigure(config):
+    _sweep("end")
+    if FAKE_SERVER is not None:
+        FAKE_SERVER.stop()
+
+
+def pytest_sessionfinish(session, exitstatus):
+    """
+    Воркер pytest-xdist передает сырые задержки контроллеру;
+    контроллер (или обычный прогон) сохраняет сводку по маршрутам в JSON и записанную кассету
+    и отмечает конец прогона в хранилище результатов.
+    """
+    if hasattr(session.config, "workeroutput"):
+        session.config.workeroutput["request_metrics"] = REQUEST_METRICS.export()
+        session.config.workeroutput["throttle_stats"] = RATE_LIMITER.stats.as_dict()
+        return
+    print(f"\n{format_throttle_stats(RATE_LIMITER.stats.as_dict())}")
+    if CASSETTE is not None and CASSETTE.record:
+        CASSETTE.save()
+        print(f"\nКассета записана: {CASSETTE.path} ({len(CASSETTE.interactions)} взаимодействий)")
+    path = _latency_json_path(session.config)
+    if path:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"unit": "seconds", "routes": REQUEST_METRICS.summary(), "throttling": RATE_LIMITER.stats.as_dict()},
+                      f, ensure_ascii=False, indent=2)
+    if RESULTS_STORE is not None:
+        RESULTS_STORE.append({"type": "run_end", "run": _RESULTS_RUN["id"], "finished": utc_now(),
+                              "duration": round(time.perf_counter() - _RESULTS_RUN["started"], 3), "exitstatus": int(exitstatus),
+                              "throttling": RATE_LIMITER.stats.as_dict()})
+
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_testnodedown(node, error):
+    """Собирает на контроллере задержки и счетчики ограничения частоты, измеренные воркером pytest-xdist."""
+    exported = getattr(node, "workeroutput", {}).get("request_metrics")
+    if exported:
+        REQUEST_METRICS.merge(exported)
+    throttle_stats = getattr(node, "workeroutput", {}).get("throttle_stats")
+    if throttle_stats:
+        RATE_LIMITER.stats.merge(throttle_stats)
+
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_html_results_summary(prefix, summary, postfix):
+    """
+    Добавляет в HTML-отчет таблицу задержек API по маршрутам, сводку ответов 429 (если они были)
+    и таблицу масштабирования по числу воркеров, если замер проводился.
+    """
+    if REQUEST_METRICS.routes():
+        prefix.append(render_latency_table(REQUEST_METRICS.summary()))
+    if RATE_LIMITER.stats.throttled:
+        prefix.append(f"<p>{html.escape(format_throttle_stats(RATE_LIMITER.stats.as_dict()))}</p>")
+    results = load_results(SCALING_RESULTS_FILE)
+    if results:
+        prefix.append(render_scaling_table(results["runs"]))
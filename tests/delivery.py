@@ -0,0 +1,269 @@
+"""
+Сквозная задержка доставки сообщений через WebSocket API: от отправки поста до события posted у получателей.
+
+Запуск (переменные окружения те же, что у тестов):
+    python -m tests.delivery --sizes 10 100 1000 --messages 50
+    python -m tests.delivery --dataset dataset-s42.json --receivers 20 --sizes 100 1000 --senders 4 --rate 20
+
+Получатели - сессии WebSocket пользователей, которые состоят в канале замера, кроме отправителя (основного
+пользователя): без --dataset это OTHER_USER_ID (нужны MATTERMOST_OTHER_USER_LOGIN/PASSWORD),
+с --dataset - первые --receivers пользователей засеянного набора (python -m tests.seeding).
+Для каждого размера из --sizes создается канал, доращивается до этого числа участников пользователями команды,
+и в него отправляются --messages сообщений --senders параллельными отправителями (с общим темпом --rate).
+Отчет: задержка ответа на POST, задержка доставки каждому получателю и время полной рассылки (до последнего получателя).
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import websocket
+import requests
+from .api_client import ApiClient, auth_headers, login
+from .load import RatePacer
+from .members import add_members, team_user_ids
+from .metrics import summarize
+from .rate_limit import AdaptiveLimiter, format_stats as format_throttle_stats
+from .scenarios import ScenarioContext
+from .seeding import Dataset
+from .token_cache import end_session, session_token
+from . import settings
+
+# Сколько ждать доставки последнего сообщения всем получателям, с
+DEFAULT_DELIVERY_TIMEOUT = 10
+
+
+def websocket_url(base_url):
+    """Адрес WebSocket API для HTTP-адреса сервера."""
+    scheme, rest = base_url.split("://", 1)
+    return f"{'wss' if scheme == 'https' else 'ws'}://{rest.rstrip('/')}/api/v4/websocket"
+
+
+class WebSocketReceiver:
+    """
+    Сессия WebSocket API одного пользователя. Фоновый поток читает события и для каждого posted
+    запоминает момент получения (time.perf_counter сразу после чтения кадра) по идентификатору поста.
+    """
+
+    def __init__(self, base_url, token, name=None):
+        self.base_url = base_url
+        self.token = token
+        self.name = name
+        self.arrivals = {}
+        self._condition = threading.Condition()
+        self._ws = None
+        self._thread = None
+
+    def connect(self, timeout=10):
+        """Подключается с токеном в заголовке и ждет событие hello."""
+        self._ws = websocket.create_connection(websocket_url(self.base_url), timeout=timeout,
+                                               header=[f"Authorization: Bearer {self.token}"], enable_multithread=True)
+        hello = json.loads(self._ws.recv())
+        if hello.get("event") != "hello":
+            raise ConnectionError(f"Вместо события hello получено: {hello}")
+        self._ws.settimeout(None)
+        self._thread = threading.Thread(target=self._read, name=f"ws-{self.name}", daemon=True)
+        self._thread.start()
+        return self
+
+    def _read(self):
+        while True:
+            try:
+                message = self._ws.recv()
+            except (websocket.WebSocketException, OSError):
+                return
+            received = time.perf_counter()
+            event = json.loads(message) if message else {}
+            if event.get("event") == "posted":
+                post = json.loads(event["data"]["post"])
+                with self._condition:
+                    self.arrivals[post["id"]] = received
+                    self._condition.notify_all()
+
+    def wait_for(self, post_id, timeout=DEFAULT_DELIVERY_TIMEOUT):
+        """Момент получения поста (perf_counter) или None, если он не пришел за timeout."""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while post_id not in self.arrivals:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._condition.wait(remaining)
+            return self.arrivals[post_id]
+
+    def close(self):
+        if self._ws is not None:
+            self._ws.close()
+            self._thread.join(timeout=5)
+
+
+def send_messages(client, base_url, channel_id, count, senders=1, rate=None):
+    """
+    Отправляет count сообщений senders параллельными потоками (с общим темпом rate в секунду, если задан).
+    Возвращает [(id поста, момент начала отправки, момент ответа)] по perf_counter.
+    """
+    pacer = RatePacer(rate) if rate else None
+    sent, lock = [], threading.Lock()
+    remaining = iter(range(count))
+
+    def sender():
+        while True:
+            with lock:
+                index = next(remaining, None)
+            if index is None or (pacer and not pacer.wait(float("inf"))):
+                return
+            started = time.perf_counter()
+            response = client.post(f"{base_url}/api/v4/posts", json={"channel_id": channel_id, "message": f"Доставка {index}"}, timeout=10)
+            response.raise_for_status()
+            acked = time.perf_counter()
+            with lock:
+                sent.append((response.json()["id"], started, acked))
+
+    with ThreadPoolExecutor(max_workers=senders) as executor:
+        for future in [executor.submit(sender) for _ in range(senders)]:
+            future.result()
+    return sent
+
+
+def measure_delivery(sent, receivers, timeout=DEFAULT_DELIVERY_TIMEOUT):
+    """Сводка по отправленным постам: ack, доставка каждому получателю, полная рассылка и число недоставленных."""
+    deadline = time.monotonic() + timeout
+    ack, delivery, fanout, missing = [], [], [], 0
+    for post_id, started, acked in sent:
+        ack.append(acked - started)
+        arrivals = [receiver.wait_for(post_id, max(deadline - time.monotonic(), 0)) for receiver in receivers]
+        received = [arrival - started for arrival in arrivals if arrival is not None]
+        missing += len(arrivals) - len(received)
+        delivery.extend(received)
+        if len(received) == len(arrivals):
+            fanout.append(max(received))
+    return {"posts": len(sent), "receivers": len(receivers), "missing": missing,
+            "ack": summarize(ack), "delivery": summarize(delivery), "fanout": summarize(fanout)}
+
+
+def _receiver_credentials(dataset, count):
+    """
+    Логины и пароли получателей: пользователи набора или OTHER_USER_ID. Отправитель (основной пользователь)
+    в получатели не входит: доставка автору его же поста не относится к рассылке.
+    """
+    if dataset is not None:
+        # По плану засева пользователь i всегда состоит в команде i % teams, так что в первой - каждый teams-й
+        users = [user for user in dataset.manifest["users"][::dataset.manifest["spec"]["teams"]]
+                 if user["username"] != settings.LOGIN_ID]
+        return [(user["username"], dataset.password) for user in users[:count]], dataset.manifest["teams"][0]["name"]
+    credentials = []
+    if settings.OTHER_USER_LOGIN and settings.OTHER_USER_PASSWORD and settings.OTHER_USER_LOGIN != settings.LOGIN_ID:
+        credentials.append((settings.OTHER_USER_LOGIN, settings.OTHER_USER_PASSWORD))
+    return credentials[:count], None
+
+
+def _user_id(client, base_url, headers=None):
+    """Идентификатор пользователя сессии (GET /users/me); HTTP-ошибки поднимаются как HTTPError."""
+    response = client.get(f"{base_url}/api/v4/users/me", headers=headers, timeout=10)
+    response.raise_for_status()
+    return response.json()["id"]
+
+
+def run_delivery(sizes, messages=50, receivers=2, senders=1, rate=None, dataset=None, timeout=DEFAULT_DELIVERY_TIMEOUT):
+    """Замеры доставки для каналов каждого размера из sizes; возвращает строки {"members", ...сводка}."""
+    credentials, team_name = _receiver_credentials(dataset, receivers)
+    if not credentials:
+        raise ValueError("Нет получателей, кроме отправителя: задайте MATTERMOST_OTHER_USER_LOGIN/PASSWORD или --dataset")
+    limiter = AdaptiveLimiter(max(senders, settings.POOL_SIZE))
+    client = ApiClient(pool_size=max(senders, settings.POOL_SIZE), limiter=limiter)
+    anon_client = ApiClient(limiter=limiter)
+    signed_in = False
+    sessions, receiver_tokens, rows = [], [], []
+    try:
+        # Токен основного пользователя берется из кэша на диске, а открытая здесь сессия завершается в конце
+        client.set_token(session_token(client, settings.BASE_URL, settings.LOGIN_ID, settings.PASSWORD))
+        signed_in = True
+        me_id = _user_id(client, settings.BASE_URL)
+        team_id = settings.TEAM_ID
+        if team_name:
+            team_id = client.get(f"{settings.BASE_URL}/api/v4/teams/name/{team_name}", timeout=10).json()["id"]
+            client.post(f"{settings.BASE_URL}/api/v4/teams/{team_id}/members/batch", json=[{"team_id": team_id, "user_id": me_id}],
+                        timeout=10).raise_for_status()
+        for login_id, password in credentials:
+            token = login(anon_client, settings.BASE_URL, login_id, password)
+            receiver_tokens.append(token)
+            user_id = _user_id(anon_client, settings.BASE_URL, headers=auth_headers(token))
+            sessions.append((user_id, WebSocketReceiver(settings.BASE_URL, token, name=login_id).connect()))
+        receiver_ids = [user_id for user_id, _ in sessions]
+        padding_pool = team_user_ids(client, settings.BASE_URL, team_id, max(sizes), exclude={me_id, *receiver_ids})
+        for size in sorted(sizes):
+            ctx = ScenarioContext(client, anon_client, settings.BASE_URL, team_id, settings.LOGIN_ID, settings.PASSWORD)
+            ctx.setup()
+            try:
+                # Создатель канала и получатели - участники, остальное место занимают другие пользователи команды
+                padding = padding_pool[:max(size - 1 - len(receiver_ids), 0)]
+                add_members(client, settings.BASE_URL, ctx.channel_id, receiver_ids + padding)
+                members = 1 + len(receiver_ids) + len(padding)
+                print(f"Канал на {members} участников, получателей {len(sessions)}: отправка {messages} сообщений")
+                # Прогревочное сообщение не входит в замер
+                measure_delivery(send_messages(client, settings.BASE_URL, ctx.channel_id, 1), [r for _, r in sessions], timeout)
+                sent = send_messages(client, settings.BASE_URL, ctx.channel_id, messages, senders=senders, rate=rate)
+                rows.append(dict(measure_delivery(sent, [r for _, r in sessions], timeout), members=members))
+            finally:
+                ctx.teardown()
+    finally:
+        for _, receiver in sessions:
+            receiver.close()
+        try:
+            # Сессии получателей открыты только для замера: оставлять их на сервере незачем
+            for token in receiver_tokens:
+                anon_client.post(f"{settings.BASE_URL}/api/v4/users/logout", headers=auth_headers(token), timeout=10)
+            if signed_in:
+                end_session(client, settings.BASE_URL)
+        except requests.exceptions.RequestException as e:
+            print(f"Предупреждение: Не удалось завершить сессии замера: {e}")
+        finally:
+            client.close()
+            anon_client.close()
+    print(format_throttle_stats(limiter.stats.as_dict()))
+    return rows
+
+
+def format_results(rows):
+    def ms(value):
+        return f"{value * 1000:8.1f}" if value is not None else f"{'-':>8}"
+
+    header = (f"{'Участников':>10} {'Получат.':>8} {'Постов':>7} {'Потеряно':>8} {'ack p50':>8} {'дост p50':>8} "
+              f"{'дост p95':>8} {'дост p99':>8} {'полн p95':>8}")
+    lines = [header, "-" * len(header)]
+    for row in rows:
+        lines.append(f"{row['members']:>10} {row['receivers']:>8} {row['posts']:>7} {row['missing']:>8} {ms(row['ack']['p50'])} "
+                     f"{ms(row['delivery']['p50'])} {ms(row['delivery']['p95'])} {ms(row['delivery']['p99'])} {ms(row['fanout']['p95'])}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Сквозная задержка доставки сообщений получателям через WebSocket")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100], help="размеры каналов (число участников)")
+    parser.add_argument("--messages", type=int, default=50, help="сообщений на размер канала")
+    parser.add_argument("--receivers", type=int, default=2, help="сколько сессий WebSocket получают сообщения")
+    parser.add_argument("--senders", type=int, default=1, help="параллельных отправителей")
+    parser.add_argument("--rate", type=float, help="общий темп отправки, сообщений в секунду")
+    parser.add_argument("--dataset", help="манифест засеянного набора: получатели - его пользователи")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_DELIVERY_TIMEOUT, help="ожидание доставки, с")
+    parser.add_argument("--output", help="сохранить результаты в JSON-файл")
+    args = parser.parse_args(argv)
+    if settings.missing_required():
+        parser.error(f"Не установлены обязательные переменные окружения: {', '.join(settings.missing_required())}")
+
+    dataset = Dataset.load(args.dataset) if args.dataset else None
+    if dataset is None and not (settings.OTHER_USER_LOGIN and settings.OTHER_USER_PASSWORD):
+        parser.error("Без --dataset получатель - OTHER_USER_ID: задайте MATTERMOST_OTHER_USER_LOGIN и MATTERMOST_OTHER_USER_PASSWORD")
+    rows = run_delivery(args.sizes, messages=args.messages, receivers=args.receivers, senders=args.senders,
+                        rate=args.rate, dataset=dataset, timeout=args.timeout)
+    print(format_results(rows))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(rows, f, ensure_ascii=False, indent=2)
+        print(f"Результаты сохранены в {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
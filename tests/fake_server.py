@@ -0,0 +1,753 @@
+"""
+Фейковый сервер Mattermost в текущем процессе для быстрых прогонов без Docker-стека.
+
+Реализует эндпоинты API v4, которые использует тестовый набор (логин, включая заблокированного
+и неактивного пользователя, каналы, участники каналов, посты), с реалистичными кодами ответов
+и телами ошибок, а также WebSocket API с событиями posted. Запускается за миллисекунды;
+может добавлять задержку к каждому ответу и ограничивать частоту запросов (429, как RateLimitSettings).
+
+Из тестов:  MATTERMOST_FAKE_SERVER=1 pytest tests/
+Отдельно:   python -m tests.fake_server --port 8065 --latency-ms 20
+"""
+import argparse
+import base64
+import hashlib
+import json
+import math
+import os
+import queue
+import random
+import re
+import secrets
+import string
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# Учетные данные пользователей, которыми засевается фейковый сервер
+DEFAULT_USERS = {
+    "main": {"username": "sysadmin", "password": "Sys@dmin-sample1"},
+    "other": {"username": "user-1", "password": "SampleUs@r-1"},
+    "locked": {"username": "locked-user", "password": "Locked@user-1"},
+    "inactive": {"username": "inactive-user", "password": "Inactive@user-1"},
+}
+# Mattermost блокирует аккаунт после этого числа неудачных попыток входа
+MAX_LOGIN_ATTEMPTS = 10
+# Пароль дополнительных пользователей (extra_users), которые нужны только как участники каналов
+EXTRA_USER_PASSWORD = "Extra@user-1"
+# Сколько пользователей можно добавить в канал одним запросом (user_ids)
+MAX_MEMBERS_BATCH = 1000
+# Запас запросов сверх частоты при включенном ограничении (MaxBurst в RateLimitSettings Mattermost)
+DEFAULT_RATE_BURST = 100
+# Версия, которую фейковый сервер сообщает в заголовке X-Version-Id
+SERVER_VERSION = "9.11.0.fake"
+_ID_ALPHABET = string.ascii_lowercase + string.digits
+# Константа рукопожатия WebSocket (RFC 6455)
+_WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+_WS_TEXT, _WS_CLOSE, _WS_PING, _WS_PONG = 0x1, 0x8, 0x9, 0xA
+
+
+def new_id():
+    """Идентификатор в формате Mattermost: 26 символов [a-z0-9]."""
+    return "".join(secrets.choice(_ID_ALPHABET) for _ in range(26))
+
+
+def now_ms():
+    return int(time.time() * 1000)
+
+
+class RateLimit:
+    """
+    Ограничение частоты как RateLimitSettings Mattermost (GCRA): per_sec запросов в секунду
+    с запасом max_burst. Одна квота на сервер - как VaryByRemoteAddr при одном хосте клиентов.
+    """
+
+    def __init__(self, per_sec, max_burst):
+        self.interval = 1.0 / per_sec
+        self.burst = max_burst
+        self._tat = 0.0
+        self._lock = threading.Lock()
+
+    def check(self):
+        """(разрешен ли запрос, заголовки X-RateLimit-* и Retry-After для ответа)."""
+        now = time.monotonic()
+        with self._lock:
+            tat = max(self._tat, now)
+            allowed = now >= tat - self.burst * self.interval
+            if allowed:
+                tat = self._tat = tat + self.interval
+        headers = {"X-RateLimit-Limit": str(self.burst + 1),
+                   "X-RateLimit-Remaining": str(max(math.floor((now - tat) / self.interval) + self.burst + 1, 0) if allowed else 0),
+                   "X-RateLimit-Reset": str(math.ceil(tat - now))}
+        if not allowed:
+            headers["Retry-After"] = str(math.ceil(tat - self.burst * self.interval - now))
+        return allowed, headers
+
+
+class ApiError(Exception):
+    """Ошибка API в формате Mattermost: {"id", "message", "status_code"}."""
+
+    def __init__(self, status, error_id, message):
+        super().__init__(message)
+        self.status = status
+        self.error_id = error_id
+        self.message = message
+
+    def body(self):
+        return {"id": self.error_id, "message": self.message, "detailed_error": "", "request_id": new_id(), "status_code": self.status}
+
+
+def _ws_frame(opcode, payload):
+    """Кадр WebSocket от сервера к клиенту (без маски)."""
+    length = len(payload)
+    if length < 126:
+        header = struct.pack(">BB", 0x80 | opcode, length)
+    elif length < 65536:
+        header = struct.pack(">BBH", 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack(">BBQ", 0x80 | opcode, 127, length)
+    return header + payload
+
+
+def _read_ws_frame(rfile):
+    """Читает кадр клиента; (None, b"") - соединение закрыто."""
+    head = rfile.read(2)
+    if len(head) < 2:
+        return None, b""
+    opcode, length = head[0] & 0x0F, head[1] & 0x7F
+    if length == 126:
+        length = struct.unpack(">H", rfile.read(2))[0]
+    elif length == 127:
+        length = struct.unpack(">Q", rfile.read(8))[0]
+    mask = rfile.read(4) if head[1] & 0x80 else b""
+    payload = rfile.read(length)
+    if mask:
+        payload = bytes(byte ^ mask[i % 4] for i, byte in enumerate(payload))
+    return opcode, payload
+
+
+class WebSocketSession:
+    """Подключение клиента к WebSocket API: последовательная запись кадров и счетчик seq событий."""
+
+    def __init__(self, wfile):
+        self.wfile = wfile
+        self.seq = 0
+        self._lock = threading.Lock()
+
+    def send(self, opcode, payload):
+        with self._lock:
+            self.wfile.write(_ws_frame(opcode, payload))
+
+    def send_json(self, message):
+        with self._lock:
+            if "event" in message:
+                message = dict(message, seq=self.seq)
+                self.seq += 1
+            self.wfile.write(_ws_frame(_WS_TEXT, json.dumps(message).encode()))
+
+
+class FakeRequest:
+    """Разобранный запрос, который получают обработчики: тело, параметры, заголовки, токен и пользователь."""
+
+    def __init__(self, body, query, headers):
+        self.body = body
+        self.query = query
+        self.headers = headers
+        auth = headers.get("Authorization", "")
+        self.token = auth[len("Bearer "):] if auth.startswith("Bearer ") else headers.get("Token")
+        self.user_id = None
+
+
+class FakeMattermost:
+    """
+    Состояние фейкового сервера Mattermost: пользователи, токены, команда, каналы, участники и посты.
+    Все изменения выполняются под одной блокировкой, поэтому сервер безопасен для параллельных клиентов.
+    Обработчики API принимают FakeRequest и параметры пути и возвращают (статус, тело[, заголовки]).
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, extra_users=0, rate_limit=0.0, rate_burst=DEFAULT_RATE_BURST):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = RateLimit(rate_limit, rate_burst) if rate_limit else None
+        self.lock = threading.RLock()
+        self.users = {}
+        self.passwords = {}
+        self.tokens = {}
+        self.teams = {}
+        self.team_members = {}
+        self.channels = {}
+        self.members = {}
+        self.posts = {}
+        # Позиции постов в списке канала: курсоры before/after находятся без перебора истории
+        self.post_positions = {}
+        # Подключения WebSocket по пользователям; события рассылает отдельный поток, как и настоящий сервер - асинхронно
+        self.sockets = {}
+        self._events = queue.Queue()
+        threading.Thread(target=self._deliver_events, name="fake-mattermost-events", daemon=True).start()
+        self.team_id = self._add_team("test-team")["id"]
+        self.user_ids = {}
+        for role, creds in DEFAULT_USERS.items():
+            user = self._add_user(creds["username"], creds["password"])
+            self.user_ids[role] = user["id"]
+            self.team_members[self.team_id].add(user["id"])
+        self.users[self.user_ids["main"]]["roles"] = "system_admin system_user"
+        self.users[self.user_ids["locked"]]["failed_attempts"] = MAX_LOGIN_ATTEMPTS
+        self.users[self.user_ids["inactive"]]["delete_at"] = now_ms()
+        for index in range(extra_users):
+            self.team_members[self.team_id].add(self._add_user(f"extra-user-{index}", EXTRA_USER_PASSWORD)["id"])
+
+    def _add_team(self, name):
+        team = {"id": new_id(), "name": name, "display_name": name, "type": "O", "create_at": now_ms(), "delete_at": 0}
+        self.teams[team["id"]] = team
+        self.team_members[team["id"]] = set()
+        return team
+
+    def _add_user(self, username, password):
+        created = now_ms()
+        user = {
+            "id": new_id(), "username": username, "email": f"{username}@example.com", "roles": "system_user",
+            "create_at": created, "update_at": created, "delete_at": 0, "failed_attempts": 0, "locale": "en",
+        }
+        self.users[user["id"]] = user
+        self.passwords[username] = (user["id"], password)
+        return user
+
+    def settings(self, base_url):
+        """Переменные окружения MATTERMOST_*, указывающие тестам на этот сервер."""
+        return {
+            "MATTERMOST_BASE_URL": base_url,
+            "MATTERMOST_USER_LOGIN": DEFAULT_USERS["main"]["username"],
+            "MATTERMOST_USER_PASSWORD": DEFAULT_USERS["main"]["password"],
+            "MATTERMOST_TEST_TEAM_ID": self.team_id,
+            "MATTERMOST_OTHER_USER_ID": self.user_ids["other"],
+            "MATTERMOST_OTHER_USER_LOGIN": DEFAULT_USERS["other"]["username"],
+            "MATTERMOST_OTHER_USER_PASSWORD": DEFAULT_USERS["other"]["password"],
+            "MATTERMOST_LOCKED_USER_LOGIN": DEFAULT_USERS["locked"]["username"],
+            "MATTERMOST_LOCKED_USER_PASSWORD": DEFAULT_USERS["locked"]["password"],
+            "MATTERMOST_INACTIVE_USER_LOGIN": DEFAULT_USERS["inactive"]["username"],
+            "MATTERMOST_INACTIVE_USER_PASSWORD": DEFAULT_USERS["inactive"]["password"],
+        }
+
+    # --- WebSocket ---
+
+    def add_socket(self, user_id, session):
+        with self.lock:
+            self.sockets.setdefault(user_id, set()).add(session)
+
+    def remove_socket(self, user_id, session):
+        with self.lock:
+            self.sockets.get(user_id, set()).discard(session)
+
+    def _broadcast(self, channel_id, event, data):
+        """Ставит событие канала в очередь рассылки всем подключениям его участников."""
+        sessions = [session for user_id in self.members[channel_id] for session in self.sockets.get(user_id, ())]
+        if sessions:
+            message = {"event": event, "data": data, "broadcast": {"omit_users": None, "user_id": "", "channel_id": channel_id, "team_id": ""}}
+            self._events.put((sessions, message))
+
+    def _deliver_events(self):
+        while True:
+            sessions, message = self._events.get()
+            for session in sessions:
+                try:
+                    session.send_json(message)
+                except OSError:
+                    pass  # клиент отключился; подключение уберет его обработчик
+
+    # --- Вспомогательные проверки ---
+
+    def authenticate(self, token):
+        user_id = self.tokens.get(token)
+        if not user_id:
+            raise ApiError(401, "api.context.session_expired.app_error", "Invalid or expired session, please login again.")
+        return user_id
+
+    def _channel(self, channel_id):
+        channel = self.channels.get(channel_id)
+        if channel is None:
+            raise ApiError(404, "app.channel.get.existing.app_error", "Unable to find the existing channel.")
+        return channel
+
+    def _member(self, channel_id, user_id):
+        created = now_ms()
+        return {"channel_id": channel_id, "user_id": user_id, "roles": "channel_user", "last_viewed_at": 0, "msg_count": 0,
+                "mention_count": 0, "notify_props": {}, "last_update_at": created, "scheme_user": True, "scheme_admin": False}
+
+    # --- Обработчики API ---
+
+    def login(self, req):
+        creds = self.passwords.get(req.body.get("login_id"))
+        if creds is None:
+            raise ApiError(401, "api.user.login.invalid_credentials_email_username", "Enter a valid email or username and/or password.")
+        user_id, password = creds
+        user = self.users[user_id]
+        if user["failed_attempts"] >= MAX_LOGIN_ATTEMPTS:
+            raise ApiError(401, "api.user.check_user_login_attempts.too_many.app_error", "Your account is locked because of too many failed password attempts. Please reset your password.")
+        if password != req.body.get("password"):
+            user["failed_attempts"] += 1
+            raise ApiError(401, "api.user.login.invalid_credentials_email_username", "Enter a valid email or username and/or password.")
+        if user["delete_at"]:
+            raise ApiError(401, "api.user.login.inactive.app_error", "Login failed because your account has been deactivated. Please contact an administrator.")
+        token = new_id()
+        self.tokens[token] = user_id
+        return 200, user, {"Token": token}
+
+    def ping(self, req):
+        return 200, {"status": "OK"}
+
+    def logout(self, req):
+        self.tokens.pop(req.token, None)
+        return 200, {"status": "OK"}
+
+    def get_user(self, req, target):
+        target = req.user_id if target == "me" else target
+        if target not in self.users:
+            raise ApiError(404, "app.user.missing_account.const", "Unable to find the user.")
+        return 200, self.users[target]
+
+    def list_users(self, req):
+        page, per_page = int(req.query.get("page", 0)), min(int(req.query.get("per_page", 60)), 200)
+        users = self.users.values()
+        if req.query.get("in_team"):
+            users = [self.users[user_id] for user_id in self.team_members.get(req.query["in_team"], ())]
+        users = sorted(users, key=lambda user: user["username"])
+        return 200, users[page * per_page:(page + 1) * per_page]
+
+    def create_team(self, req):
+        name = req.body.get("name")
+        if not name or not re.fullmatch(r"[a-z0-9][a-z0-9-]{1,63}", name):
+            raise ApiError(400, "model.team.is_valid.name.app_error", "Name must be 2 or more lowercase alphanumeric characters.")
+        if any(team["name"] == name for team in self.teams.values()):
+            raise ApiError(400, "app.team.save.existing.app_error", "A team with that name already exists.")
+        team = self._add_team(name)
+        team["display_name"] = req.body.get("display_name", name)
+        self.team_members[team["id"]].add(req.user_id)
+        return 201, team
+
+    def user_teams(self, req, target):
+        target = req.user_id if target == "me" else target
+        return 200, [team for team_id, team in self.teams.items() if target in self.team_members[team_id]]
+
+    def team_by_name(self, req, name):
+        team = next((team for team in self.teams.values() if team["name"] == name), None)
+        if team is None:
+            raise ApiError(404, "app.team.get_by_name.missing.app_error", "Unable to find the existing team.")
+        return 200, team
+
+    def add_team_members(self, req, team_id):
+        if team_id not in self.teams:
+            raise ApiError(404, "app.team.get.find.app_error", "Unable to find the existing team.")
+        if any(member.get("user_id") not in self.users for member in req.body):
+            raise ApiError(400, "api.team.add_user_to_team.invalid_user_id", "Invalid user_id.")
+        for member in req.body:
+            self.team_members[team_id].add(member["user_id"])
+        return 201, [{"team_id": team_id, "user_id": member["user_id"], "roles": "team_user"} for member in req.body]
+
+    def create_user(self, req):
+        if "system_admin" not in self.users[req.user_id]["roles"]:
+            raise ApiError(403, "api.context.permissions.app_error", "You do not have the appropriate permissions.")
+        username = req.body.get("username")
+        if not username or not re.fullmatch(r"[a-z][a-z0-9._-]{2,21}", username):
+            raise ApiError(400, "model.user.is_valid.username.app_error", "Invalid username.")
+        if username in self.passwords:
+            raise ApiError(400, "app.user.save.username_exists.app_error", "An account with that username already exists.")
+        user = self._add_user(username, req.body.get("password", ""))
+        user["email"] = req.body.get("email", user["email"])
+        return 201, user
+
+    def user_by_username(self, req, username):
+        creds = self.passwords.get(username)
+        if creds is None:
+            raise ApiError(404, "app.user.missing_account.const", "Unable to find the user.")
+        return 200, self.users[creds[0]]
+
+    def create_channel(self, req):
+        team_id, name = req.body.get("team_id"), req.body.get("name")
+        if team_id not in self.teams:
+            raise ApiError(400, "model.channel.is_valid.team_id.app_error", "Invalid team ID.")
+        if not name or not re.fullmatch(r"[a-z0-9][a-z0-9_-]{0,63}", name):
+            raise ApiError(400, "model.channel.is_valid.name.app_error", "Invalid channel name.")
+        if any(c["team_id"] == team_id and c["name"] == name for c in self.channels.values()):
+            raise ApiError(400, "store.sql_channel.save_channel.exists.app_error", "A channel with that name already exists on the same team.")
+        created = now_ms()
+        channel = {
+            "id": new_id(), "team_id": team_id, "name": name, "display_name": req.body.get("display_name", name),
+            "type": req.body.get("type", "O"), "header": req.body.get("header", ""), "purpose": req.body.get("purpose", ""),
+            "create_at": created, "update_at": created, "delete_at": 0, "last_post_at": created,
+            "total_msg_count": 0, "creator_id": req.user_id,
+        }
+        self.channels[channel["id"]] = channel
+        self.members[channel["id"]] = {req.user_id: self._member(channel["id"], req.user_id)}
+        self.posts[channel["id"]] = []
+        self.post_positions[channel["id"]] = {}
+        return 201, channel
+
+    def channel_by_name(self, req, team_id, name):
+        channel = next((c for c in self.channels.values() if c["team_id"] == team_id and c["name"] == name and not c["delete_at"]), None)
+        if channel is None:
+            raise ApiError(404, "app.channel.get_by_name.missing.app_error", "Unable to find the existing channel.")
+        return 200, channel
+
+    def get_channel(self, req, channel_id):
+        return 200, self._channel(channel_id)
+
+    def channel_stats(self, req, channel_id):
+        self._channel(channel_id)
+        return 200, {"channel_id": channel_id, "member_count": len(self.members[channel_id]), "guest_count": 0, "pinnedpost_count": 0}
+
+    def _team_channels(self, req, team_id, predicate):
+        if team_id not in self.teams:
+            raise ApiError(404, "app.team.get.find.app_error", "Unable to find the existing team.")
+        page, per_page = int(req.query.get("page", 0)), min(int(req.query.get("per_page", 60)), 200)
+        channels = sorted((c for c in self.channels.values() if c["team_id"] == team_id and predicate(c)), key=lambda c: c["name"])
+        return 200, channels[page * per_page:(page + 1) * per_page]
+
+    def team_channels(self, req, team_id):
+        return self._team_channels(req, team_id, lambda c: c["type"] == "O" and not c["delete_at"])
+
+    def private_channels(self, req, team_id):
+        if "system_admin" not in self.users[req.user_id]["roles"]:
+            raise ApiError(403, "api.context.permissions.app_error", "You do not have the appropriate permissions.")
+        return self._team_channels(req, team_id, lambda c: c["type"] == "P" and not c["delete_at"])
+
+    def deleted_channels(self, req, team_id):
+        return self._team_channels(req, team_id, lambda c: c["delete_at"])
+
+    def delete_channel(self, req, channel_id):
+        channel = self._channel(channel_id)
+        if req.query.get("permanent") == "true":
+            # Безвозвратное удаление (на настоящем сервере требует ServiceSettings.EnableAPIChannelDeletion)
+            for table in (self.channels, self.members, self.posts, self.post_positions):
+                table.pop(channel_id, None)
+            return 200, {"status": "OK"}
+        if channel["delete_at"]:
+            raise ApiError(400, "api.channel.delete_channel.deleted.app_error", "The channel has been archived or deleted.")
+        channel["delete_at"] = channel["update_at"] = now_ms()
+        return 200, {"status": "OK"}
+
+    def add_member(self, req, channel_id):
+        channel = self._channel(channel_id)
+        if channel["delete_at"]:
+            raise ApiError(400, "api.channel.add_user.to.channel.failed.deleted.app_error", "Failed to add user to channel because channel has been archived.")
+        targets = req.body.get("user_ids") or [req.body.get("user_id")]
+        if len(targets) > MAX_MEMBERS_BATCH:
+            raise ApiError(400, "api.channel.add_members.user_ids.too_many", f"Too many user_ids, the limit is {MAX_MEMBERS_BATCH}.")
+        if any(target not in self.users for target in targets):
+            raise ApiError(400, "api.channel.add_user_to_channel.invalid_user_id", "Invalid user_id.")
+        members = self.members[channel_id]
+        for target in targets:
+            if target not in members:
+                members[target] = self._member(channel_id, target)
+        # С user_ids сервер отвечает списком участников, с user_id - одним участником
+        if "user_ids" in req.body:
+            return 201, [members[target] for target in targets]
+        return 201, members[targets[0]]
+
+    def list_members(self, req, channel_id):
+        self._channel(channel_id)
+        page, per_page = int(req.query.get("page", 0)), min(int(req.query.get("per_page", 60)), 200)
+        members = list(self.members[channel_id].values())
+        return 200, members[page * per_page:(page + 1) * per_page]
+
+    def get_member(self, req, channel_id, target):
+        self._channel(channel_id)
+        member = self.members[channel_id].get(target)
+        if member is None:
+            raise ApiError(404, "app.channel.get_member.missing.app_error", "No channel member found for that user ID and channel ID.")
+        return 200, member
+
+    def members_by_ids(self, req, channel_id):
+        self._channel(channel_id)
+        members = self.members[channel_id]
+        return 200, [members[user_id] for user_id in req.body if user_id in members]
+
+    def remove_member(self, req, channel_id, target):
+        self._channel(channel_id)
+        if self.members[channel_id].pop(target, None) is None:
+            raise ApiError(404, "app.channel.get_member.missing.app_error", "No channel member found for that user ID and channel ID.")
+        return 200, {"status": "OK"}
+
+    def create_post(self, req):
+        channel = self._channel(req.body.get("channel_id"))
+        if req.user_id not in self.members[channel["id"]]:
+            raise ApiError(403, "api.context.permissions.app_error", "You do not have the appropriate permissions.")
+        created = max(now_ms(), channel["last_post_at"] + 1)
+        post = {
+            "id": new_id(), "create_at": created, "update_at": created, "edit_at": 0, "delete_at": 0,
+            "user_id": req.user_id, "channel_id": channel["id"], "root_id": req.body.get("root_id", ""),
+            "message": req.body.get("message", ""), "type": "", "props": req.body.get("props", {}), "metadata": {},
+        }
+        self.post_positions[channel["id"]][post["id"]] = len(self.posts[channel["id"]])
+        self.posts[channel["id"]].append(post)
+        channel["last_post_at"] = created
+        channel["total_msg_count"] += 1
+        self._broadcast(channel["id"], "posted", {
+            "channel_display_name": channel["display_name"], "channel_name": channel["name"], "channel_type": channel["type"],
+            "post": json.dumps(post), "sender_name": f"@{self.users[req.user_id]['username']}", "team_id": channel["team_id"],
+        })
+        return 201, post
+
+    def channel_posts(self, req, channel_id):
+        self._channel(channel_id)
+        posts = self.posts[channel_id]  # по возрастанию create_at, посты не редактируются
+        page, per_page = int(req.query.get("page", 0)), min(int(req.query.get("per_page", 60)), 200)
+        positions = self.post_positions[channel_id]
+        if "since" in req.query:
+            since = int(req.query["since"])
+            start = len(posts)
+            while start > 0 and posts[start - 1]["update_at"] >= since:
+                start -= 1
+            selected = posts[start:]
+        elif req.query.get("after"):
+            # after отсчитывает страницы от указанного поста к новым; неизвестный пост - пустая выдача
+            start = positions.get(req.query["after"], len(posts)) + 1 + page * per_page
+            selected = posts[start:start + per_page]
+        else:
+            # Без курсора и с before страницы отсчитываются от самых новых постов к старым
+            end = positions.get(req.query["before"], 0) if req.query.get("before") else len(posts)
+            end -= page * per_page
+            selected = posts[max(end - per_page, 0):max(end, 0)]
+        order = [p["id"] for p in reversed(selected)]
+        return 200, {"order": order, "posts": {p["id"]: p for p in selected}, "next_post_id": "", "prev_post_id": "", "has_next": False}
+
+
+# Таблица маршрутов: (метод, шаблон пути, имя обработчика, требуется ли авторизация)
+_ID = r"([a-z0-9]{26}|me)"
+_NAME = r"([a-z0-9][a-z0-9._-]*)"
+ROUTES = [
+    ("GET", r"/api/v4/system/ping", "ping", False),
+    ("POST", r"/api/v4/users/login", "login", False),
+    ("POST", r"/api/v4/users/logout", "logout", True),
+    ("POST", r"/api/v4/teams", "create_team", True),
+    ("GET", rf"/api/v4/teams/name/{_NAME}", "team_by_name", True),
+    ("POST", rf"/api/v4/teams/{_ID}/members/batch", "add_team_members", True),
+    ("GET", rf"/api/v4/teams/{_ID}/channels/name/{_NAME}", "channel_by_name", True),
+    ("GET", rf"/api/v4/teams/{_ID}/channels", "team_channels", True),
+    ("GET", rf"/api/v4/teams/{_ID}/channels/private", "private_channels", True),
+    ("GET", rf"/api/v4/teams/{_ID}/channels/deleted", "deleted_channels", True),
+    ("POST", r"/api/v4/users", "create_user", True),
+    ("GET", r"/api/v4/users", "list_users", True),
+    ("GET", rf"/api/v4/users/username/{_NAME}", "user_by_username", True),
+    ("GET", rf"/api/v4/users/{_ID}", "get_user", True),
+    ("GET", rf"/api/v4/users/{_ID}/teams", "user_teams", True),
+    ("POST", r"/api/v4/channels", "create_channel", True),
+    ("GET", rf"/api/v4/channels/{_ID}", "get_channel", True),
+    ("DELETE", rf"/api/v4/channels/{_ID}", "delete_channel", True),
+    ("GET", rf"/api/v4/channels/{_ID}/stats", "channel_stats", True),
+    ("POST", rf"/api/v4/channels/{_ID}/members", "add_member", True),
+    ("GET", rf"/api/v4/channels/{_ID}/members", "list_members", True),
+    ("POST", rf"/api/v4/channels/{_ID}/members/ids", "members_by_ids", True),
+    ("GET", rf"/api/v4/channels/{_ID}/members/{_ID}", "get_member", True),
+    ("DELETE", rf"/api/v4/channels/{_ID}/members/{_ID}", "remove_member", True),
+    ("POST", r"/api/v4/posts", "create_post", True),
+    ("GET", rf"/api/v4/channels/{_ID}/posts", "channel_posts", True),
+]
+_COMPILED_ROUTES = [(method, re.compile(pattern + r"/?"), name, auth) for method, pattern, name, auth in ROUTES]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "FakeMattermost/1.0"
+    # Заголовки и тело пишутся отдельно: без TCP_NODELAY Nagle + delayed ACK дают ~40 мс на ответ
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _websocket(self):
+        """
+        WebSocket API: авторизация заголовком Authorization при подключении
+        или сообщением authentication_challenge, затем событие hello и рассылка событий.
+        """
+        state = self.server.state
+        key = self.headers.get("Sec-WebSocket-Key", "")
+        self.send_response(101, "Switching Protocols")
+        self.send_header("Upgrade", "websocket")
+        self.send_header("Connection", "Upgrade")
+        self.send_header("Sec-WebSocket-Accept", base64.b64encode(hashlib.sha1((key + _WS_GUID).encode()).digest()).decode())
+        self.end_headers()
+        self.close_connection = True
+        session, user_id = WebSocketSession(self.wfile), None
+
+        def authenticate(token):
+            with state.lock:
+                user = state.tokens.get(token)
+            if user:
+                session.send_json({"event": "hello", "data": {"server_version": SERVER_VERSION, "connection_id": new_id()}, "broadcast": {"user_id": user}})
+                state.add_socket(user, session)
+            return user
+
+        if FakeRequest({}, {}, self.headers).token:
+            user_id = authenticate(FakeRequest({}, {}, self.headers).token)
+        try:
+            while True:
+                opcode, payload = _read_ws_frame(self.rfile)
+                if opcode is None or opcode == _WS_CLOSE:
+                    break
+                if opcode == _WS_PING:
+                    session.send(_WS_PONG, payload)
+                elif opcode == _WS_TEXT:
+                    message = json.loads(payload)
+                    if message.get("action") == "authentication_challenge" and user_id is None:
+                        user_id = authenticate(message.get("data", {}).get("token"))
+                        status = {"status": "OK"} if user_id else {"status": "FAIL", "error": {"id": "api.web_socket_router.not_authenticated.app_error"}}
+                        session.send_json(dict(status, seq_reply=message.get("seq")))
+        except (OSError, ValueError):
+            pass
+        finally:
+            if user_id:
+                state.remove_socket(user_id, session)
+            try:
+                session.send(_WS_CLOSE, b"")
+            except OSError:
+                pass
+
+    def _dispatch(self):
+        state = self.server.state
+        parts = urlsplit(self.path)
+        if parts.path == "/api/v4/websocket" and self.headers.get("Upgrade", "").lower() == "websocket":
+            return self._websocket()
+        query = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        rate_headers = {}
+        if state.rate_limit is not None:
+            allowed, rate_headers = state.rate_limit.check()
+            if not allowed:
+                # Как и Mattermost, сверх квоты отвечает текстом, а не ошибкой API в JSON
+                return self._send(429, b"limit exceeded", rate_headers, content_type="text/plain; charset=utf-8")
+        if state.latency or state.jitter:
+            time.sleep(max(state.latency + random.uniform(-state.jitter, state.jitter), 0))
+        extra_headers = {}
+        try:
+            for method, pattern, name, needs_auth in _COMPILED_ROUTES:
+                match = pattern.fullmatch(parts.path)
+                if method != self.command or not match:
+                    continue
+                try:
+                    body = json.loads(raw) if raw else {}
+                except ValueError:
+                    raise ApiError(400, "api.context.invalid_body_param.app_error", "Invalid or missing body in request body.")
+                req = FakeRequest(body, query, self.headers)
+                with state.lock:
+                    if needs_auth:
+                        req.user_id = state.authenticate(req.token)
+                    result = getattr(state, name)(req, *match.groups())
+                status, payload = result[0], result[1]
+                if len(result) > 2:
+                    extra_headers = result[2]
+                break
+            else:
+                raise ApiError(404, "api.context.404.app_error", "Sorry, we could not find the page.")
+        except ApiError as e:
+            status, payload = e.status, e.body()
+        except Exception as e:
+            status, payload = 500, ApiError(500, "api.fake.internal.app_error", f"{type(e).__name__}: {e}").body()
+        self._send(status, json.dumps(payload).encode(), dict(rate_headers, **extra_headers))
+
+    def _send(self, status, data, headers, content_type="application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("X-Version-Id", SERVER_VERSION)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = do_POST = do_PUT = do_DELETE = _dispatch
+
+
+class FakeServer:
+    """
+    Фейковый сервер Mattermost в текущем процессе (фоновый поток, случайный свободный порт).
+    Пример:
+        with FakeServer() as server:
+            os.environ.update(server.settings())
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, jitter=0.0, extra_users=0, rate_limit=0.0,
+                 rate_burst=DEFAULT_RATE_BURST):
+        self.state = FakeMattermost(latency=latency, jitter=jitter, extra_users=extra_users, rate_limit=rate_limit,
+                                    rate_burst=rate_burst)
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.state = self.state
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def settings(self):
+        return self.state.settings(self.base_url)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="fake-mattermost", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def enabled_from_env():
+    """Включен ли фейковый сервер (MATTERMOST_FAKE_SERVER=1) - и в контроллере, и в воркерах pytest-xdist."""
+    return os.getenv("MATTERMOST_FAKE_SERVER", "").lower() in ("1", "true", "yes")
+
+
+def start_from_env():
+    """
+    Если задан MATTERMOST_FAKE_SERVER=1, запускает фейковый сервер и прописывает его адрес и учетные
+    данные в переменные окружения MATTERMOST_*; возвращает сервер (иначе None).
+    Задержка ответов: MATTERMOST_FAKE_LATENCY_MS и разброс MATTERMOST_FAKE_JITTER_MS;
+    MATTERMOST_FAKE_USERS - сколько дополнительных пользователей создать (для больших каналов);
+    MATTERMOST_FAKE_RATE_LIMIT - ограничение частоты, запросов в секунду (запас - MATTERMOST_FAKE_RATE_BURST).
+    Воркеры pytest-xdist сервер не запускают: они наследуют окружение контроллера и работают с его сервером.
+    """
+    if not enabled_from_env() or os.getenv("PYTEST_XDIST_WORKER"):
+        return None
+    server = FakeServer(latency=float(os.getenv("MATTERMOST_FAKE_LATENCY_MS", 0)) / 1000,
+                        jitter=float(os.getenv("MATTERMOST_FAKE_JITTER_MS", 0)) / 1000,
+                        extra_users=int(os.getenv("MATTERMOST_FAKE_USERS", 0)),
+                        rate_limit=float(os.getenv("MATTERMOST_FAKE_RATE_LIMIT", 0)),
+                        rate_burst=int(os.getenv("MATTERMOST_FAKE_RATE_BURST", DEFAULT_RATE_BURST))).start()
+    os.environ.update(server.settings())
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Фейковый сервер Mattermost для локальных прогонов тестов")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8065)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="задержка каждого ответа, мс")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="случайный разброс задержки, мс")
+    parser.add_argument("--users", type=int, default=0, help="дополнительных пользователей для больших каналов")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="ограничение частоты, запросов в секунду (0 - нет)")
+    parser.add_argument("--rate-burst", type=int, default=DEFAULT_RATE_BURST, help="запас запросов сверх частоты")
+    args = parser.parse_args(argv)
+    server = FakeServer(host=args.host, port=args.port, latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000,
+                        extra_users=args.users, rate_limit=args.rate_limit, rate_burst=args.rate_burst)
+    # Переменные для тестов печатаются до запуска обработки запросов
+    for key, value in server.settings().items():
+        print(f"export {key}={value}", flush=True)
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
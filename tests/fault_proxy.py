@@ -0,0 +1,377 @@
+"""
+Локальный TCP-прокси перед MATTERMOST_BASE_URL, вносящий сетевые сбои: задержку, разброс задержки,
+ограничение полосы, зависание ответа и сброс соединения.
+
+Запуск (переменные окружения те же, что у тестов):
+    python -m tests.fault_proxy --profiles clean wan slow stall reset --users 10 --duration 20
+    python -m tests.fault_proxy --profiles clean custom --delay-ms 300 --bandwidth-kbps 32 --output faults.json
+    python -m tests.fault_proxy --serve wan --port 18066    # только прокси, адрес печатается
+
+Для каждого профиля из --profiles поднимается прокси, и через него выполняется нагрузочный прогон
+сценариев тестового набора (как python -m tests.load). Отчет: пропускная способность и p99 каждого
+сценария относительно первого профиля (обычно clean), ошибки по типам и оценка тайм-аутов запросов
+(10 с по умолчанию и 15 с у логина): запас над p99 худшего маршрута и сколько запросов упало по тайм-ауту.
+
+Сбои вносятся на уровне TCP, отдельно в каждом направлении каждого соединения: каждый прочитанный
+фрагмент задерживается на delay ± jitter, передача ограничивается bandwidth байт/с. Ответ сервера
+с вероятностью stall_rate задерживается на stall секунд, с вероятностью reset_rate вместо него
+соединение сбрасывается (RST); жребий бросается один раз на ответ (по его первому фрагменту после
+запроса), а не на каждый фрагмент, так что длинные ответы не страдают чаще коротких. Фрагменты
+одного направления идут по очереди, поэтому задержка на длинных ответах копится - как на канале
+с маленьким окном TCP.
+"""
+import argparse
+import json
+import random
+import socket
+import struct
+import sys
+import threading
+import time
+from urllib.parse import urlsplit, urlunsplit
+from .api_client import DEFAULT_TIMEOUT
+from .load import run_load, parse_mix
+from . import settings
+
+CHUNK_SIZE = 16 * 1024
+# Тайм-аут логина в тестах и api_client.login - больше, чем у остальных запросов
+LOGIN_TIMEOUT = 15
+# Запас тайм-аута над p99 худшего маршрута, ниже которого медленный канал дает ложные тайм-ауты
+MIN_TIMEOUT_HEADROOM = 3.0
+TIMEOUT_ERRORS = ("ReadTimeout", "ConnectTimeout", "Timeout")
+
+
+class FaultProfile:
+    """Параметры сбоев: задержка и разброс (с, в одну сторону), полоса (байт/с), зависание и сброс ответов."""
+
+    def __init__(self, name, delay=0.0, jitter=0.0, bandwidth=None, stall_rate=0.0, stall=0.0, reset_rate=0.0):
+        self.name = name
+        self.delay = delay
+        self.jitter = jitter
+        self.bandwidth = bandwidth
+        self.stall_rate = stall_rate
+        self.stall = stall
+        self.reset_rate = reset_rate
+
+    def as_dict(self):
+        return dict(vars(self))
+
+
+PROFILES = {
+    "clean": FaultProfile("clean"),
+    # Межрегиональный канал: +100 мс к RTT
+    "wan": FaultProfile("wan", delay=0.05, jitter=0.01),
+    # Плохой мобильный канал: +300 мс к RTT с большим разбросом и 512 кбит/с
+    "slow": FaultProfile("slow", delay=0.15, jitter=0.05, bandwidth=64 * 1024),
+    # 2% ответов зависают на 20 с - дольше любого тайм-аута тестов
+    "stall": FaultProfile("stall", stall_rate=0.02, stall=20.0),
+    # 2% ответов заменяются сбросом соединения
+    "reset": FaultProfile("reset", reset_rate=0.02),
+}
+
+
+class FaultProxy:
+    """
+    TCP-прокси на 127.0.0.1 в фоновых потоках: по соединению к upstream на каждого клиента.
+    Пример:
+        with FaultProxy(settings.BASE_URL, PROFILES["wan"]) as proxy:
+            requests.get(f"{proxy.base_url}/api/v4/system/ping", timeout=10)
+    """
+
+    def __init__(self, target_url, profile, port=0, seed=None):
+        parts = urlsplit(target_url)
+        self.target_url = target_url
+        self.upstream = (parts.hostname, parts.port or (443 if parts.scheme == "https" else 80))
+        self.profile = profile
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self._listener = socket.create_server(("127.0.0.1", port))
+        self._sockets = set()
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self.stats = {"connections": 0, "stalls": 0, "resets": 0}
+
+    @property
+    def base_url(self):
+        """MATTERMOST_BASE_URL через прокси (для https имя в сертификате сервера не совпадет с 127.0.0.1)."""
+        parts = urlsplit(self.target_url)
+        return urlunsplit((parts.scheme, f"127.0.0.1:{self._listener.getsockname()[1]}", parts.path.rstrip("/"), "", ""))
+
+    def start(self):
+        threading.Thread(target=self._accept, name="fault-proxy", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._closed.set()
+        _close(self._listener)
+        with self._lock:
+            sockets, self._sockets = list(self._sockets), set()
+        for sock in sockets:
+            _close(sock)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _random(self):
+        with self._rng_lock:
+            return self._rng.random()
+
+    def _delay(self, profile):
+        with self._rng_lock:
+            return max(profile.delay + self._rng.uniform(-profile.jitter, profile.jitter), 0.0)
+
+    def _accept(self):
+        while not self._closed.is_set():
+            try:
+                client, _ = self._listener.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._connect, args=(client,), daemon=True).start()
+
+    def _connect(self, client):
+        try:
+            upstream = socket.create_connection(self.upstream, timeout=10)
+        except OSError:
+            _close(client)
+            return
+        upstream.settimeout(None)
+        for sock in (client, upstream):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with self._lock:
+            self._sockets.update((client, upstream))
+            self.stats["connections"] += 1
+        if self._closed.is_set():
+            self.stop()
+            return
+        # Выставляется перед пересылкой запроса: следующий фрагмент от сервера - начало нового ответа
+        awaiting_response = threading.Event()
+        threading.Thread(target=self._pump, args=(client, upstream, awaiting_response, False), daemon=True).start()
+        self._pump(upstream, client, awaiting_response, True)
+        # Сервер закрыл соединение (или оно сброшено) - клиентскую сторону держать незачем
+        with self._lock:
+            self._sockets.difference_update((client, upstream))
+        _close(client)
+        _close(upstream)
+
+    def _pump(self, source, target, awaiting_response, is_response):
+        """
+        Пересылает данные в одну сторону, внося задержку и ограничение полосы; зависание и сброс
+        разыгрываются один раз на ответ - по его первому фрагменту (HTTP/1.1 без конвейеризации).
+        """
+        try:
+            while True:
+                data = source.recv(CHUNK_SIZE)
+                if not data:
+                    break
+                # Профиль можно сменить на ходу (например, включить сбои только на время нагрузки)
+                profile = self.profile
+                response_start = False
+                if is_response and awaiting_response.is_set():
+                    awaiting_response.clear()
+                    response_start = True
+                elif not is_response:
+                    awaiting_response.set()
+                if response_start and profile.reset_rate and self._random() < profile.reset_rate:
+                    self._count("resets")
+                    _reset(target)
+                    _close(source)
+                    return
+                if response_start and profile.stall_rate and self._random() < profile.stall_rate:
+                    self._count("stalls")
+                    if self._closed.wait(profile.stall):
+                        return
+                if profile.delay or profile.jitter:
+                    time.sleep(self._delay(profile))
+                target.sendall(data)
+                if profile.bandwidth:
+                    time.sleep(len(data) / profile.bandwidth)
+            target.shutdown(socket.SHUT_WR)
+        except OSError:
+            _close(target)
+            _close(source)
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+
+def _close(sock):
+    """Закрывает сокет; shutdown будит поток, заблокированный в recv/accept на этом же сокете."""
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+    try:
+        sock.close()
+    except OSError:
+        pass
+
+
+def _reset(sock):
+    """Закрывает соединение сбросом (RST) вместо обычного FIN."""
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+        # SHUT_RD будит встречный поток в recv, ничего не отправляя; RST уходит при close
+        sock.shutdown(socket.SHUT_RD)
+    except OSError:
+        pass
+    try:
+        sock.close()
+    except OSError:
+        pass
+
+
+def timeout_verdict(result, profile):
+    """
+    Оценка тайм-аутов по прогону через прокси. Для профилей задержки и полосы - запас тайм-аута
+    над p99 худшего маршрута; для профилей с зависаниями и сбросами - сколько запросов упало
+    и за сколько клиент замечает зависшее соединение (самый долгий запрос).
+    """
+    routes = result["endpoints"]
+    worst_route, worst = max(((route, stats) for route, stats in routes.items() if stats["p99"] is not None),
+                             key=lambda item: item[1]["p99"], default=(None, None))
+    kinds = {}
+    for scenario_kinds in result["error_kinds"].values():
+        for kind, count in scenario_kinds.items():
+            kinds[kind] = kinds.get(kind, 0) + count
+    verdict = {"worst_route": worst_route, "worst_p99": worst["p99"] if worst else None, "errors": kinds,
+               "timeouts": sum(count for kind, count in kinds.items() if kind in TIMEOUT_ERRORS),
+               "faults": bool(profile.stall_rate or profile.reset_rate)}
+    if worst:
+        timeout = LOGIN_TIMEOUT if worst_route.endswith("/users/login") else DEFAULT_TIMEOUT
+        verdict["timeout"] = timeout
+        verdict["headroom"] = timeout / worst["p99"] if worst["p99"] else None
+        verdict["max_latency"] = max(stats["max"] for stats in routes.values() if stats["max"] is not None)
+    return verdict
+
+
+def suggested_timeout(rows):
+    """
+    Тайм-аут, которого хватило бы на профилях задержки и полосы: MIN_TIMEOUT_HEADROOM x худший p99.
+    Возвращает (секунды, имя профиля) или None, если таких профилей в прогоне не было.
+    """
+    candidates = [(row["timeouts"]["worst_p99"], row["profile"]["name"]) for row in rows
+                  if not row["timeouts"]["faults"] and row["timeouts"]["worst_p99"] is not None]
+    if not candidates:
+        return None
+    p99, name = max(candidates)
+    return max(p99 * MIN_TIMEOUT_HEADROOM, 1.0), name
+
+
+def run_profiles(profiles, users, duration, mix=None, seed=None):
+    """Нагрузочный прогон через прокси с каждым профилем; возвращает строки {"profile", "proxy", "load", "timeouts"}."""
+    rows = []
+    for profile in profiles:
+        print(f"Профиль {profile.name}: {users} пользователей, {duration:g} с")
+        # Каналы сценариев создаются и удаляются без сбоев: они вносятся только на время нагрузки
+        with FaultProxy(settings.BASE_URL, PROFILES["clean"], seed=seed) as proxy:
+            result = run_load(users, duration, mix=mix, seed=seed, base_url=proxy.base_url,
+                              on_start=lambda: setattr(proxy, "profile", profile),
+                              on_stop=lambda: setattr(proxy, "profile", PROFILES["clean"]))
+            rows.append({"profile": profile.as_dict(), "proxy": dict(proxy.stats), "load": result,
+                         "timeouts": timeout_verdict(result, profile)})
+    return rows
+
+
+def format_results(rows):
+    """Таблица деградации сценариев относительно первого профиля и оценка тайм-аутов по профилям."""
+    baseline = rows[0]["load"]["scenarios"]
+    header = f"{'Профиль':<10} {'Сценарий':<20} {'в сек':>8} {'x база':>7} {'p99 мс':>9} {'x база':>7} {'Ошибки':>7}"
+    lines = [header, "-" * len(header)]
+    for row in rows:
+        for name, stats in row["load"]["scenarios"].items():
+            base = baseline.get(name)
+            throughput_ratio = stats["throughput"] / base["throughput"] if base and base["throughput"] else None
+            p99_ratio = stats["p99"] / base["p99"] if base and base["p99"] and stats["p99"] is not None else None
+            lines.append(f"{row['profile']['name']:<10} {name:<20} {stats['throughput']:>8.1f} "
+                         f"{_ratio(throughput_ratio)} {_ms(stats['p99'])} {_ratio(p99_ratio)} {stats['error_rate']:>7.1%}")
+    lines.append("")
+    for row in rows:
+        verdict, name = row["timeouts"], row["profile"]["name"]
+        if verdict["worst_route"] is None:
+            continue
+        if verdict["faults"]:
+            line = (f"{name}: зависаний {row['proxy']['stalls']}, сбросов {row['proxy']['resets']}, "
+                    f"упало по тайм-ауту {verdict['timeouts']}")
+            if row["proxy"]["stalls"]:
+                line += f", зависший запрос обнаружен за {verdict['max_latency']:.1f} с"
+        else:
+            line = (f"{name}: худший p99 {verdict['worst_p99'] * 1000:.0f} мс ({verdict['worst_route']}), "
+                    f"запас тайм-аута {verdict['timeout']} с - x{verdict['headroom']:.1f}, упало по тайм-ауту {verdict['timeouts']}")
+            if verdict["headroom"] < MIN_TIMEOUT_HEADROOM:
+                line += f" - меньше x{MIN_TIMEOUT_HEADROOM:g}, на таком канале возможны ложные падения по тайм-ауту"
+        lines.append(line)
+        if verdict["errors"]:
+            lines.append(f"    ошибки: {', '.join(f'{kind} {count}' for kind, count in sorted(verdict['errors'].items()))}")
+    suggestion = suggested_timeout(rows)
+    if suggestion:
+        seconds, name = suggestion
+        lines.append(f"Тайм-ауты {DEFAULT_TIMEOUT} с (логин {LOGIN_TIMEOUT} с): на профиле {name} хватило бы {seconds:.1f} с "
+                     f"(x{MIN_TIMEOUT_HEADROOM:g} худшего p99); больший тайм-аут только дольше держит зависший запрос")
+    return "\n".join(lines)
+
+
+def _ratio(value):
+    return f"{value:>7.2f}" if value is not None else f"{'-':>7}"
+
+
+def _ms(value):
+    return f"{value * 1000:>9.1f}" if value is not None else f"{'-':>9}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Деградация сценариев и проверка тайм-аутов через прокси с сетевыми сбоями")
+    parser.add_argument("--profiles", nargs="+", default=["clean", "wan", "slow", "stall", "reset"],
+                        help=f"профили сбоев: {', '.join(PROFILES)} или custom (параметры ниже); первый - база сравнения")
+    parser.add_argument("--users", type=int, default=10, help="число виртуальных пользователей")
+    parser.add_argument("--duration", type=float, default=20, help="длительность прогона на профиль, с")
+    parser.add_argument("--mix", help="веса сценариев, как у python -m tests.load")
+    parser.add_argument("--seed", type=int, help="seed выбора сценариев и сбоев")
+    parser.add_argument("--delay-ms", type=float, default=0.0, help="custom: задержка в одну сторону, мс")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="custom: разброс задержки, мс")
+    parser.add_argument("--bandwidth-kbps", type=float, help="custom: полоса, кбайт/с")
+    parser.add_argument("--stall-rate", type=float, default=0.0, help="custom: доля зависающих ответов")
+    parser.add_argument("--stall-s", type=float, default=20.0, help="custom: на сколько зависает ответ, с")
+    parser.add_argument("--reset-rate", type=float, default=0.0, help="custom: доля ответов, заменяемых сбросом соединения")
+    parser.add_argument("--serve", metavar="PROFILE", help="только поднять прокси с профилем и ждать Ctrl+C")
+    parser.add_argument("--port", type=int, default=0, help="порт прокси для --serve")
+    parser.add_argument("--output", help="сохранить результаты в JSON-файл")
+    args = parser.parse_args(argv)
+    if settings.missing_required():
+        parser.error(f"Не установлены обязательные переменные окружения: {', '.join(settings.missing_required())}")
+
+    custom = FaultProfile("custom", delay=args.delay_ms / 1000, jitter=args.jitter_ms / 1000,
+                          bandwidth=args.bandwidth_kbps * 1024 if args.bandwidth_kbps else None,
+                          stall_rate=args.stall_rate, stall=args.stall_s, reset_rate=args.reset_rate)
+    profiles = dict(PROFILES, custom=custom)
+    unknown = [name for name in args.profiles + ([args.serve] if args.serve else []) if name not in profiles]
+    if unknown:
+        parser.error(f"Неизвестные профили: {', '.join(unknown)}. Доступны: {', '.join(profiles)}")
+    try:
+        mix = parse_mix(args.mix) if args.mix else None
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.serve:
+        with FaultProxy(settings.BASE_URL, profiles[args.serve], port=args.port, seed=args.seed) as proxy:
+            print(f"export MATTERMOST_BASE_URL={proxy.base_url}", flush=True)
+            try:
+                threading.Event().wait()
+            except KeyboardInterrupt:
+                pass
+        return 0
+
+    rows = run_profiles([profiles[name] for name in args.profiles], args.users, args.duration, mix=mix, seed=args.seed)
+    print(format_results(rows))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(rows, f, ensure_ascii=False, indent=2)
+        print(f"Результаты сохранены в {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+"""
+Пропускная способность чтения истории большого канала.
+
+Запуск (переменные окружения те же, что у тестов):
+    python -m tests.history --posts 20000 --page-sizes 60 200 --depths 0 10 100
+    python -m tests.history --channel-id <id> --page-sizes 200    # готовый большой канал, без наполнения
+    python -m tests.history --dataset dataset-s42.json --posts 50000  # канал засеянного набора примерно с 50000 постов
+
+Канал наполняется --posts сообщениями (параллельно, --seed-workers потоками), затем для каждого размера страницы:
+    - вся история читается курсором before: постов в секунду и задержка одной страницы;
+    - на каждой глубине --depths (в страницах от самых новых постов) замеряется одна страница
+      смещением page и курсором before;
+    - догоняющее чтение курсором after от самой глубокой точки до самых новых постов.
+Созданный для замера канал удаляется в конце.
+"""
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .api_client import ApiClient
+from .metrics import summarize
+from .post_reader import fetch_page, iter_history_pages, iter_new_pages
+from .rate_limit import AdaptiveLimiter, format_stats as format_throttle_stats
+from .scenarios import ScenarioContext
+from .seeding import Dataset
+from .token_cache import end_session, session_token
+from . import settings
+
+
+def seed_channel(client, base_url, channel_id, count, workers=8):
+    """Отправляет в канал count сообщений в workers потоков; возвращает затраченное время, с."""
+    def send(index):
+        payload = {"channel_id": channel_id, "message": f"Сообщение истории {index}"}
+        client.post(f"{base_url}/api/v4/posts", json=payload, timeout=10).raise_for_status()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(send, range(count)))
+    return time.perf_counter() - started
+
+
+def _throughput(posts, page_times, elapsed):
+    return {"posts": posts, "pages": len(page_times), "elapsed": elapsed,
+            "posts_per_second": posts / elapsed if elapsed else None, "page": summarize(page_times)}
+
+
+def measure_history(client, base_url, channel_id, per_page, depths=(0,), samples=5):
+    """
+    Замеры чтения истории канала страницами по per_page постов.
+    Глубины, до которых история не дотягивается, пропускаются.
+    """
+    anchors = {0: None}  # глубина в страницах -> пост, перед которым она начинается
+    posts, page_times = 0, []
+    started = time.perf_counter()
+    for index, page in enumerate(iter_history_pages(client, base_url, channel_id, per_page=per_page)):
+        posts += len(page.posts)
+        page_times.append(page.elapsed)
+        if index + 1 in depths:
+            anchors[index + 1] = page.posts[-1]["id"]
+    result = {"per_page": per_page, "history": _throughput(posts, page_times, time.perf_counter() - started), "depths": {}}
+
+    for depth in sorted(d for d in depths if d in anchors):
+        offset_times, cursor_times = [], []
+        for _ in range(samples):
+            offset_times.append(fetch_page(client, base_url, channel_id, page=depth, per_page=per_page).elapsed)
+            params = {"before": anchors[depth]} if anchors[depth] else {}
+            cursor_times.append(fetch_page(client, base_url, channel_id, per_page=per_page, **params).elapsed)
+        result["depths"][depth] = {"offset": summarize(offset_times), "cursor": summarize(cursor_times)}
+
+    deepest = max(anchors)
+    if deepest:
+        posts, page_times = 0, []
+        started = time.perf_counter()
+        for page in iter_new_pages(client, base_url, channel_id, after=anchors[deepest], per_page=per_page):
+            posts += len(page.posts)
+            page_times.append(page.elapsed)
+        result["catch_up"] = dict(_throughput(posts, page_times, time.perf_counter() - started), depth=deepest)
+    return result
+
+
+def format_results(results):
+    def ms(value):
+        return f"{value * 1000:8.1f}" if value is not None else f"{'-':>8}"
+
+    header = f"{'Чтение':<40} {'Постов':>8} {'Постов/с':>9} {'p50 мс':>8} {'p95 мс':>8} {'p99 мс':>8}"
+    lines = [header, "-" * len(header)]
+    for result in results:
+        per_page = result["per_page"]
+        for title, run in ((f"история, per_page={per_page}", result["history"]),
+                           (f"догоняющее с глубины {result.get('catch_up', {}).get('depth')}, per_page={per_page}", result.get("catch_up"))):
+            if run:
+                rate = f"{run['posts_per_second']:9.0f}" if run["posts_per_second"] else f"{'-':>9}"
+                page = run["page"]
+                lines.append(f"{title:<40} {run['posts']:>8} {rate} {ms(page['p50'])} {ms(page['p95'])} {ms(page['p99'])}")
+        for depth, modes in result["depths"].items():
+            for mode, stats in modes.items():
+                title = f"стр. {depth} ({mode}), per_page={per_page}"
+                lines.append(f"{title:<40} {'':>8} {'':>9} {ms(stats['p50'])} {ms(stats['p95'])} {ms(stats['p99'])}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Замер чтения истории большого канала Mattermost страницами")
+    parser.add_argument("--posts", type=int, default=10000, help="сколько сообщений отправить в канал для замера")
+    parser.add_argument("--channel-id", help="замерять готовый канал (без наполнения и удаления)")
+    parser.add_argument("--dataset", help="манифест засеянного набора: замерять его канал с числом постов, ближайшим к --posts")
+    parser.add_argument("--seed-workers", type=int, default=8, help="потоков для наполнения канала")
+    parser.add_argument("--page-sizes", type=int, nargs="+", default=[60, 200], help="размеры страниц (per_page)")
+    parser.add_argument("--depths", type=int, nargs="+", default=[0, 10, 100], help="глубины в страницах от самых новых постов")
+    parser.add_argument("--samples", type=int, default=5, help="замеров страницы на каждой глубине")
+    parser.add_argument("--output", help="сохранить результаты в JSON-файл")
+    args = parser.parse_args(argv)
+    if settings.missing_required():
+        parser.error(f"Не установлены обязательные переменные окружения: {', '.join(settings.missing_required())}")
+
+    limiter = AdaptiveLimiter(max(args.seed_workers, settings.POOL_SIZE))
+    client = ApiClient(pool_size=max(args.seed_workers, settings.POOL_SIZE), limiter=limiter)
+    ctx = ScenarioContext(client, client, settings.BASE_URL, settings.TEAM_ID, settings.LOGIN_ID, settings.PASSWORD)
+    output = {"channel_id": args.channel_id, "results": []}
+    try:
+        client.set_token(session_token(client, settings.BASE_URL, settings.LOGIN_ID, settings.PASSWORD))
+        if args.dataset and not args.channel_id:
+            dataset = Dataset.load(args.dataset)
+            channel = dataset.channel_with_posts(args.posts)
+            output["channel_id"] = dataset.channel_id(channel, client, settings.BASE_URL)
+            print(f"Канал набора {channel['name']}: {channel['posts']} постов")
+        elif not args.channel_id:
+            ctx.setup()
+            output["channel_id"] = ctx.channel_id
+            elapsed = seed_channel(client, settings.BASE_URL, ctx.channel_id, args.posts, args.seed_workers)
+            output["seed"] = {"posts": args.posts, "elapsed": elapsed}
+            print(f"Канал {ctx.channel_id} наполнен: {args.posts} сообщений за {elapsed:.1f} с ({args.posts / elapsed:.0f}/с)")
+        for per_page in args.page_sizes:
+            output["results"].append(measure_history(client, settings.BASE_URL, output["channel_id"], per_page,
+                                                     depths=args.depths, samples=args.samples))
+    finally:
+        try:
+            ctx.teardown()
+        finally:
+            end_session(client, settings.BASE_URL)
+            client.close()
+
+    output["throttling"] = limiter.stats.as_dict()
+    print(format_results(output["results"]))
+    print(format_throttle_stats(output["throttling"]))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(output, f, ensure_ascii=False, indent=2)
+        print(f"Результаты сохранены в {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
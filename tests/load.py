@@ -0,0 +1,185 @@
+"""
+Нагрузочный прогон на сценариях тестового набора.
+
+Запуск (переменные окружения те же, что у тестов):
+    python -m tests.load --users 20 --duration 60
+    python -m tests.load --users 50 --rate 100 --mix post_message=5,read_posts=5,login=1
+
+--users задает число виртуальных пользователей (потоков), --rate - целевую суммарную частоту
+сценариев в секунду (без него каждый пользователь выполняет сценарии без пауз).
+По окончании выводятся пропускная способность, доля ошибок и перцентили задержки
+по каждому сценарию и каждому маршруту API.
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from .api_client import ApiClient
+from .metrics import MetricsRecorder, format_summary_table
+from .rate_limit import AdaptiveLimiter, ThrottleStats, format_stats as format_throttle_stats
+from .scenarios import DEFAULT_MIX, SCENARIOS, ScenarioContext, available_scenarios
+from .token_cache import end_session, session_token
+from . import settings
+
+
+class RatePacer:
+    """
+    Общий для всех виртуальных пользователей темп: выдает слоты запуска сценариев с интервалом 1/rate.
+    Если пользователи не успевают, слоты не накапливаются - отставание не превращается во всплеск.
+    """
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self, deadline):
+        """Ждет следующего слота; False, если слот приходится на время после deadline."""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next, now)
+            self._next = slot + self.interval
+        if slot >= deadline:
+            return False
+        time.sleep(max(slot - time.monotonic(), 0))
+        return True
+
+
+def parse_mix(text):
+    """Разбирает смесь вида "post_message=5,read_posts=5,login=1"."""
+    mix = {}
+    for item in filter(None, (part.strip() for part in text.split(","))):
+        name, _, weight = item.partition("=")
+        if name not in SCENARIOS:
+            raise ValueError(f"Неизвестный сценарий: {name}. Доступны: {', '.join(SCENARIOS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def run_load(users, duration, mix=None, rate=None, seed=None, pool_size=None, base_url=None, on_start=None, on_stop=None):
+    """
+    Выполняет взвешенную смесь сценариев заданным числом виртуальных пользователей в течение duration секунд.
+    base_url заменяет MATTERMOST_BASE_URL (например, адрес прокси с внесением сетевых сбоев);
+    on_start и on_stop вызываются сразу до и после нагрузки - подготовка и очистка каналов в нее не входят.
+    Возвращает словарь с конфигурацией прогона, сводками по сценариям и маршрутам API и числом ошибок по типам.
+    """
+    base_url = base_url or settings.BASE_URL
+    mix = available_scenarios(mix or DEFAULT_MIX, settings.OTHER_USER_ID)
+    if not mix:
+        raise ValueError("Смесь сценариев пуста (для add_remove_member нужен MATTERMOST_OTHER_USER_ID)")
+    pool_size = pool_size or max(users, settings.POOL_SIZE)
+    # Ограничитель конкурентности и частоты общий для обоих клиентов: сервер считает квоту по адресу, а не по токену
+    limiter = AdaptiveLimiter(users)
+    client = ApiClient(pool_size=pool_size, limiter=limiter)
+    anon_client = ApiClient(pool_size=pool_size, limiter=limiter)
+    # Прогоны подряд не повторяют логин основного пользователя: токен берется из кэша на диске
+    client.set_token(session_token(client, base_url, settings.LOGIN_ID, settings.PASSWORD))
+    contexts = [ScenarioContext(client, anon_client, base_url, settings.TEAM_ID, settings.LOGIN_ID,
+                                settings.PASSWORD, settings.OTHER_USER_ID) for _ in range(users)]
+    with ThreadPoolExecutor(max_workers=users) as executor:
+        list(executor.map(ScenarioContext.setup, contexts))
+
+    # Подготовка не попадает в замеры: сборщик подключается только на время нагрузки
+    limiter.stats = ThrottleStats()
+    endpoints = MetricsRecorder()
+    scenarios = MetricsRecorder()
+    client.recorder = anon_client.recorder = endpoints
+    pacer = RatePacer(rate) if rate else None
+    names, weights = list(mix), list(mix.values())
+    error_samples, error_kinds, lock = {}, {}, threading.Lock()
+    base_seed = seed if seed is not None else random.randrange(2 ** 32)
+
+    def virtual_user(index, ctx, stop_at):
+        rng = random.Random(base_seed + index)
+        while time.monotonic() < stop_at:
+            if pacer and not pacer.wait(stop_at):
+                break
+            name = rng.choices(names, weights)[0]
+            started = time.perf_counter()
+            try:
+                SCENARIOS[name][0](ctx)
+            except Exception as e:
+                scenarios.record(name, time.perf_counter() - started, error=type(e).__name__)
+                with lock:
+                    error_samples.setdefault(name, f"{type(e).__name__}: {e}")
+                    kinds = error_kinds.setdefault(name, {})
+                    kinds[type(e).__name__] = kinds.get(type(e).__name__, 0) + 1
+            else:
+                scenarios.record(name, time.perf_counter() - started)
+
+    if on_start:
+        on_start()
+    started_at = time.monotonic()
+    stop_at = started_at + duration
+    with ThreadPoolExecutor(max_workers=users) as executor:
+        list(executor.map(lambda args: virtual_user(*args, stop_at), enumerate(contexts)))
+    elapsed = time.monotonic() - started_at
+    if on_stop:
+        on_stop()
+    throttling = dict(limiter.stats.as_dict(), window=limiter.window, rate=limiter.rate)
+
+    client.recorder = anon_client.recorder = None
+    try:
+        with ThreadPoolExecutor(max_workers=users) as executor:
+            list(executor.map(ScenarioContext.teardown, contexts))
+        end_session(client, base_url)
+    except requests.exceptions.RequestException as e:
+        print(f"Предупреждение: Не удалось удалить рабочие каналы или завершить сессию: {e}")
+    finally:
+        client.close()
+        anon_client.close()
+
+    def with_throughput(summary):
+        return {key: dict(stats, throughput=stats["count"] / elapsed) for key, stats in summary.items()}
+
+    return {
+        "config": {"users": users, "duration": duration, "rate": rate, "mix": mix, "seed": base_seed},
+        "elapsed": elapsed,
+        "scenarios": with_throughput(scenarios.summary()),
+        "endpoints": with_throughput(endpoints.summary()),
+        "error_samples": error_samples,
+        "error_kinds": error_kinds,
+        "throttling": throttling,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Нагрузочный прогон сценариев тестового набора против Mattermost")
+    parser.add_argument("--users", type=int, default=10, help="число виртуальных пользователей (потоков)")
+    parser.add_argument("--duration", type=float, default=60, help="длительность нагрузки, с")
+    parser.add_argument("--rate", type=float, help="целевая суммарная частота сценариев, в секунду")
+    parser.add_argument("--mix", help="веса сценариев, например post_message=5,read_posts=5,login=1")
+    parser.add_argument("--seed", type=int, help="seed генератора выбора сценариев")
+    parser.add_argument("--output", help="сохранить результаты в JSON-файл")
+    args = parser.parse_args(argv)
+    if settings.missing_required():
+        parser.error(f"Не установлены обязательные переменные окружения: {', '.join(settings.missing_required())}")
+    if args.users < 1 or args.duration <= 0:
+        parser.error("Число виртуальных пользователей и длительность нагрузки должны быть положительными")
+    try:
+        mix = parse_mix(args.mix) if args.mix else None
+    except ValueError as e:
+        parser.error(str(e))
+
+    print(f"Нагрузка: {args.users} пользователей, {args.duration} с" + (f", целевой темп {args.rate}/с" if args.rate else ""))
+    result = run_load(args.users, args.duration, mix=mix, rate=args.rate, seed=args.seed)
+    print(f"\nСценарии (прогон {result['elapsed']:.1f} с):")
+    print(format_summary_table(result["scenarios"], result["elapsed"]))
+    print("\nМаршруты API:")
+    print(format_summary_table(result["endpoints"], result["elapsed"]))
+    print(format_throttle_stats(result["throttling"]))
+    for name, sample in result["error_samples"].items():
+        print(f"Пример ошибки сценария {name}: {sample}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"Результаты сохранены в {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
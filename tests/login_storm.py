@@ -0,0 +1,147 @@
+"""
+Пропускная способность и задержка логина под конкурентной нагрузкой (для выбора CPU контейнера приложения).
+
+Запуск (переменные окружения те же, что у тестов):
+    python -m tests.login_storm --concurrency 1 4 16 64 --duration 10
+    python -m tests.login_storm --paths valid locked --concurrency 8 32 --output login_storm.json
+
+Для каждого уровня конкурентности и каждого пути логина --concurrency потоков непрерывно
+отправляют POST /users/login в течение --duration секунд. Пути:
+    valid    - основной пользователь, ожидается 200 (сессии после замера закрываются через /users/logout)
+    invalid  - несуществующий пользователь, ожидается 401
+    locked   - MATTERMOST_LOCKED_USER_LOGIN/PASSWORD (как в test_auth.py), ожидается 401
+    inactive - MATTERMOST_INACTIVE_USER_LOGIN/PASSWORD (как в test_auth.py), ожидается 401
+Пути без заданных учетных данных пропускаются. Отчет: логинов в секунду, p50/p95/p99 и число
+неожиданных ответов (другой статус или сетевая ошибка).
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+import uuid
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from .api_client import ApiClient, auth_headers
+from .metrics import summarize
+from . import settings
+
+PATHS = ("valid", "invalid", "locked", "inactive")
+# Параллельных запросов при закрытии сессий, открытых путем valid
+LOGOUT_WORKERS = 8
+
+
+def login_credentials(path):
+    """(логин, пароль, ожидаемый статус) для пути или None, если учетные данные пути не заданы."""
+    if path == "valid":
+        return settings.LOGIN_ID, settings.PASSWORD, 200
+    if path == "invalid":
+        return f"storm-{uuid.uuid4().hex[:8]}", "invalid_password", 401
+    if path == "locked" and settings.LOCKED_USER_LOGIN and settings.LOCKED_USER_PASSWORD:
+        return settings.LOCKED_USER_LOGIN, settings.LOCKED_USER_PASSWORD, 401
+    if path == "inactive" and settings.INACTIVE_USER_LOGIN and settings.INACTIVE_USER_PASSWORD:
+        return settings.INACTIVE_USER_LOGIN, settings.INACTIVE_USER_PASSWORD, 401
+    return None
+
+
+def storm(client, login_id, password, expected_status, concurrency, duration):
+    """
+    concurrency потоков логинятся без пауз duration секунд.
+    Возвращает (задержки, число неожиданных ответов, фактическая длительность, токены открытых сессий).
+    """
+    url = f"{settings.BASE_URL}/api/v4/users/login"
+    latencies, tokens, lock = [], [], threading.Lock()
+    unexpected = 0
+    started = time.perf_counter()
+    stop_at = started + duration
+
+    def worker():
+        nonlocal unexpected
+        while time.perf_counter() < stop_at:
+            request_started = time.perf_counter()
+            try:
+                response = client.post(url, json={"login_id": login_id, "password": password}, timeout=15)
+                status = response.status_code
+            except requests.exceptions.RequestException:
+                status = None
+            elapsed = time.perf_counter() - request_started
+            with lock:
+                latencies.append(elapsed)
+                if status != expected_status:
+                    unexpected += 1
+                if status == 200 and response.headers.get("Token"):
+                    tokens.append(response.headers["Token"])
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for future in [executor.submit(worker) for _ in range(concurrency)]:
+            future.result()
+    return latencies, unexpected, time.perf_counter() - started, tokens
+
+
+def logout_all(client, tokens, workers=LOGOUT_WORKERS):
+    """Закрывает сессии, открытые замером, чтобы шторм не оставлял на сервере тысячи сессий."""
+    def logout(token):
+        try:
+            client.post(f"{settings.BASE_URL}/api/v4/users/logout", headers=auth_headers(token), timeout=10)
+        except requests.exceptions.RequestException:
+            pass
+
+    if tokens:
+        with ThreadPoolExecutor(max_workers=min(workers, len(tokens))) as executor:
+            list(executor.map(logout, tokens))
+
+
+def run_login_storm(levels, paths=PATHS, duration=10.0):
+    """Замеры для каждого пути и уровня конкурентности; возвращает строки {"path", "concurrency", ...}."""
+    rows = []
+    client = ApiClient(pool_size=max(max(levels), settings.POOL_SIZE))
+    try:
+        for path in paths:
+            credentials = login_credentials(path)
+            if credentials is None:
+                print(f"Путь {path} пропущен: не заданы учетные данные")
+                continue
+            for concurrency in sorted(levels):
+                print(f"Путь {path}: {concurrency} потоков, {duration:g} с")
+                latencies, unexpected, elapsed, tokens = storm(client, *credentials, concurrency, duration)
+                logout_all(client, tokens)
+                rows.append({"path": path, "concurrency": concurrency, "logins": len(latencies), "unexpected": unexpected,
+                             "throughput": len(latencies) / elapsed if elapsed else 0.0, "latency": summarize(latencies)})
+    finally:
+        client.close()
+    return rows
+
+
+def format_results(rows):
+    header = f"{'Путь':<9} {'Потоков':>7} {'Логинов':>8} {'Логин/с':>8} {'p50 мс':>8} {'p95 мс':>8} {'p99 мс':>8} {'Неожид.':>8}"
+    lines = [header, "-" * len(header)]
+    for row in rows:
+        latency = row["latency"]
+        lines.append(f"{row['path']:<9} {row['concurrency']:>7} {row['logins']:>8} {row['throughput']:>8.1f} "
+                     f"{latency['p50'] * 1000:>8.1f} {latency['p95'] * 1000:>8.1f} {latency['p99'] * 1000:>8.1f} {row['unexpected']:>8}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Пропускная способность и задержка логина под конкурентной нагрузкой")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16], help="уровни конкурентности")
+    parser.add_argument("--duration", type=float, default=10.0, help="длительность замера на уровень, с")
+    parser.add_argument("--paths", nargs="+", choices=PATHS, default=list(PATHS), help="пути логина")
+    parser.add_argument("--output", help="сохранить результаты в JSON-файл")
+    args = parser.parse_args(argv)
+    if settings.missing_required():
+        parser.error(f"Не установлены обязательные переменные окружения: {', '.join(settings.missing_required())}")
+    if args.duration <= 0 or min(args.concurrency) < 1:
+        parser.error("Длительность и уровни конкурентности должны быть положительными")
+
+    rows = run_login_storm(args.concurrency, paths=args.paths, duration=args.duration)
+    print(format_results(rows))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(rows, f, ensure_ascii=False, indent=2)
+        print(f"Результаты сохранены в {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
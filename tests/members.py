@@ -0,0 +1,73 @@
+"""
+Работа с участниками каналов без выгрузки полного списка участников.
+
+Проверка членства - один запрос GET /channels/{channel_id}/members/{user_id} (200 или 404),
+проверка пачки пользователей - один POST /channels/{channel_id}/members/ids;
+стоимость не зависит от размера канала. Добавление пачки - POST /members с user_ids.
+Массового удаления в API нет, поэтому пачка удаляется параллельными DELETE.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+# Пользователей в одном запросе добавления (сервер ограничивает длину списка user_ids)
+ADD_BATCH_SIZE = 200
+# Параллельных DELETE при удалении пачки участников
+REMOVE_WORKERS = 8
+USERS_PER_PAGE = 200
+
+
+def is_member(api_client, base_url, channel_id, user_id):
+    """Состоит ли пользователь в канале: 200 - да, 404 - нет, остальное - исключение HTTPError."""
+    response = api_client.get(f"{base_url}/api/v4/channels/{channel_id}/members/{user_id}", timeout=10)
+    if response.status_code == 404:
+        return False
+    response.raise_for_status()
+    return True
+
+
+def member_ids_among(api_client, base_url, channel_id, user_ids):
+    """Какие из user_ids состоят в канале (множество); пачки по ADD_BATCH_SIZE, без списка всех участников."""
+    user_ids, found = list(user_ids), set()
+    for start in range(0, len(user_ids), ADD_BATCH_SIZE):
+        response = api_client.post(f"{base_url}/api/v4/channels/{channel_id}/members/ids",
+                                   json=user_ids[start:start + ADD_BATCH_SIZE], timeout=10)
+        response.raise_for_status()
+        found.update(member["user_id"] for member in response.json())
+    return found
+
+
+def add_members(api_client, base_url, channel_id, user_ids, batch_size=ADD_BATCH_SIZE):
+    """Добавляет пользователей в канал пачками по batch_size одним запросом на пачку."""
+    user_ids = list(user_ids)
+    for start in range(0, len(user_ids), batch_size):
+        response = api_client.post(f"{base_url}/api/v4/channels/{channel_id}/members",
+                                   json={"user_ids": user_ids[start:start + batch_size]}, timeout=15)
+        response.raise_for_status()
+
+
+def remove_members(api_client, base_url, channel_id, user_ids, workers=REMOVE_WORKERS):
+    """Удаляет пользователей из канала параллельными DELETE; отсутствующие в канале (404) пропускаются."""
+    def remove(user_id):
+        response = api_client.delete(f"{base_url}/api/v4/channels/{channel_id}/members/{user_id}", timeout=10)
+        if response.status_code != 404:
+            response.raise_for_status()
+
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+    with ThreadPoolExecutor(max_workers=min(workers, len(user_ids))) as executor:
+        list(executor.map(remove, user_ids))
+
+
+def team_user_ids(api_client, base_url, team_id, limit, exclude=()):
+    """До limit идентификаторов активных пользователей команды, кроме exclude (постранично)."""
+    found, page = [], 0
+    while len(found) < limit:
+        response = api_client.get(f"{base_url}/api/v4/users", params={"in_team": team_id, "active": "true", "page": page,
+                                                                      "per_page": USERS_PER_PAGE}, timeout=10)
+        response.raise_for_status()
+        batch = response.json()
+        found.extend(user["id"] for user in batch if user["id"] not in exclude and not user.get("delete_at"))
+        if len(batch) < USERS_PER_PAGE:
+            break
+        page += 1
+    return found[:limit]
@@ -0,0 +1,140 @@
+"""
+Зависимость задержки операций с участниками канала от числа участников.
+
+Запуск (переменные окружения те же, что у тестов):
+    python -m tests.membership --sizes 100 1000 10000 --samples 20
+    MATTERMOST_FAKE_SERVER=1 MATTERMOST_FAKE_USERS=10000 python -m tests.membership --sizes 100 1000 10000
+
+Канал доращивается до каждого размера из --sizes пакетным добавлением пользователей команды
+(нужно не меньше max(--sizes) активных пользователей в команде). На каждом размере замеряются
+добавление, проверка членства и удаление одного пользователя, первая страница списка участников
+и выгрузка полного списка. Результат - таблица и график p50 от числа участников; созданный канал удаляется.
+"""
+import argparse
+import json
+import sys
+import time
+from .api_client import ApiClient
+from .channel_pool import MEMBERS_PER_PAGE
+from .members import ADD_BATCH_SIZE, add_members, team_user_ids
+from .metrics import summarize
+from .rate_limit import AdaptiveLimiter, format_stats as format_throttle_stats
+from .scenarios import ScenarioContext
+from .token_cache import end_session, session_token
+from . import settings
+
+OPERATIONS = ("add", "check", "remove", "list_page", "list_all")
+
+
+def _timed(call):
+    started = time.perf_counter()
+    response = call()
+    response.raise_for_status()
+    return time.perf_counter() - started
+
+
+def measure_size(client, base_url, channel_id, probe_user_id, samples):
+    """Замеры операций с участниками на текущем размере канала; probe_user_id не должен быть в канале."""
+    members_url = f"{base_url}/api/v4/channels/{channel_id}/members"
+    timings = {name: [] for name in OPERATIONS}
+    for _ in range(samples):
+        timings["add"].append(_timed(lambda: client.post(members_url, json={"user_id": probe_user_id}, timeout=10)))
+        timings["check"].append(_timed(lambda: client.get(f"{members_url}/{probe_user_id}", timeout=10)))
+        timings["remove"].append(_timed(lambda: client.delete(f"{members_url}/{probe_user_id}", timeout=10)))
+        timings["list_page"].append(_timed(lambda: client.get(members_url, params={"page": 0, "per_page": MEMBERS_PER_PAGE}, timeout=10)))
+
+    started, page = time.perf_counter(), 0
+    while True:
+        response = client.get(members_url, params={"page": page, "per_page": MEMBERS_PER_PAGE}, timeout=10)
+        response.raise_for_status()
+        if len(response.json()) < MEMBERS_PER_PAGE:
+            break
+        page += 1
+    timings["list_all"].append(time.perf_counter() - started)
+    return {name: summarize(values) for name, values in timings.items()}
+
+
+def run_membership_scaling(sizes, samples=10, batch_size=ADD_BATCH_SIZE):
+    """
+    Доращивает новый канал до каждого размера (по возрастанию) и замеряет операции на нем.
+    Возвращает строки {"members", "grow", "operations"} по размерам.
+    """
+    sizes = sorted(set(sizes))
+    limiter = AdaptiveLimiter(settings.POOL_SIZE)
+    client = ApiClient(limiter=limiter)
+    ctx = ScenarioContext(client, client, settings.BASE_URL, settings.TEAM_ID, settings.LOGIN_ID, settings.PASSWORD)
+    try:
+        client.set_token(session_token(client, settings.BASE_URL, settings.LOGIN_ID, settings.PASSWORD))
+        own_id = client.get(f"{settings.BASE_URL}/api/v4/users/me", timeout=10).json()["id"]
+        # Первый пользователь - пробный для одиночных операций, остальные доращивают канал
+        users = team_user_ids(client, settings.BASE_URL, settings.TEAM_ID, sizes[-1], exclude={own_id})
+        if len(users) < sizes[-1]:
+            raise RuntimeError(f"В команде {len(users)} пользователей, для канала на {sizes[-1]} участников нужно {sizes[-1]}")
+        probe, pending = users[0], users[1:]
+        ctx.setup()
+        rows, members = [], 1  # создатель канала уже участник
+        for size in sizes:
+            grow, pending = pending[:size - members], pending[size - members:]
+            started = time.perf_counter()
+            add_members(client, settings.BASE_URL, ctx.channel_id, grow, batch_size=batch_size)
+            elapsed = time.perf_counter() - started
+            members = size
+            print(f"Канал доращен до {size} участников: +{len(grow)} за {elapsed:.1f} с")
+            rows.append({"members": size, "grow": {"users": len(grow), "elapsed": elapsed},
+                         "operations": measure_size(client, settings.BASE_URL, ctx.channel_id, probe, samples)})
+        return rows
+    finally:
+        try:
+            ctx.teardown()
+        finally:
+            end_session(client, settings.BASE_URL)
+            client.close()
+        print(format_throttle_stats(limiter.stats.as_dict()))
+
+
+def format_table(rows):
+    header = f"{'Участников':>10} " + " ".join(f"{name + ' p50/p95 мс':>24}" for name in OPERATIONS)
+    lines = [header, "-" * len(header)]
+    for row in rows:
+        cells = " ".join(f"{stats['p50'] * 1000:>11.1f} /{stats['p95'] * 1000:>10.1f}" for stats in row["operations"].values())
+        lines.append(f"{row['members']:>10} {cells}")
+    return "\n".join(lines)
+
+
+def format_chart(rows, width=50):
+    """Текстовый график p50 каждой операции от числа участников (длина полосы - доля от максимума операции)."""
+    lines = []
+    for name in OPERATIONS:
+        values = [row["operations"][name]["p50"] for row in rows]
+        peak = max(values) or 1
+        lines.append(f"{name}, p50:")
+        for row, value in zip(rows, values):
+            lines.append(f"  {row['members']:>8} | {'#' * max(1, round(width * value / peak)):<{width}} {value * 1000:.1f} мс")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Задержка операций с участниками канала в зависимости от их числа")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000], help="размеры канала (число участников)")
+    parser.add_argument("--samples", type=int, default=10, help="замеров каждой операции на размере")
+    parser.add_argument("--batch-size", type=int, default=ADD_BATCH_SIZE, help="пользователей в одном запросе добавления")
+    parser.add_argument("--output", help="сохранить результаты в JSON-файл")
+    args = parser.parse_args(argv)
+    if settings.missing_required():
+        parser.error(f"Не установлены обязательные переменные окружения: {', '.join(settings.missing_required())}")
+    if min(args.sizes) < 2:
+        parser.error("Размер канала должен быть не меньше 2 (создатель и хотя бы один участник)")
+
+    rows = run_membership_scaling(args.sizes, samples=args.samples, batch_size=args.batch_size)
+    print(format_table(rows))
+    print()
+    print(format_chart(rows))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(rows, f, ensure_ascii=False, indent=2)
+        print(f"Результаты сохранены в {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
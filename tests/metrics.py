@@ -0,0 +1,151 @@
+import html
+import re
+import threading
+from urllib.parse import urlsplit
+
+# Идентификаторы Mattermost: 26 символов [a-z0-9]; в маршруте заменяются на {id}
+_ID_SEGMENT = re.compile(r"^[a-z0-9]{26}$")
+
+
+def normalize_route(method, url):
+    """Маршрут запроса без конкретных идентификаторов: "GET /api/v4/channels/{id}/posts"."""
+    segments = ["{id}" if _ID_SEGMENT.match(segment) else segment for segment in urlsplit(url).path.split("/")]
+    return f"{method.upper()} {'/'.join(segments)}"
+
+
+def percentile(sorted_values, q):
+    """Перцентиль q (0..100) по отсортированному списку с линейной интерполяцией."""
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def distribution(durations):
+    """Распределение выборки длительностей: количество, p50/p95/p99 и max."""
+    values = sorted(durations)
+    return {"count": len(values), "p50": percentile(values, 50), "p95": percentile(values, 95),
+            "p99": percentile(values, 99), "max": values[-1] if values else None}
+
+
+def summarize(durations, errors=0):
+    """Сводка по выборке длительностей (в секундах): количество, ошибки, p50/p95/p99, max, среднее."""
+    values = sorted(durations)
+    count = len(values)
+    return {
+        "count": count,
+        "errors": errors,
+        "error_rate": errors / count if count else 0.0,
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": values[-1] if values else None,
+        "mean": sum(values) / count if count else None,
+    }
+
+
+class MetricsRecorder:
+    """
+    Потокобезопасный сборщик длительностей HTTP-запросов по нормализованным маршрутам.
+    Для каждого запроса хранится полное время, а если известны - время до первого байта ответа (TTFB)
+    и время установления соединения (только для запросов, которым понадобилось новое соединение).
+    TTFB не включает установление соединения, так что connect и TTFB не пересекаются.
+    Ошибкой считается исключение при запросе или статус ответа >= 400. Попытки с ответом 429, которые
+    ограничитель частоты повторил (throttled), ошибками не считаются и в выборки не попадают - они
+    только подсчитываются по маршруту.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._durations = {}
+        self._ttfb = {}
+        self._connects = {}
+        self._errors = {}
+        self._throttled = {}
+
+    def record(self, route, duration, status=None, error=None, connect=None, ttfb=None, throttled=False):
+        failed = error is not None or (status is not None and status >= 400)
+        with self._lock:
+            if throttled:
+                self._throttled[route] = self._throttled.get(route, 0) + 1
+                return
+            self._durations.setdefault(route, []).append(duration)
+            if ttfb is not None:
+                self._ttfb.setdefault(route, []).append(ttfb)
+            if connect:
+                self._connects.setdefault(route, []).append(connect)
+            if failed:
+                self._errors[route] = self._errors.get(route, 0) + 1
+
+    def routes(self):
+        with self._lock:
+            return sorted(self._durations)
+
+    def export(self):
+        """Сырые выборки для передачи между процессами (например, из воркеров pytest-xdist)."""
+        with self._lock:
+            return {route: {"total": list(values), "ttfb": list(self._ttfb.get(route, [])),
+                            "connect": list(self._connects.get(route, [])), "errors": self._errors.get(route, 0),
+                            "throttled": self._throttled.get(route, 0)}
+                    for route, values in self._durations.items()}
+
+    def merge(self, exported):
+        """Добавляет выборки, полученные через export() другого сборщика."""
+        with self._lock:
+            for route, data in exported.items():
+                self._durations.setdefault(route, []).extend(data["total"])
+                if data["ttfb"]:
+                    self._ttfb.setdefault(route, []).extend(data["ttfb"])
+                if data["connect"]:
+                    self._connects.setdefault(route, []).extend(data["connect"])
+                if data["errors"]:
+                    self._errors[route] = self._errors.get(route, 0) + data["errors"]
+                if data.get("throttled"):
+                    self._throttled[route] = self._throttled.get(route, 0) + data["throttled"]
+
+    def summary(self):
+        """
+        Сводка по каждому маршруту: summarize(...) полного времени плюс распределения ttfb и connect
+        и число повторенных ответов 429 (throttled).
+        """
+        exported = self.export()
+        result = {}
+        for route, data in sorted(exported.items()):
+            stats = summarize(data["total"], data["errors"])
+            stats["ttfb"] = distribution(data["ttfb"])
+            stats["connect"] = distribution(data["connect"])
+            stats["throttled"] = data["throttled"]
+            result[route] = stats
+        return result
+
+
+def format_summary_table(summary, elapsed=None):
+    """Текстовая таблица сводки по маршрутам; при известной длительности прогона добавляется пропускная способность."""
+    header = f"{'Маршрут':<48} {'Запросов':>9} {'RPS':>8} {'Ошибки':>7} {'429':>6} {'p50 мс':>8} {'p95 мс':>8} {'p99 мс':>8} {'max мс':>8}"
+    lines = [header, "-" * len(header)]
+    for route, stats in summary.items():
+        rps = f"{stats['count'] / elapsed:8.1f}" if elapsed else f"{'-':>8}"
+        timings = " ".join(f"{stats[key] * 1000:8.1f}" if stats[key] is not None else f"{'-':>8}" for key in ("p50", "p95", "p99", "max"))
+        lines.append(f"{route:<48} {stats['count']:>9} {rps} {stats['error_rate']:>7.1%} {stats.get('throttled', 0):>6} {timings}")
+    return "\n".join(lines)
+
+
+def _ms(value):
+    return f"{value * 1000:.1f}" if value is not None else "-"
+
+
+def render_html_table(summary):
+    """HTML-таблица задержек по маршрутам для раздела summary отчета pytest-html."""
+    rows = "".join(
+        f"<tr><td>{html.escape(route)}</td><td>{stats['count']}</td><td>{stats['errors']}</td>"
+        f"<td>{_ms(stats['p50'])}</td><td>{_ms(stats['p95'])}</td><td>{_ms(stats['p99'])}</td><td>{_ms(stats['max'])}</td>"
+        f"<td>{_ms(stats['ttfb']['p50'])}</td><td>{_ms(stats['ttfb']['p95'])}</td>"
+        f"<td>{stats['connect']['count']}</td><td>{_ms(stats['connect']['p95'])}</td></tr>"
+        for route, stats in summary.items()
+    )
+    return ("<h2>Задержки API по маршрутам</h2>"
+            "<table><tr><th>Маршрут</th><th>Запросов</th><th>Ошибок</th><th>p50, мс</th><th>p95, мс</th><th>p99, мс</th>"
+            "<th>max, мс</th><th>TTFB p50, мс</th><th>TTFB p95, мс</th><th>Новых соединений</th><th>Соединение p95, мс</th></tr>"
+            f"{rows}</table>")
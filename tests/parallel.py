@@ -0,0 +1,56 @@
+import os
+import time
+from contextlib import contextmanager
+
+# Идентификатор процесса-воркера pytest-xdist ("gw0", "gw1", ...); "master" при обычном прогоне
+WORKER_ID = os.getenv("PYTEST_XDIST_WORKER", "master")
+WORKER_COUNT = int(os.getenv("PYTEST_XDIST_WORKER_COUNT", 1))
+
+
+def is_worker():
+    """True, если код выполняется в воркере pytest-xdist."""
+    return WORKER_ID != "master"
+
+
+def worker_prefix(prefix):
+    """
+    Префикс имен создаваемых ресурсов с пространством имен воркера: "test-auto-" -> "test-auto-gw1-".
+    Так параллельные воркеры никогда не получают и не чистят чужие каналы.
+    """
+    return f"{prefix}{WORKER_ID}-" if is_worker() else prefix
+
+
+@contextmanager
+def file_lock(path, timeout=60, poll_interval=0.05):
+    """Межпроцессная блокировка на lock-файле (атомарное создание с O_EXCL)."""
+    lock_path = f"{path}.lock"
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Не удалось захватить блокировку {lock_path} за {timeout} с")
+            time.sleep(poll_interval)
+    try:
+        yield
+    finally:
+        os.close(fd)
+        os.remove(lock_path)
+
+
+def shared_value(path, factory):
+    """
+    Значение, общее для всех воркеров прогона: первый воркер вычисляет его через factory()
+    и сохраняет в файл, остальные под блокировкой читают готовое.
+    """
+    with file_lock(path):
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                return f.read()
+        value = factory()
+        # Файл может содержать токен, поэтому доступен только владельцу
+        with os.fdopen(os.open(path, os.O_CREAT | os.O_WRONLY | os.O_TRUNC, 0o600), "w", encoding="utf-8") as f:
+            f.write(value)
+        return value
@@ -0,0 +1,95 @@
+"""
+Потоковое чтение истории постов канала страницами через GET /channels/{channel_id}/posts.
+
+Генераторы запрашивают следующую страницу только тогда, когда потребитель дочитал предыдущую,
+поэтому в памяти в каждый момент находится не больше одной страницы, сколько бы постов ни было в канале:
+    for post in iter_posts(iter_history_pages(api_client, base_url, channel_id, per_page=200)):
+        ...
+
+Режимы выдачи Mattermost:
+    page/per_page - смещение от самых новых постов; стоимость запроса растет с глубиной,
+                    а новые посты во время чтения сдвигают страницы;
+    before/after  - курсор по идентификатору поста: стабилен при новых постах и не зависит от глубины;
+    since         - все посты, созданные или измененные начиная с момента (мс), одним ответом.
+"""
+import time
+from collections import namedtuple
+
+DEFAULT_PER_PAGE = 60
+# Больше 200 постов на страницу сервер не отдает
+MAX_PER_PAGE = 200
+
+# Страница выдачи: посты в порядке чтения и время ее получения (запрос и разбор JSON), с
+PostPage = namedtuple("PostPage", "posts elapsed")
+
+
+def fetch_page(api_client, base_url, channel_id, **params):
+    """Один запрос выдачи постов; посты возвращаются в порядке "order" сервера (от новых к старым)."""
+    started = time.perf_counter()
+    response = api_client.get(f"{base_url}/api/v4/channels/{channel_id}/posts", params=params, timeout=10)
+    response.raise_for_status()
+    data = response.json()
+    posts = [data["posts"][post_id] for post_id in data["order"]]
+    return PostPage(posts, time.perf_counter() - started)
+
+
+def _check_per_page(per_page):
+    if not 0 < per_page <= MAX_PER_PAGE:
+        raise ValueError(f"per_page должен быть от 1 до {MAX_PER_PAGE}, получено {per_page}")
+
+
+def iter_history_pages(api_client, base_url, channel_id, per_page=DEFAULT_PER_PAGE, before=None, start_page=0, cursor=True):
+    """
+    Страницы истории канала от новых постов к старым.
+    before - начать с постов старше указанного; start_page - пропустить столько страниц от начала.
+    При cursor=True после первой страницы чтение идет курсором before=<последний прочитанный пост>,
+    при cursor=False - смещением page=start_page+1, start_page+2, ...
+    """
+    _check_per_page(per_page)
+    page, anchor = start_page, before
+    while True:
+        params = {"page": page, "per_page": per_page}
+        if anchor:
+            params["before"] = anchor
+        result = fetch_page(api_client, base_url, channel_id, **params)
+        if result.posts:
+            yield result
+        if len(result.posts) < per_page:
+            return
+        if cursor:
+            page, anchor = 0, result.posts[-1]["id"]
+        else:
+            page += 1
+
+
+def iter_new_pages(api_client, base_url, channel_id, after, per_page=DEFAULT_PER_PAGE):
+    """
+    Страницы постов новее поста after, от старых к новым (догоняющее чтение после перерыва).
+    Посты внутри каждой страницы тоже упорядочены от старых к новым.
+    """
+    _check_per_page(per_page)
+    anchor = after
+    while True:
+        result = fetch_page(api_client, base_url, channel_id, after=anchor, per_page=per_page)
+        posts = result.posts[::-1]
+        if posts:
+            yield PostPage(posts, result.elapsed)
+        if len(posts) < per_page:
+            return
+        anchor = posts[-1]["id"]
+
+
+def iter_posts_since(api_client, base_url, channel_id, since):
+    """
+    Посты, созданные или измененные начиная с since (мс), от старых к новым.
+    Сервер отдает их одним ответом без страниц, поэтому режим подходит для коротких окон
+    (например, от водяного знака канала), а не для чтения всей истории.
+    """
+    result = fetch_page(api_client, base_url, channel_id, since=since)
+    yield from sorted(result.posts, key=lambda post: post["create_at"])
+
+
+def iter_posts(pages):
+    """Посты из последовательности страниц по одному, в порядке чтения."""
+    for page in pages:
+        yield from page.posts
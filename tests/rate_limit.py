@@ -0,0 +1,242 @@
+"""
+Адаптивная конкурентность и частота запросов к API с учетом ограничения частоты Mattermost (ответы 429).
+
+AdaptiveLimiter - общий для клиентов процесса ограничитель (сервер считает квоту по адресу клиента): окно
+одновременных запросов (AIMD) и, после первого 429, равномерная частота, оцененная по ответам сервера.
+Ответы 429 повторяются, а повторы и время ожидания копятся в stats, чтобы медленный прогон из-за
+ограничения частоты не путали с медленным сервером.
+"""
+import email.utils
+import threading
+import time
+
+# Сколько раз повторять запрос, получивший 429; после этого вызывающий код получает ответ 429 как есть
+DEFAULT_MAX_RETRIES = 5
+# Пауза перед повтором, если сервер не прислал ни Retry-After, ни X-RateLimit-Reset: 0.5, 1, 2, ... с
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30.0
+# Во сколько раз уменьшается окно при 429
+DECREASE_FACTOR = 0.5
+# Доля оценки частоты сервера, с которой запросы идут после 429, и относительный прирост частоты
+# за секунду успешных ответов при полной квоте сервера
+RATE_DECREASE_FACTOR = 0.9
+RATE_GROWTH = 0.5
+
+
+def _header_seconds(value):
+    """Секунды из Retry-After/X-RateLimit-Reset: число секунд или HTTP-дата; None, если не разобрать."""
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(email.utils.parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_delay(response, attempt):
+    """Сколько ждать перед повтором запроса, получившего 429."""
+    delay = _header_seconds(response.headers.get("Retry-After"))
+    if delay is None:
+        delay = _header_seconds(response.headers.get("X-RateLimit-Reset"))
+    if delay is None:
+        delay = min(BACKOFF_BASE * 2 ** attempt, BACKOFF_MAX)
+    return delay
+
+
+def _header_int(response, name):
+    value = response.headers.get(name, "")
+    return int(value) if value.isdigit() else None
+
+
+def header_rate(response):
+    """
+    Нижняя оценка частоты восстановления квоты (запросов/с) по X-RateLimit-Limit и X-RateLimit-Reset;
+    None, если заголовков нет.
+    """
+    limit = _header_int(response, "X-RateLimit-Limit")
+    reset = _header_int(response, "X-RateLimit-Reset")
+    if not limit or not reset:
+        return None
+    return limit / reset
+
+
+class ThrottleStats:
+    """
+    Потокобезопасные счетчики ограничения частоты.
+    throttled - ответов 429, retries - повторов, gave_up - запросов, отданных вызывающему коду с 429,
+    throttle_time - суммарное время, которое запросы ждали окна, паузы или своей очереди по частоте (с),
+    min_limit - наименьшее окно.
+    """
+
+    FIELDS = ("throttled", "retries", "gave_up", "throttle_time")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.throttled = 0
+        self.retries = 0
+        self.gave_up = 0
+        self.throttle_time = 0.0
+        self.min_limit = None
+
+    def add(self, **deltas):
+        with self._lock:
+            for name, delta in deltas.items():
+                setattr(self, name, getattr(self, name) + delta)
+
+    def note_limit(self, limit):
+        with self._lock:
+            self.min_limit = limit if self.min_limit is None else min(self.min_limit, limit)
+
+    def as_dict(self):
+        with self._lock:
+            return {"throttled": self.throttled, "retries": self.retries, "gave_up": self.gave_up,
+                    "throttle_time": self.throttle_time, "min_limit": self.min_limit}
+
+    def merge(self, exported):
+        """Добавляет счетчики, полученные через as_dict() другого процесса (например, воркера pytest-xdist)."""
+        self.add(**{name: exported.get(name, 0) for name in self.FIELDS})
+        if exported.get("min_limit") is not None:
+            self.note_limit(exported["min_limit"])
+
+
+class AdaptiveLimiter:
+    """
+    AIMD-окно одновременных запросов и частота запросов. Окно меняется в пределах [minimum, limit]:
+    429 уменьшает его вдвое (не чаще раза на "поколение" запросов), успешный ответ увеличивает на 1/окно.
+    Окно ограничивает только конкурентность - при задержках в миллисекунды даже один запрос в полете
+    превышает квоту, поэтому после первого 429 запросы еще и распределяются во времени с частотой сервера.
+    Начальное окно - limit, а частота не ограничена до первого 429: без 429 ограничитель не сдерживает клиентов.
+    """
+
+    def __init__(self, limit, minimum=1, max_retries=DEFAULT_MAX_RETRIES, stats=None):
+        self.maximum = max(limit, minimum)
+        self.minimum = minimum
+        self.max_retries = max_retries
+        self.stats = stats or ThrottleStats()
+        self._window = float(self.maximum)
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._generation = 0
+        self._rate = None
+        self._next_send = 0.0
+        # Успешные ответы с начала оценки частоты (ответа при полной квоте) и время ее начала
+        self._accepted = 0
+        self._sampled_at = self._grown_at = time.monotonic()
+        self._condition = threading.Condition()
+
+    @property
+    def window(self):
+        with self._condition:
+            return int(self._window)
+
+    @property
+    def rate(self):
+        """Текущая частота запросов (запросов/с); None - частота не ограничена."""
+        with self._condition:
+            return self._rate
+
+    def acquire(self, delay=0.0):
+        """
+        Ждет места в окне, конца паузы, своей очереди по частоте и еще delay секунд (задержка повтора,
+        которую вернул release()); возвращает поколение, которое передается в release().
+        """
+        started = time.monotonic()
+        not_before = started + delay
+        waited = False
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                wait = max(self._paused_until, not_before, self._next_send if self._rate else 0.0) - now
+                if wait <= 0 and self._in_flight < int(self._window):
+                    break
+                waited = True
+                self._condition.wait(wait if wait > 0 else None)
+            self._in_flight += 1
+            if self._rate:
+                self._next_send = max(self._next_send, now) + 1 / self._rate
+            generation = self._generation
+        if waited:
+            self.stats.add(throttle_time=time.monotonic() - started)
+        return generation
+
+    def release(self, generation, response, attempt):
+        """
+        Освобождает место в окне и подстраивает окно и частоту по ответу (None - запрос завершился исключением).
+        Если запрос получил 429 и его нужно повторить, возвращает задержку повтора для acquire(), иначе None.
+        """
+        delay = None
+        with self._condition:
+            self._in_flight -= 1
+            now = time.monotonic()
+            if response is not None and response.status_code == 429:
+                self.stats.add(throttled=1)
+                # Ответы на запросы, отправленные до последнего уменьшения, окно и частоту повторно не уменьшают
+                if generation == self._generation:
+                    self._window = max(self.minimum, self._window * DECREASE_FACTOR)
+                    self._generation += 1
+                    self.stats.note_limit(int(self._window))
+                    self._decrease_rate(response, now)
+                # Общая пауза - только пока частота не оценена: Retry-After округлен до целых секунд
+                # и при частоте в десятки запросов в секунду означает простой
+                if self._rate is None:
+                    self._pause(retry_delay(response, attempt))
+                if attempt < self.max_retries:
+                    # Первый повтор идет в свой черед по частоте, повторный 429 того же запроса ждет еще
+                    # 2, 4, 8, ... интервалов между запросами, но не дольше Retry-After
+                    delay = 0.0
+                    if attempt > 0 and self._rate is not None:
+                        delay = min(retry_delay(response, attempt), 2 ** attempt / self._rate)
+                self.stats.add(**({"retries": 1} if delay is not None else {"gave_up": 1}))
+            elif response is not None:
+                limit = _header_int(response, "X-RateLimit-Limit")
+                remaining = _header_int(response, "X-RateLimit-Remaining")
+                if remaining is not None and limit and remaining >= limit - 1:
+                    # Квота была полной - простой до этого ничего не говорит о частоте сервера: оценка
+                    # начинается заново, и до следующего 429 сервер пропустит еще remaining запросов запаса
+                    self._accepted = -remaining
+                    self._sampled_at = now
+                else:
+                    self._accepted += 1
+                # Пока X-RateLimit-Remaining не больше запросов в полете, квота на исходе: окно и частота не растут.
+                # Частота растет пропорционально свободной квоте: при полной - на RATE_GROWTH за секунду
+                if remaining is None or remaining > self._in_flight:
+                    self._window = min(self.maximum, self._window + 1 / self._window)
+                    if self._rate:
+                        free = remaining / limit if remaining is not None and limit else 0.5
+                        self._rate *= 1 + RATE_GROWTH * min(free, 1.0) * min(now - self._grown_at, 1.0)
+                self._grown_at = now
+            self._condition.notify_all()
+        return delay
+
+    def _decrease_rate(self, response, now):
+        # С начала оценки (ответа при полной квоте, accepted отсчитан от ее остатка) квота не заполнялась,
+        # а в момент 429 исчерпана, значит сервер пропустил не меньше r * elapsed - 1 запросов:
+        # (accepted + 1) / elapsed - оценка частоты r сверху, тем точнее, чем больше elapsed. Ответ при
+        # полной квоте мог прийти позже ответов на запросы, отправленные после него, - тогда accepted отрицателен.
+        # Новая частота - RATE_DECREASE_FACTOR от оценки, но не больше текущей и не меньше X-RateLimit-Limit /
+        # X-RateLimit-Reset: за Reset секунд сервер восстанавливает всю квоту, а Reset округлен вверх
+        elapsed = now - self._sampled_at
+        rate = (max(self._accepted, 0) + 1) / elapsed if elapsed > 0 else None
+        if self._rate is not None:
+            rate = min(self._rate, rate or self._rate)
+        rate = max((rate or 0.0) * RATE_DECREASE_FACTOR, header_rate(response) or 0.0)
+        if rate:
+            self._rate = rate
+        self._grown_at = now
+
+    def _pause(self, seconds):
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+def format_stats(data):
+    """Строка отчета о сдерживании по ThrottleStats.as_dict(): сколько 429, повторов и времени ожидания."""
+    line = (f"Ограничение частоты: ответов 429 {data['throttled']}, повторов {data['retries']}, "
+            f"отдано с 429 {data['gave_up']}, ожидание {data['throttle_time']:.1f} с")
+    if data["min_limit"] is not None:
+        line += f", наименьшее окно {data['min_limit']}"
+    return line
+
@@ -0,0 +1,102 @@
+"""
+Хранилище результатов прогонов: JSONL-файл, в который прогон дописывает строки по мере выполнения.
+
+HTML-отчет pytest-html удобно читать, но его нельзя запросить и сравнить с другими прогонами.
+Поэтому прогон тестов, если задан MATTERMOST_RESULTS_STORE (путь к файлу, например mattermost_results.jsonl),
+дописывает в него по строке на событие:
+    {"type": "run", "run": ..., "started": ..., "version": ..., "base_url": ..., "workers": ...}     - начало прогона
+    {"type": "test", "run": ..., "test": ..., "outcome": ..., "duration": ..., "requests": {...}}  - после каждого теста
+    {"type": "run_end", "run": ..., "finished": ..., "duration": ..., "exitstatus": ...}              - конец прогона
+В "requests" - длительности (с) каждого запроса к API за время теста, включая его фикстуры,
+по нормализованным маршрутам: {"POST /api/v4/posts": {"durations": [...], "errors": 0}}.
+Строка теста пишется сразу после его завершения (воркеры xdist пишут сами под общей блокировкой),
+так что прерванный прогон оставляет в хранилище все завершенные тесты. Тренды по прогонам и версиям
+сервера строит python -m tests.trends, отдельно для каждого сервера (base_url) и числа воркеров.
+Без MATTERMOST_RESULTS_STORE хранилище отключено, и обычный pytest ничего не пишет; прогоны с фейковым сервером
+и воспроизведение кассеты не пишутся никогда.
+"""
+import json
+import os
+import threading
+import uuid
+from datetime import datetime, timezone
+from .parallel import file_lock
+
+# Файл, который по умолчанию читает python -m tests.trends; прогоны пишут в хранилище только по MATTERMOST_RESULTS_STORE
+DEFAULT_STORE_PATH = "mattermost_results.jsonl"
+DISABLED_VALUES = ("", "0", "off", "false", "no")
+# Точность сохраняемых длительностей (знаков после запятой в секундах): микросекунды
+DURATION_DIGITS = 6
+
+
+def store_path_from_env():
+    """Путь хранилища из MATTERMOST_RESULTS_STORE; None, если переменная не задана или хранилище отключено."""
+    value = os.getenv("MATTERMOST_RESULTS_STORE", "")
+    return None if value.strip().lower() in DISABLED_VALUES else value
+
+
+def new_run_id():
+    """Идентификатор прогона: время начала (сортируется как строка) и случайный суффикс."""
+    return f"{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}-{uuid.uuid4().hex[:6]}"
+
+
+def utc_now():
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+class ResultsStore:
+    """Append-only JSONL-файл результатов; дописывать могут несколько процессов одновременно."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def append(self, record):
+        """Дописывает одну запись; строка пишется целиком под межпроцессной блокировкой."""
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with file_lock(self.path):
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+
+    def records(self):
+        """Все записи по порядку; недописанная строка (процесс убит во время записи) пропускается."""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+class RequestTimings:
+    """
+    Сборщик задержек запросов текущего теста с тем же интерфейсом record(), что у MetricsRecorder.
+    Каждый вызов передается дальше в inner (общий сборщик отчета), а take() отдает и обнуляет
+    накопленное с прошлого вызова - задержки запросов одного теста. Повторенные ответы 429 (throttled)
+    в задержки теста не попадают.
+    """
+
+    def __init__(self, inner=None):
+        self.inner = inner
+        self._lock = threading.Lock()
+        self._routes = {}
+
+    def record(self, route, duration, status=None, error=None, connect=None, ttfb=None, throttled=False):
+        if self.inner is not None:
+            self.inner.record(route, duration, status=status, error=error, connect=connect, ttfb=ttfb, throttled=throttled)
+        if throttled:
+            return
+        failed = error is not None or (status is not None and status >= 400)
+        with self._lock:
+            data = self._routes.setdefault(route, {"durations": [], "errors": 0})
+            data["durations"].append(round(duration, DURATION_DIGITS))
+            data["errors"] += 1 if failed else 0
+
+    def take(self):
+        with self._lock:
+            routes, self._routes = self._routes, {}
+        return routes
@@ -0,0 +1,87 @@
+"""
+Замер масштабирования тестового набора по числу воркеров pytest-xdist.
+
+Запуск:
+    python -m tests.scaling --workers 1 2 4 8
+
+Для каждого числа воркеров набор прогоняется целиком, время прогона и ускорение
+относительно последовательного прогона записываются в scaling_results.json.
+Если файл существует, conftest добавляет таблицу масштабирования в HTML-отчет.
+"""
+import argparse
+import html
+import json
+import os
+import subprocess
+import sys
+import time
+
+DEFAULT_RESULTS_FILE = "scaling_results.json"
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def run_suite(workers, pytest_args):
+    """Прогоняет набор с заданным числом воркеров; 1 воркер - обычный последовательный прогон."""
+    command = [sys.executable, "-m", "pytest", "-q", "-p", "no:cacheprovider", "-n", str(workers if workers > 1 else 0),
+               TESTS_DIR, *pytest_args]
+    started = time.perf_counter()
+    completed = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - started, completed.returncode
+
+
+def measure(worker_counts, pytest_args=()):
+    """
+    Возвращает строки таблицы масштабирования: время, ускорение и эффективность для каждого числа воркеров.
+    Последовательный прогон (1 воркер) выполняется всегда - относительно него считается ускорение.
+    """
+    rows = []
+    baseline = None
+    for workers in sorted(set(worker_counts) | {1}):
+        duration, exit_code = run_suite(workers, list(pytest_args))
+        if baseline is None:
+            baseline = duration
+        speedup = baseline / duration
+        rows.append({"workers": workers, "duration": round(duration, 3), "speedup": round(speedup, 2),
+                     "efficiency": round(speedup / workers, 2), "exit_code": exit_code})
+        print(f"Воркеров: {workers:>3}  время: {duration:8.2f} с  ускорение: {speedup:5.2f}x  код выхода: {exit_code}")
+    return rows
+
+
+def load_results(path):
+    """Читает сохраненные результаты замера; None, если файла нет."""
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def render_html_table(rows):
+    """HTML-таблица масштабирования для раздела summary отчета pytest-html."""
+    cells = "".join(
+        f"<tr><td>{row['workers']}</td><td>{row['duration']:.2f}</td><td>{row['speedup']:.2f}x</td>"
+        f"<td>{row['efficiency']:.0%}</td><td>{html.escape(str(row['exit_code']))}</td></tr>"
+        for row in rows
+    )
+    return ("<h2>Масштабирование по числу воркеров</h2>"
+            "<table><tr><th>Воркеров</th><th>Время, с</th><th>Ускорение</th><th>Эффективность</th><th>Код выхода</th></tr>"
+            f"{cells}</table>")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Замер ускорения тестового набора в зависимости от числа воркеров")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="числа воркеров для замера")
+    parser.add_argument("--output", default=DEFAULT_RESULTS_FILE, help="куда сохранить результаты (JSON)")
+    parser.add_argument("pytest_args", nargs=argparse.REMAINDER, help="дополнительные аргументы pytest после --")
+    args = parser.parse_args(argv)
+    pytest_args = [a for a in args.pytest_args if a != "--"]
+    if any(w < 1 for w in args.workers):
+        parser.error("число воркеров должно быть положительным")
+    rows = measure(args.workers, pytest_args)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"created_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "runs": rows}, f, ensure_ascii=False, indent=2)
+    print(f"Результаты сохранены в {args.output}")
+    return 0 if all(row["exit_code"] == 0 for row in rows) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+"""
+Сценарии API, из которых состоят функциональные тесты: логин, создание канала, отправка и чтение
+сообщений, добавление/удаление участника. Используются нагрузочным прогоном и бенчмарками,
+чтобы нагрузка создавалась тем же кодом, что и функциональные проверки.
+Каждый сценарий выполняет одну операцию и поднимает исключение requests при ошибке.
+"""
+import uuid
+from .api_client import auth_headers, login as api_login
+from .channel_pool import CHANNEL_NAME_PREFIX
+
+# Каналы сценариев используют префикс тестовых каналов, чтобы их находила общая очистка
+SCENARIO_CHANNEL_PREFIX = f"{CHANNEL_NAME_PREFIX}load-"
+
+
+class ScenarioContext:
+    """
+    Состояние одного виртуального пользователя: авторизованный и анонимный клиенты,
+    параметры окружения и собственный рабочий канал для сообщений и участников.
+    """
+
+    def __init__(self, client, anon_client, base_url, team_id, login_id, password, other_user_id=None):
+        self.client = client
+        self.anon_client = anon_client
+        self.base_url = base_url
+        self.team_id = team_id
+        self.login_id = login_id
+        self.password = password
+        self.other_user_id = other_user_id
+        self.channel_id = None
+
+    def create_channel(self):
+        """Создает канал с уникальным именем и возвращает его данные."""
+        channel_name = f"{SCENARIO_CHANNEL_PREFIX}{uuid.uuid4().hex[:8]}"
+        payload = {"team_id": self.team_id, "name": channel_name, "display_name": f"Нагрузочный канал {channel_name}", "type": "O"}
+        response = self.client.post(f"{self.base_url}/api/v4/channels", json=payload, timeout=10)
+        response.raise_for_status()
+        return response.json()
+
+    def delete_channel(self, channel_id):
+        response = self.client.delete(f"{self.base_url}/api/v4/channels/{channel_id}", timeout=10)
+        response.raise_for_status()
+
+    def setup(self):
+        """Создает рабочий канал виртуального пользователя."""
+        self.channel_id = self.create_channel()["id"]
+
+    def teardown(self):
+        if self.channel_id:
+            self.delete_channel(self.channel_id)
+            self.channel_id = None
+
+
+def login(ctx):
+    """Логин основного пользователя и сразу logout, чтобы не копить сессии на сервере."""
+    token = api_login(ctx.anon_client, ctx.base_url, ctx.login_id, ctx.password)
+    ctx.anon_client.post(f"{ctx.base_url}/api/v4/users/logout", headers=auth_headers(token), timeout=10).raise_for_status()
+
+
+def create_channel(ctx):
+    """Создание канала и его удаление."""
+    channel = ctx.create_channel()
+    ctx.delete_channel(channel["id"])
+
+
+def post_message(ctx):
+    payload = {"channel_id": ctx.channel_id, "message": f"Нагрузочное сообщение {uuid.uuid4().hex[:8]}"}
+    ctx.client.post(f"{ctx.base_url}/api/v4/posts", json=payload, timeout=10).raise_for_status()
+
+
+def read_posts(ctx):
+    ctx.client.get(f"{ctx.base_url}/api/v4/channels/{ctx.channel_id}/posts", timeout=10).raise_for_status()
+
+
+def add_remove_member(ctx):
+    """Добавление OTHER_USER_ID в рабочий канал и удаление из него."""
+    members_url = f"{ctx.base_url}/api/v4/channels/{ctx.channel_id}/members"
+    ctx.client.post(members_url, json={"user_id": ctx.other_user_id}, timeout=10).raise_for_status()
+    ctx.client.delete(f"{members_url}/{ctx.other_user_id}", timeout=10).raise_for_status()
+
+
+# Имя сценария -> (функция, нужен ли OTHER_USER_ID)
+SCENARIOS = {
+    "login": (login, False),
+    "create_channel": (create_channel, False),
+    "post_message": (post_message, False),
+    "read_posts": (read_posts, False),
+    "add_remove_member": (add_remove_member, True),
+}
+# Смесь по умолчанию: чтение и отправка сообщений преобладают, как в реальном трафике
+DEFAULT_MIX = {"login": 1, "create_channel": 1, "post_message": 4, "read_posts": 4, "add_remove_member": 1}
+
+
+def available_scenarios(mix, other_user_id):
+    """Смесь без сценариев, для которых не хватает окружения (например, OTHER_USER_ID)."""
+    return {name: weight for name, weight in mix.items() if weight > 0 and (other_user_id or not SCENARIOS[name][1])}
@@ -0,0 +1,437 @@
+"""
+Наполнение сервера воспроизводимым набором данных для масштабных тестов и бенчмарков.
+
+Набор описывается числом команд, пользователей, каналов и постов и seed; по ним строится один и тот же план:
+размеры каналов и число постов в них распределены по закону Ципфа (несколько огромных каналов и много мелких),
+часть пользователей состоит во многих каналах, большинство - в немногих.
+
+Запуск (переменные окружения те же, что у тестов):
+    python -m tests.seeding api --teams 2 --users 500 --channels 50 --posts 100000 --seed 42
+    python -m tests.seeding import --teams 2 --users 500 --channels 50 --posts 100000 --seed 42 --output seed42.jsonl
+
+api    - параллельная запись через API от имени MATTERMOST_USER_LOGIN (нужны права системного администратора).
+         Запись возобновляема: готовые команды, пользователи, каналы и отправленные пачки постов хранятся
+         в файле состояния, и повторный запуск продолжает с места остановки.
+import - JSONL-файл для bulk import сервера (mmctl import upload/process); посты распределяются между
+         участниками каналов. Запись через API публикует все посты от имени администратора.
+
+Оба режима пишут манифест набора (--manifest); по нему тесты и бенчмарки находят данные нужного размера:
+    dataset = Dataset.load("dataset-s42.json")
+    channel = dataset.channel_with_posts(10000)      # канал примерно с 10000 постов
+    user = dataset.user_in_channels(20)              # пользователь примерно в 20 каналах
+    channel_id = dataset.channel_id(channel, api_client, base_url)
+"""
+import argparse
+import bisect
+import itertools
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .api_client import ApiClient
+from .members import add_members
+from .rate_limit import AdaptiveLimiter, format_stats as format_throttle_stats
+from .token_cache import end_session, session_token
+from . import settings
+
+MANIFEST_FORMAT = 1
+# Пароль всех пользователей набора: под ними можно логиниться в нагрузочных сценариях
+SEEDED_USER_PASSWORD = "Seed@user-1"
+# Показатель распределения Ципфа для размеров каналов, числа постов и активности пользователей
+ZIPF_EXPONENT = 1.1
+DEFAULT_AVG_MEMBERS = 20
+# Доля пользователей, которые кроме основной команды состоят еще в одной
+SECOND_TEAM_SHARE = 0.2
+# Посты набора укладываются в год до этого момента (1 января 2025 UTC), чтобы create_at не зависел от даты запуска
+DATASET_EPOCH_MS = 1735689600000
+DATASET_SPAN_MS = 365 * 24 * 3600 * 1000
+# Постов в одной пачке записи (пачки разных каналов пишутся параллельно)
+POSTS_CHUNK = 200
+TEAM_MEMBERS_BATCH = 200
+# Файл состояния перезаписывается не чаще этого интервала, с (и в конце каждого этапа)
+STATE_SAVE_INTERVAL = 1.0
+_WORDS = ("релиз", "сборка", "тест", "сервер", "канал", "задача", "ревью", "метрика", "ошибка", "деплой", "база",
+          "кэш", "очередь", "лог", "индекс", "запрос", "ответ", "пользователь", "нагрузка", "задержка", "план",
+          "готово", "проверю", "спасибо", "завтра", "сегодня", "срочно", "посмотри", "вопрос", "идея")
+
+
+def _zipf_counts(rng, total, buckets, minimum=0):
+    """Раскладывает total по buckets корзинам пропорционально 1/rank^ZIPF_EXPONENT (ранги перемешаны)."""
+    weights = [1 / rank ** ZIPF_EXPONENT for rank in range(1, buckets + 1)]
+    rng.shuffle(weights)
+    spread = max(total - minimum * buckets, 0)
+    scale = spread / sum(weights)
+    counts = [minimum + int(weight * scale) for weight in weights]
+    remainders = sorted(range(buckets), key=lambda i: weights[i] * scale - int(weights[i] * scale), reverse=True)
+    for i in remainders[:max(total - sum(counts), 0)]:
+        counts[i] += 1
+    return counts
+
+
+def _weighted_sample(rng, population, cum_weights, k):
+    """k различных элементов population с вероятностью, пропорциональной весам (cum_weights - накопленные)."""
+    if k * 4 >= len(population):
+        # Почти вся популяция: дешевле упорядочить всех по случайным ключам Эфраимидиса-Спиракиса
+        weights = [cum_weights[0]] + [b - a for a, b in zip(cum_weights, cum_weights[1:])]
+        keyed = sorted(((rng.random() ** (1 / weight), item) for item, weight in zip(population, weights)), reverse=True)
+        return [item for _, item in keyed[:k]]
+    chosen, total = {}, cum_weights[-1]
+    while len(chosen) < k:
+        item = population[bisect.bisect(cum_weights, rng.random() * total)]
+        chosen[item] = None
+    return list(chosen)
+
+
+def build_plan(teams, users, channels, posts, seed, avg_members=DEFAULT_AVG_MEMBERS):
+    """
+    Детерминированный план набора: одинаковые параметры и seed дают одинаковые имена, составы и размеры.
+    Пользователи и участники каналов задаются индексами в списке users.
+    """
+    if teams < 1 or users < 1 or channels < 1:
+        raise ValueError("Нужны хотя бы одна команда, один пользователь и один канал")
+    rng = random.Random(seed)
+    prefix = f"s{seed}"
+    plan = {
+        "spec": {"teams": teams, "users": users, "channels": channels, "posts": posts, "seed": seed, "avg_members": avg_members},
+        "teams": [{"name": f"{prefix}-team-{index}"} for index in range(teams)],
+        "users": [],
+        "channels": [],
+    }
+    team_users = [[] for _ in range(teams)]
+    for index in range(users):
+        user_teams = [index % teams]
+        if teams > 1 and rng.random() < SECOND_TEAM_SHARE:
+            user_teams.append((index % teams + rng.randrange(1, teams)) % teams)
+        for team in user_teams:
+            team_users[team].append(index)
+        plan["users"].append({"username": f"{prefix}-u{index}", "teams": user_teams, "channels": 0})
+
+    # Активность пользователей: одни состоят во многих каналах, другие - в немногих
+    activity = [1 / rank ** ZIPF_EXPONENT for rank in range(1, users + 1)]
+    rng.shuffle(activity)
+    cum_activity = [list(itertools.accumulate(activity[user] for user in members)) for members in team_users]
+
+    channel_teams = [index % teams for index in range(channels)]
+    sizes = _zipf_counts(rng, avg_members * channels, channels, minimum=1)
+    post_counts = _zipf_counts(rng, posts, channels)
+    for index in range(channels):
+        team = channel_teams[index]
+        size = min(sizes[index], len(team_users[team]))
+        members = _weighted_sample(rng, team_users[team], cum_activity[team], size) if size else []
+        for user in members:
+            plan["users"][user]["channels"] += 1
+        plan["channels"].append({"name": f"{prefix}-ch-{index}", "team": team, "members": sorted(members),
+                                 "posts": post_counts[index]})
+    return plan
+
+
+def post_message(seed, channel_name, index):
+    """Текст index-го поста канала; зависит только от seed, имени канала и номера."""
+    rng = random.Random(f"{seed}:{channel_name}:{index}")
+    length = min(max(1, int(rng.lognormvariate(2, 0.8))), 200)
+    return " ".join(rng.choice(_WORDS) for _ in range(length)).capitalize()
+
+
+def post_create_at(channel, index):
+    """Время создания index-го поста канала: посты равномерно распределены по году до DATASET_EPOCH_MS."""
+    step = DATASET_SPAN_MS // max(channel["posts"], 1)
+    return DATASET_EPOCH_MS - DATASET_SPAN_MS + index * step
+
+
+def write_import_file(plan, path):
+    """Пишет план в формате bulk import Mattermost (JSONL): версия, команды, каналы, пользователи, посты."""
+    seed = plan["spec"]["seed"]
+    team_names = [team["name"] for team in plan["teams"]]
+    user_channels = [[] for _ in plan["users"]]
+    for channel in plan["channels"]:
+        for user in channel["members"]:
+            user_channels[user].append(channel)
+
+    def line(kind, body):
+        f.write(json.dumps({"type": kind, kind: body}, ensure_ascii=False) + "\n")
+
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"type": "version", "version": 1}) + "\n")
+        for team in plan["teams"]:
+            line("team", {"name": team["name"], "display_name": team["name"], "type": "O"})
+        for channel in plan["channels"]:
+            line("channel", {"team": team_names[channel["team"]], "name": channel["name"], "display_name": channel["name"], "type": "O"})
+        for index, user in enumerate(plan["users"]):
+            teams = [{"name": team_names[team], "roles": "team_user",
+                      "channels": [{"name": channel["name"], "roles": "channel_user"}
+                                   for channel in user_channels[index] if channel["team"] == team]}
+                     for team in user["teams"]]
+            line("user", {"username": user["username"], "email": f"{user['username']}@seed.example.com",
+                          "password": SEEDED_USER_PASSWORD, "teams": teams})
+        for channel in plan["channels"]:
+            if not channel["members"]:
+                continue
+            authors = random.Random(f"{seed}:{channel['name']}:authors")
+            for index in range(channel["posts"]):
+                line("post", {"team": team_names[channel["team"]], "channel": channel["name"],
+                              "user": plan["users"][authors.choice(channel["members"])]["username"],
+                              "message": post_message(seed, channel["name"], index), "create_at": post_create_at(channel, index)})
+
+
+class ApiSeeder:
+    """
+    Запись плана через API параллельными запросами. Этапы идут по порядку (команды, пользователи,
+    членство в командах, каналы, участники каналов, посты), элементы внутри этапа - параллельно.
+    Готовые элементы и число отправленных постов каждой пачки сохраняются в файл состояния не реже раза
+    в STATE_SAVE_INTERVAL и при остановке (ошибка, Ctrl+C). Если процесс убит, посты, отправленные
+    за последний интервал, при возобновлении отправляются повторно.
+    """
+
+    def __init__(self, client, base_url, plan, state_path, workers=8):
+        self.client = client
+        self.base_url = base_url
+        self.plan = plan
+        self.state_path = state_path
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._saved_at = 0.0
+        self._stopping = threading.Event()
+        self.state = {"spec": plan["spec"], "teams": {}, "users": {}, "team_members": [], "channels": {},
+                      "channel_members": [], "posts": {}}
+        if os.path.exists(state_path):
+            with open(state_path, encoding="utf-8") as f:
+                saved = json.load(f)
+            if saved["spec"] != plan["spec"]:
+                raise ValueError(f"Файл состояния {state_path} относится к другому набору: {saved['spec']}")
+            self.state = saved
+
+    def _save(self, force=True):
+        with self._lock:
+            if not force and time.monotonic() - self._saved_at < STATE_SAVE_INTERVAL:
+                return
+            self._saved_at = time.monotonic()
+            temp_path = f"{self.state_path}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(self.state, f, ensure_ascii=False)
+            os.replace(temp_path, self.state_path)
+
+    def _parallel(self, title, function, items):
+        items = list(items)
+        if not items:
+            return
+        started, done = time.perf_counter(), 0
+        print(f"{title}: {len(items)}")
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        try:
+            for _ in executor.map(function, items):
+                done += 1
+                if done % max(len(items) // 10, 1) == 0 or done == len(items):
+                    print(f"  {done}/{len(items)} ({done / (time.perf_counter() - started):.0f}/с)")
+        finally:
+            # При ошибке или Ctrl+C начатые пачки останавливаются после текущего запроса, прогресс сохраняется
+            self._stopping.set()
+            executor.shutdown(cancel_futures=True)
+            self._stopping.clear()
+            self._save()
+
+    def _get_or_create(self, lookup_url, create_url, payload):
+        response = self.client.get(lookup_url, timeout=10)
+        if response.status_code == 404:
+            response = self.client.post(create_url, json=payload, timeout=10)
+        response.raise_for_status()
+        return response.json()["id"]
+
+    def _team(self, index):
+        name = self.plan["teams"][index]["name"]
+        team_id = self._get_or_create(f"{self.base_url}/api/v4/teams/name/{name}", f"{self.base_url}/api/v4/teams",
+                                      {"name": name, "display_name": name, "type": "O"})
+        with self._lock:
+            self.state["teams"][str(index)] = team_id
+
+    def _user(self, index):
+        username = self.plan["users"][index]["username"]
+        user_id = self._get_or_create(f"{self.base_url}/api/v4/users/username/{username}", f"{self.base_url}/api/v4/users",
+                                      {"username": username, "email": f"{username}@seed.example.com", "password": SEEDED_USER_PASSWORD})
+        with self._lock:
+            self.state["users"][str(index)] = user_id
+
+    def _team_members(self, batch):
+        team, start = batch
+        user_ids = [self.state["users"][str(user)] for user in self._team_users[team][start:start + TEAM_MEMBERS_BATCH]]
+        team_id = self.state["teams"][str(team)]
+        response = self.client.post(f"{self.base_url}/api/v4/teams/{team_id}/members/batch",
+                                    json=[{"team_id": team_id, "user_id": user_id} for user_id in user_ids], timeout=15)
+        response.raise_for_status()
+        with self._lock:
+            self.state["team_members"].append(f"{team}:{start}")
+        self._save(force=False)
+
+    def _channel(self, index):
+        channel = self.plan["channels"][index]
+        team_id = self.state["teams"][str(channel["team"])]
+        channel_id = self._get_or_create(f"{self.base_url}/api/v4/teams/{team_id}/channels/name/{channel['name']}",
+                                         f"{self.base_url}/api/v4/channels",
+                                         {"team_id": team_id, "name": channel["name"], "display_name": channel["name"], "type": "O"})
+        with self._lock:
+            self.state["channels"][str(index)] = channel_id
+
+    def _channel_members(self, index):
+        channel = self.plan["channels"][index]
+        add_members(self.client, self.base_url, self.state["channels"][str(index)],
+                    [self.state["users"][str(user)] for user in channel["members"]])
+        with self._lock:
+            self.state["channel_members"].append(index)
+        self._save(force=False)
+
+    def _posts(self, chunk):
+        index, start = chunk
+        channel = self.plan["channels"][index]
+        channel_id = self.state["channels"][str(index)]
+        key = f"{index}:{start}"
+        for number in range(start + self.state["posts"].get(key, 0), min(start + POSTS_CHUNK, channel["posts"])):
+            if self._stopping.is_set():
+                return
+            payload = {"channel_id": channel_id, "message": post_message(self.plan["spec"]["seed"], channel["name"], number)}
+            self.client.post(f"{self.base_url}/api/v4/posts", json=payload, timeout=10).raise_for_status()
+            with self._lock:
+                self.state["posts"][key] = number - start + 1
+            self._save(force=False)
+
+    def run(self):
+        plan, state = self.plan, self.state
+        self._team_users = [[] for _ in plan["teams"]]
+        for index, user in enumerate(plan["users"]):
+            for team in user["teams"]:
+                self._team_users[team].append(index)
+
+        self._parallel("Команды", self._team, [i for i in range(len(plan["teams"])) if str(i) not in state["teams"]])
+        self._parallel("Пользователи", self._user, [i for i in range(len(plan["users"])) if str(i) not in state["users"]])
+        self._parallel("Пачки членства в командах", self._team_members,
+                       [(team, start) for team, users in enumerate(self._team_users)
+                        for start in range(0, len(users), TEAM_MEMBERS_BATCH) if f"{team}:{start}" not in state["team_members"]])
+        self._parallel("Каналы", self._channel, [i for i in range(len(plan["channels"])) if str(i) not in state["channels"]])
+        self._parallel("Участники каналов", self._channel_members,
+                       [i for i, channel in enumerate(plan["channels"]) if channel["members"] and i not in state["channel_members"]])
+        # Пачки постов перемешаны между каналами (детерминированно по seed): одновременно идущие пачки обычно
+        # из разных каналов, и нагрузка на строку канала в БД распределяется. Это не гарантия - две пачки
+        # одного крупного канала могут идти параллельно, поэтому порядок постов внутри канала не сохраняется
+        chunks = [(i, start) for i, channel in enumerate(plan["channels"]) for start in range(0, channel["posts"], POSTS_CHUNK)
+                  if state["posts"].get(f"{i}:{start}", 0) < min(POSTS_CHUNK, channel["posts"] - start)]
+        random.Random(plan["spec"]["seed"]).shuffle(chunks)
+        self._parallel("Пачки постов", self._posts, chunks)
+
+
+def build_manifest(plan, mode, ids=None):
+    """Манифест набора: параметры, команды, каналы (размер и число постов) и пользователи (число каналов)."""
+    ids = ids or {}
+    team_names = [team["name"] for team in plan["teams"]]
+    return {
+        "format": MANIFEST_FORMAT,
+        "mode": mode,
+        "spec": plan["spec"],
+        "teams": [{"name": team["name"], "id": ids.get("teams", {}).get(str(i))} for i, team in enumerate(plan["teams"])],
+        "channels": [{"name": channel["name"], "team": team_names[channel["team"]], "members": len(channel["members"]),
+                      "posts": channel["posts"], "id": ids.get("channels", {}).get(str(i))}
+                     for i, channel in enumerate(plan["channels"])],
+        "users": [{"username": user["username"], "channels": user["channels"], "id": ids.get("users", {}).get(str(i))}
+                  for i, user in enumerate(plan["users"])],
+    }
+
+
+class Dataset:
+    """Запросы к засеянному набору по его манифесту: каналы и пользователи нужного размера."""
+
+    def __init__(self, manifest):
+        self.manifest = manifest
+        self.password = SEEDED_USER_PASSWORD
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("format") != MANIFEST_FORMAT:
+            raise ValueError(f"Неподдерживаемый формат манифеста {manifest.get('format')!r} в {path}")
+        return cls(manifest)
+
+    def channel_with_posts(self, posts):
+        """Канал с числом постов, ближайшим к posts."""
+        return min(self.manifest["channels"], key=lambda channel: abs(channel["posts"] - posts))
+
+    def channel_with_members(self, members):
+        """Канал с числом участников, ближайшим к members."""
+        return min(self.manifest["channels"], key=lambda channel: abs(channel["members"] - members))
+
+    def user_in_channels(self, channels):
+        """Пользователь, состоящий в числе каналов, ближайшем к channels."""
+        return min(self.manifest["users"], key=lambda user: abs(user["channels"] - channels))
+
+    def channel_id(self, channel, api_client, base_url):
+        """Идентификатор канала на сервере (для набора из bulk import - поиском по имени команды и канала)."""
+        if not channel.get("id"):
+            team = api_client.get(f"{base_url}/api/v4/teams/name/{channel['team']}", timeout=10)
+            team.raise_for_status()
+            response = api_client.get(f"{base_url}/api/v4/teams/{team.json()['id']}/channels/name/{channel['name']}", timeout=10)
+            response.raise_for_status()
+            channel["id"] = response.json()["id"]
+        return channel["id"]
+
+    def user_id(self, user, api_client, base_url):
+        """Идентификатор пользователя на сервере (для набора из bulk import - поиском по имени)."""
+        if not user.get("id"):
+            response = api_client.get(f"{base_url}/api/v4/users/username/{user['username']}", timeout=10)
+            response.raise_for_status()
+            user["id"] = response.json()["id"]
+        return user["id"]
+
+
+def _save_manifest(manifest, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    print(f"Манифест набора сохранен в {path}")
+
+
+def main(argv=None):
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--teams", type=int, default=1, help="число команд")
+    common.add_argument("--users", type=int, default=100, help="число пользователей")
+    common.add_argument("--channels", type=int, default=20, help="число каналов")
+    common.add_argument("--posts", type=int, default=10000, help="общее число постов")
+    common.add_argument("--avg-members", type=int, default=DEFAULT_AVG_MEMBERS, help="среднее число участников канала")
+    common.add_argument("--seed", type=int, default=1, help="seed плана набора")
+    common.add_argument("--manifest", help="файл манифеста (по умолчанию dataset-s<seed>.json)")
+    parser = argparse.ArgumentParser(description="Воспроизводимое наполнение Mattermost данными для масштабных тестов")
+    modes = parser.add_subparsers(dest="mode", required=True)
+    api = modes.add_parser("api", parents=[common], help="записать набор через API (возобновляемо)")
+    api.add_argument("--workers", type=int, default=8, help="параллельных запросов")
+    api.add_argument("--state", help="файл состояния для возобновления (по умолчанию <манифест>.state)")
+    bulk = modes.add_parser("import", parents=[common], help="сгенерировать JSONL для bulk import сервера")
+    bulk.add_argument("--output", required=True, help="файл JSONL для mmctl import")
+    args = parser.parse_args(argv)
+
+    plan = build_plan(args.teams, args.users, args.channels, args.posts, args.seed, avg_members=args.avg_members)
+    manifest_path = args.manifest or f"dataset-s{args.seed}.json"
+    if args.mode == "import":
+        write_import_file(plan, args.output)
+        print(f"Файл импорта записан в {args.output}; загрузка: zip, затем mmctl import upload и mmctl import process")
+        _save_manifest(build_manifest(plan, "import"), manifest_path)
+        return 0
+
+    if settings.missing_required():
+        parser.error(f"Не установлены обязательные переменные окружения: {', '.join(settings.missing_required())}")
+    limiter = AdaptiveLimiter(args.workers)
+    client = ApiClient(pool_size=max(args.workers, settings.POOL_SIZE), limiter=limiter)
+    try:
+        # Засев возобновляется много раз: токен берется из кэша, а открытая здесь сессия завершается в конце
+        client.set_token(session_token(client, settings.BASE_URL, settings.LOGIN_ID, settings.PASSWORD))
+        seeder = ApiSeeder(client, settings.BASE_URL, plan, args.state or f"{manifest_path}.state", workers=args.workers)
+        started = time.perf_counter()
+        seeder.run()
+        print(f"Набор записан за {time.perf_counter() - started:.1f} с")
+        print(format_throttle_stats(limiter.stats.as_dict()))
+    finally:
+        end_session(client, settings.BASE_URL)
+        client.close()
+    _save_manifest(build_manifest(plan, "api", seeder.state), manifest_path)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,38 @@
+import os
+from dotenv import load_dotenv
+from .api_client import DEFAULT_POOL_SIZE
+from .cassette import cassette_from_env
+from .fake_server import start_from_env
+
+load_dotenv()
+
+# При MATTERMOST_FAKE_SERVER=1 запросы идут в фейковый сервер в этом же процессе;
+# он стартует до чтения настроек, так как прописывает свой адрес и учетные данные в окружение
+FAKE_SERVER = start_from_env()
+# Кассета HTTP-взаимодействий (MATTERMOST_CASSETTE); при воспроизведении настройки берутся из нее
+CASSETTE = cassette_from_env()
+if CASSETTE is not None and not CASSETTE.record:
+    os.environ.update(CASSETTE.replay_settings())
+
+# Получение конфигурации из переменных окружения
+BASE_URL = os.getenv("MATTERMOST_BASE_URL")
+LOGIN_ID = os.getenv("MATTERMOST_USER_LOGIN")
+PASSWORD = os.getenv("MATTERMOST_USER_PASSWORD")
+TEAM_ID = os.getenv("MATTERMOST_TEST_TEAM_ID")
+OTHER_USER_ID = os.getenv("MATTERMOST_OTHER_USER_ID")
+# Учетные данные OTHER_USER_ID (необязательно): нужны, чтобы подключаться к WebSocket от его имени
+OTHER_USER_LOGIN = os.getenv("MATTERMOST_OTHER_USER_LOGIN")
+OTHER_USER_PASSWORD = os.getenv("MATTERMOST_OTHER_USER_PASSWORD")
+LOCKED_USER_LOGIN = os.getenv("MATTERMOST_LOCKED_USER_LOGIN")
+LOCKED_USER_PASSWORD = os.getenv("MATTERMOST_LOCKED_USER_PASSWORD")
+INACTIVE_USER_LOGIN = os.getenv("MATTERMOST_INACTIVE_USER_LOGIN")
+INACTIVE_USER_PASSWORD = os.getenv("MATTERMOST_INACTIVE_USER_PASSWORD")
+# Размер пула keep-alive соединений общего HTTP-клиента (под ожидаемую конкурентность)
+POOL_SIZE = int(os.getenv("MATTERMOST_POOL_SIZE", DEFAULT_POOL_SIZE))
+
+REQUIRED_VARIABLES = ("MATTERMOST_BASE_URL", "MATTERMOST_USER_LOGIN", "MATTERMOST_USER_PASSWORD", "MATTERMOST_TEST_TEAM_ID")
+
+
+def missing_required():
+    """Имена обязательных переменных окружения, которые не заданы."""
+    return [name for name in REQUIRED_VARIABLES if not os.getenv(name)]
@@ -0,0 +1,239 @@
+"""
+Уборка тестовых каналов, оставшихся после прерванных прогонов.
+
+Каналы тестов удаляются в finally фикстур и тестов, поэтому прогон, убитый по таймауту CI или Ctrl+C
+на середине, оставляет их на сервере: test-auto-* (пул каналов, сценарии нагрузки, по воркерам xdist
+test-auto-gw1-*) и duplicate-test-* (test_create_channel_duplicate_name). Со временем их набираются
+тысячи, и листинг каналов команды заметно замедляется.
+
+Запуск (переменные окружения те же, что у тестов):
+    python -m tests.sweeper --dry-run
+    python -m tests.sweeper --workers 32 --min-age 3600
+    python -m tests.sweeper --team-id <id> --prefix test-auto-load- --permanent --archived
+
+Каналы ищутся во всех командах основного пользователя (или только в --team-id) постраничным
+листингом публичных и приватных каналов (приватные видны только системному администратору),
+с --archived - и среди архивированных. Найденные удаляются --workers параллельными запросами
+с общим окном ограничения частоты; прогресс печатается раз в секунду.
+--min-age пропускает каналы моложе заданного числа секунд (по умолчанию 600): каналы прогона, который
+идет прямо сейчас на том же сервере, не трогаются; убрать и свежие каналы можно только явным --min-age 0.
+Без --permanent каналы архивируются, как это делают сами тесты; с --permanent удаляются безвозвратно
+(нужен ServiceSettings.EnableAPIChannelDeletion).
+
+Та же уборка запускается хуком pytest, если задан MATTERMOST_SWEEP=start (до тестов), end (после) или both,
+с минимальным возрастом MATTERMOST_SWEEP_MIN_AGE секунд (по умолчанию 600).
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from .api_client import ApiClient
+from .channel_pool import CHANNEL_NAME_PREFIX, DUPLICATE_CHANNEL_PREFIX
+from .rate_limit import AdaptiveLimiter, format_stats as format_throttle_stats
+from .token_cache import end_session, session_token
+from . import settings
+
+# Префиксы имен всех каналов, которые создает набор тестов (test-auto-load-* и test-auto-gw*-* тоже начинаются с test-auto-)
+LEAK_PREFIXES = (CHANNEL_NAME_PREFIX, DUPLICATE_CHANNEL_PREFIX)
+DEFAULT_WORKERS = 16
+# Максимальный размер страницы каналов в API v4
+CHANNELS_PER_PAGE = 200
+# Как часто печатать прогресс удаления, с
+PROGRESS_INTERVAL = 1.0
+# Этапы прогона pytest, на которых хук запускает уборку (MATTERMOST_SWEEP)
+SWEEP_STAGES = ("start", "end")
+# Минимальный возраст канала для уборки (и из хука, и из командной строки): каналы параллельного прогона
+# моложе, их не трогаем
+DEFAULT_MIN_AGE = 600
+
+
+def stages_from_env():
+    """Этапы уборки из MATTERMOST_SWEEP: "start", "end", "both" или список через запятую; пустое множество - хук выключен."""
+    value = os.getenv("MATTERMOST_SWEEP", "").strip().lower()
+    if value == "both":
+        return set(SWEEP_STAGES)
+    stages = {stage.strip() for stage in value.split(",") if stage.strip()}
+    unknown = stages - set(SWEEP_STAGES)
+    if unknown:
+        raise ValueError(f"Неизвестные этапы MATTERMOST_SWEEP: {', '.join(sorted(unknown))} (допустимы start, end, both)")
+    return stages
+
+
+def _pages(client, url):
+    """Все элементы постраничного списка API; 403 (нет прав на список) - пустой список."""
+    page = 0
+    while True:
+        response = client.get(url, params={"page": page, "per_page": CHANNELS_PER_PAGE}, timeout=30)
+        if response.status_code == 403:
+            return
+        response.raise_for_status()
+        batch = response.json() or []
+        yield from batch
+        if len(batch) < CHANNELS_PER_PAGE:
+            return
+        page += 1
+
+
+def user_team_ids(client, base_url):
+    """Идентификаторы команд, в которых состоит пользователь сессии."""
+    response = client.get(f"{base_url}/api/v4/users/me/teams", timeout=10)
+    response.raise_for_status()
+    return [team["id"] for team in response.json()]
+
+
+def find_leaks(client, base_url, team_ids, prefixes=LEAK_PREFIXES, min_age=0, archived=False):
+    """
+    Каналы команд team_ids, имена которых начинаются с одного из prefixes и которые созданы не позже
+    чем min_age секунд назад. Команды просматриваются параллельно; результат отсортирован по команде и имени.
+    """
+    kinds = ["channels", "channels/private"] + (["channels/deleted"] if archived else [])
+    cutoff = (time.time() - min_age) * 1000
+
+    def scan(team_id):
+        found = {}
+        for kind in kinds:
+            for channel in _pages(client, f"{base_url}/api/v4/teams/{team_id}/{kind}"):
+                if channel["name"].startswith(tuple(prefixes)) and channel.get("create_at", 0) <= cutoff:
+                    found[channel["id"]] = channel
+        return list(found.values())
+
+    if not team_ids:
+        return []
+    with ThreadPoolExecutor(max_workers=min(len(team_ids), DEFAULT_WORKERS)) as executor:
+        leaks = [channel for channels in executor.map(scan, team_ids) for channel in channels]
+    return sorted(leaks, key=lambda channel: (channel["team_id"], channel["name"]))
+
+
+class SweepProgress:
+    """Потокобезопасный счетчик удаления, который не чаще раза в interval секунд печатает прогресс и темп."""
+
+    def __init__(self, total, interval=PROGRESS_INTERVAL, output=print):
+        self.total = total
+        self.interval = interval
+        self.output = output
+        self.done = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._printed = self._started
+
+    def advance(self, ok):
+        with self._lock:
+            self.done += 1
+            self.failed += 0 if ok else 1
+            now = time.monotonic()
+            if now - self._printed < self.interval and self.done < self.total:
+                return
+            self._printed = now
+            line = self.line(now)
+        self.output(line)
+
+    def line(self, now=None):
+        elapsed = (now or time.monotonic()) - self._started
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        return f"Удалено {self.done}/{self.total}, ошибок {self.failed}, {rate:.0f} канал/с"
+
+
+def delete_channels(client, base_url, channels, workers=DEFAULT_WORKERS, permanent=False, progress=None):
+    """
+    Удаляет каналы workers параллельными запросами. 404 - канал уже удален (кем-то еще), это не ошибка.
+    Возвращает {"deleted", "missing", "failed", "errors": {статус: число}}.
+    """
+    counts, errors, lock = Counter(), Counter(), threading.Lock()
+    params = {"permanent": "true"} if permanent else None
+
+    def delete(channel):
+        try:
+            response = client.delete(f"{base_url}/api/v4/channels/{channel['id']}", params=params, timeout=30)
+            status = response.status_code
+        except requests.exceptions.RequestException as e:
+            status = type(e).__name__
+        outcome = "deleted" if status == 200 else "missing" if status == 404 else "failed"
+        with lock:
+            counts[outcome] += 1
+            if outcome == "failed":
+                errors[str(status)] += 1
+        if progress is not None:
+            progress.advance(outcome != "failed")
+
+    if channels:
+        with ThreadPoolExecutor(max_workers=min(workers, len(channels))) as executor:
+            list(executor.map(delete, channels))
+    return {"deleted": counts["deleted"], "missing": counts["missing"], "failed": counts["failed"], "errors": dict(errors)}
+
+
+def run_sweep(team_ids=None, prefixes=LEAK_PREFIXES, min_age=DEFAULT_MIN_AGE, workers=DEFAULT_WORKERS, dry_run=False,
+              permanent=False, archived=False, base_url=None):
+    """
+    Находит и удаляет оставленные тестами каналы от имени основного пользователя.
+    Возвращает сводку {"teams", "found", "deleted", "missing", "failed", "errors", "elapsed", "channels"}.
+    """
+    base_url = base_url or settings.BASE_URL
+    limiter = AdaptiveLimiter(workers)
+    client = ApiClient(pool_size=workers, limiter=limiter)
+    started = time.perf_counter()
+    try:
+        client.set_token(session_token(client, base_url, settings.LOGIN_ID, settings.PASSWORD))
+        team_ids = list(team_ids or user_team_ids(client, base_url))
+        leaks = find_leaks(client, base_url, team_ids, prefixes=prefixes, min_age=min_age, archived=archived)
+        print(f"Найдено {len(leaks)} тестовых каналов в {len(team_ids)} командах ({', '.join(prefixes)})")
+        result = {"deleted": 0, "missing": 0, "failed": 0, "errors": {}}
+        if leaks and not dry_run:
+            result = delete_channels(client, base_url, leaks, workers=workers, permanent=permanent,
+                                     progress=SweepProgress(len(leaks)))
+    finally:
+        end_session(client, base_url)
+        client.close()
+    if limiter.stats.throttled:
+        print(format_throttle_stats(limiter.stats.as_dict()))
+    return dict(result, teams=len(team_ids), found=len(leaks), elapsed=time.perf_counter() - started,
+                channels=[{"id": c["id"], "team_id": c["team_id"], "name": c["name"]} for c in leaks])
+
+
+def format_results(result, dry_run=False):
+    if dry_run:
+        lines = [f"  {channel['team_id']}  {channel['name']}" for channel in result["channels"]]
+        return "\n".join(lines + [f"Пробный запуск: {result['found']} каналов к удалению, ничего не удалено"])
+    line = (f"Уборка: найдено {result['found']}, удалено {result['deleted']}, уже удалены {result['missing']}, "
+            f"ошибок {result['failed']} за {result['elapsed']:.1f} с")
+    if result["errors"]:
+        line += f" (по статусам: {', '.join(f'{status}: {n}' for status, n in sorted(result['errors'].items()))})"
+    return line
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Поиск и удаление тестовых каналов, оставшихся после прерванных прогонов")
+    parser.add_argument("--team-id", nargs="+", help="команды для уборки (по умолчанию все команды основного пользователя)")
+    parser.add_argument("--prefix", nargs="+", default=list(LEAK_PREFIXES), help="префиксы имен тестовых каналов")
+    parser.add_argument("--min-age", type=float, default=DEFAULT_MIN_AGE,
+                        help=f"не трогать каналы моложе стольких секунд (по умолчанию {DEFAULT_MIN_AGE}; 0 - убрать и каналы идущих прогонов)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="параллельных запросов удаления")
+    parser.add_argument("--dry-run", action="store_true", help="только показать найденные каналы")
+    parser.add_argument("--permanent", action="store_true", help="удалять безвозвратно, а не архивировать")
+    parser.add_argument("--archived", action="store_true", help="искать и среди архивированных (имеет смысл с --permanent)")
+    parser.add_argument("--output", help="сохранить сводку в JSON-файл")
+    args = parser.parse_args(argv)
+    if settings.missing_required():
+        parser.error(f"Не установлены обязательные переменные окружения: {', '.join(settings.missing_required())}")
+    if args.workers < 1 or args.min_age < 0:
+        parser.error("Число параллельных запросов должно быть положительным, а минимальный возраст - неотрицательным")
+    if args.archived and not args.permanent and not args.dry_run:
+        parser.error("Архивированные каналы можно удалить только безвозвратно: добавьте --permanent")
+
+    result = run_sweep(team_ids=args.team_id, prefixes=tuple(args.prefix), min_age=args.min_age, workers=args.workers,
+                       dry_run=args.dry_run, permanent=args.permanent, archived=args.archived)
+    print(format_results(result, dry_run=args.dry_run))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"Результаты сохранены в {args.output}")
+    return 1 if result["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,17 +1,30 @@
 import requests
 import pytest
+import time
 import uuid
-from .conftest import BASE_URL, LOGIN_ID, PASSWORD, LOCKED_USER_LOGIN, LOCKED_USER_PASSWORD, INACTIVE_USER_LOGIN, INACTIVE_USER_PASSWORD
+from .conftest import BASE_URL, CASSETTE, LOGIN_ID, PASSWORD, LOCKED_USER_LOGIN, LOCKED_USER_PASSWORD, INACTIVE_USER_LOGIN, INACTIVE_USER_PASSWORD
+from .api_client import auth_headers
+from .fault_proxy import FaultProfile, FaultProxy
 
-def test_successful_authentication(auth_token):
+def test_successful_authentication(anon_client):
     """
     Сценарий: Проверка успешной аутентификации пользователя с использованием корректных учетных данных.
-    Шаги: Фикстура auth_token выполняет логин.
-    Ожидаемый результат: Фикстура отрабатывает без ошибок, auth_token не None.
+    Шаги:
+        1. Отправить POST запрос на /users/login с логином и паролем основного пользователя
+           (явно, а не через фикстуру auth_token, которая обычно берет токен из кэша).
+        2. Закрыть открытую сессию через /users/logout.
+    Ожидаемый результат: Статус-код 200 OK, в заголовке Token есть токен, в ответе - данные пользователя.
     """
-    assert auth_token is not None, "Токен не должен быть None при успешной аутентификации"
+    response = anon_client.post(f"{BASE_URL}/api/v4/users/login", json={"login_id": LOGIN_ID, "password": PASSWORD}, timeout=15)
+    assert response.status_code == 200, f"Ожидался статус 200 при логине, получен {response.status_code}. Ответ: {response.text[:200]}"
+    token = response.headers.get("Token")
+    assert token, "В ответе на успешный логин нет заголовка Token"
+    assert response.json().get("id"), "В ответе на логин нет данных пользователя"
+    print(f"\nЛогин {LOGIN_ID} выполнен, токен получен.")
+    # Сессия теста больше не нужна: не оставляем ее на сервере
+    anon_client.post(f"{BASE_URL}/api/v4/users/logout", headers=auth_headers(token), timeout=10)
 
-def test_authentication_invalid_credentials():
+def test_authentication_invalid_credentials(anon_client):
     """
     Сценарий: Проверка обработки ошибок при аутентификации с некорректными учетными данными.
     Шаги:
@@ -22,14 +35,14 @@ def test_authentication_invalid_credentials():
     payload = {"login_id": f"invalid_user_{uuid.uuid4().hex[:6]}", "password": "invalid_password"}
     headers = {"Content-Type": "application/json"}
     print(f"\nТест: Попытка логина с неверными данными: {payload['login_id']}")
-    response = requests.post(login_url, json=payload, headers=headers, timeout=10)
+    response = anon_client.post(login_url, json=payload, headers=headers, timeout=10)
     assert response.status_code == 401, f"Ожидался статус 401, получен {response.status_code}. Ответ: {response.text[:200]}"
     print("Получен ожидаемый статус 401 для неверных учетных данных.")
 
 # --- Тесты, требующие предварительной настройки ---
 
 @pytest.mark.skipif(not LOCKED_USER_LOGIN or not LOCKED_USER_PASSWORD, reason="Не заданы переменные окружения для заблокированного пользователя (MATTERMOST_LOCKED_USER_LOGIN/PASSWORD)")
-def test_authentication_locked_account():
+def test_authentication_locked_account(anon_client):
     """
     Сценарий: Попытаться войти в заблокированную учетную запись.
     Предусловия: Существует заблокированный пользователь с данными из .env.
@@ -41,7 +54,7 @@ def test_authentication_locked_account():
     payload = {"login_id": LOCKED_USER_LOGIN, "password": LOCKED_USER_PASSWORD}
     headers = {"Content-Type": "application/json"}
     print(f"\nТест: Попытка логина заблокированным пользователем: {LOCKED_USER_LOGIN}")
-    response = requests.post(login_url, json=payload, headers=headers, timeout=10)
+    response = anon_client.post(login_url, json=payload, headers=headers, timeout=10)
     # Mattermost обычно возвращает 401 для заблокированных аккаунтов, но может зависеть от конфигурации
     assert response.status_code == 401, f"Ожидался статус 401 для заблокированного аккаунта, получен {response.status_code}. Ответ: {response.text[:200]}"
     # Можно добавить проверку текста ошибки, если он стабилен
@@ -67,8 +80,46 @@ def test_authentication_server_connection_simulation():
     print("Получено ожидаемое исключение ConnectionError/Timeout при попытке соединения с недоступным сервером.")
 
 
+@pytest.mark.skipif(CASSETTE is not None and not CASSETTE.record, reason="Прокси нужен настоящий сервер, а не кассета")
+def test_authentication_stalled_server_times_out():
+    """
+    Сценарий: Сервер принял соединение, но ответ на логин завис (прокси с внесением сбоев).
+    Шаги:
+        1. Поднять прокси перед MATTERMOST_BASE_URL, задерживающий каждый ответ на 5 секунд.
+        2. Отправить POST /users/login через прокси с таймаутом 1 секунда. Логин несуществующего
+           пользователя: сервер не создает сессию, которую некому закрыть, и не проверяет пароль.
+    Ожидаемый результат: Исключение requests.exceptions.ReadTimeout примерно через 1 секунду, а не через 5.
+    """
+    payload = {"login_id": f"invalid_user_{uuid.uuid4().hex[:6]}", "password": "invalid_password"}
+    with FaultProxy(BASE_URL, FaultProfile("stall", stall_rate=1.0, stall=5.0)) as proxy:
+        print(f"\nТест: Логин через зависающий прокси {proxy.base_url}")
+        started = time.monotonic()
+        with pytest.raises(requests.exceptions.ReadTimeout):
+            requests.post(f"{proxy.base_url}/api/v4/users/login", json=payload, timeout=1)
+        elapsed = time.monotonic() - started
+    assert elapsed < 3, f"Таймаут сработал через {elapsed:.1f} с вместо ~1 с"
+    print(f"Получен ожидаемый ReadTimeout через {elapsed:.1f} с.")
+
+
+@pytest.mark.skipif(CASSETTE is not None and not CASSETTE.record, reason="Прокси нужен настоящий сервер, а не кассета")
+def test_authentication_connection_reset():
+    """
+    Сценарий: Соединение с сервером сбрасывается (RST) вместо ответа на логин.
+    Шаги:
+        1. Поднять прокси перед MATTERMOST_BASE_URL, сбрасывающий соединение вместо каждого ответа.
+        2. Отправить POST /users/login несуществующего пользователя через прокси (без сессии на сервере).
+    Ожидаемый результат: Исключение requests.exceptions.ConnectionError без ожидания таймаута.
+    """
+    payload = {"login_id": f"invalid_user_{uuid.uuid4().hex[:6]}", "password": "invalid_password"}
+    with FaultProxy(BASE_URL, FaultProfile("reset", reset_rate=1.0)) as proxy:
+        print(f"\nТест: Логин через прокси со сбросом соединения {proxy.base_url}")
+        with pytest.raises(requests.exceptions.ConnectionError):
+            requests.post(f"{proxy.base_url}/api/v4/users/login", json=payload, timeout=10)
+    print("Получено ожидаемое исключение ConnectionError при сбросе соединения.")
+
+
 @pytest.mark.skipif(not INACTIVE_USER_LOGIN or not INACTIVE_USER_PASSWORD, reason="Не заданы переменные окружения для неактивного пользователя (MATTERMOST_INACTIVE_USER_LOGIN/PASSWORD)")
-def test_authentication_inactive_account():
+def test_authentication_inactive_account(anon_client):
     """
     Сценарий: Попытаться войти с учетной записью, которая не была активирована.
     Предусловия: Существует неактивированный пользователь с данными из .env.
@@ -80,7 +131,7 @@ def test_authentication_inactive_account():
     payload = {"login_id": INACTIVE_USER_LOGIN, "password": INACTIVE_USER_PASSWORD}
     headers = {"Content-Type": "application/json"}
     print(f"\nТест: Попытка логина неактивным пользователем: {INACTIVE_USER_LOGIN}")
-    response = requests.post(login_url, json=payload, headers=headers, timeout=10)
+    response = anon_client.post(login_url, json=payload, headers=headers, timeout=10)
     assert response.status_code == 401, f"Ожидался статус 401 для неактивного аккаунта, получен {response.status_code}. Ответ: {response.text[:200]}"
     # Можно добавить проверку текста ошибки, если он стабилен
     # assert "account is not active" in response.json().get("message", "").lower(), "В ответе нет сообщения о неактивности"
@@ -1,23 +1,66 @@
-import requests
 import pytest
 import uuid
-from .conftest import BASE_URL, TEAM_ID
+from .conftest import BASE_URL, TEAM_ID, OTHER_USER_ID
+from .channel_pool import CHANNEL_NAME_PREFIX, DUPLICATE_CHANNEL_PREFIX, ChannelPool
+from .members import add_members, member_ids_among, remove_members
+from .parallel import worker_prefix
+from .sweeper import delete_channels, find_leaks
 
-def test_create_channel_success(headers, test_channel):
+def test_create_channel_success(api_client):
     """
     Сценарий: Проверка успешного создания нового канала.
-    Шаги: Фикстура test_channel создает канал.
-    Ожидаемый результат: Фикстура отрабатывает без ошибок, данные канала корректны.
-                       Фикстура также удаляет канал после теста.
+    Шаги:
+        1. Отправить POST запрос на /channels с уникальным именем (канал не из пула - создание проверяется напрямую).
+        2. Удалить созданный канал (cleanup).
+    Ожидаемый результат: Статус-код 201 Created, данные канала в ответе корректны.
+    """
+    channel_name = f"{worker_prefix(CHANNEL_NAME_PREFIX)}{uuid.uuid4().hex[:8]}"
+    payload = {"team_id": TEAM_ID, "name": channel_name, "display_name": f"Временный тестовый канал {channel_name}", "type": "O"}
+    created_channel_id = None
+    try:
+        response = api_client.post(f"{BASE_URL}/api/v4/channels", json=payload, timeout=10)
+        assert response.status_code == 201, f"Ожидался статус 201 при создании канала, получен {response.status_code}. Ответ: {response.text[:200]}"
+        channel = response.json()
+        created_channel_id = channel.get("id")
+        assert created_channel_id, "ID канала отсутствует в ответе"
+        assert channel.get("name") == channel_name, "Имя канала некорректно"
+        assert channel.get("team_id") == TEAM_ID, "ID команды в созданном канале не совпадает"
+        assert channel.get("type") == "O", "Тип канала не совпадает с запрошенным"
+        print(f"Тест успешного создания канала (ID: {created_channel_id}) пройден.")
+    finally:
+        if created_channel_id:
+            del_response = api_client.delete(f"{BASE_URL}/api/v4/channels/{created_channel_id}", timeout=10)
+            if del_response.status_code != 200:
+                print(f"Предупреждение: Не удалось удалить канал {created_channel_id}. Статус: {del_response.status_code}")
+
+
+@pytest.mark.skipif(not OTHER_USER_ID, reason="Не задана переменная окружения MATTERMOST_OTHER_USER_ID")
+def test_channel_pool_restores_baseline_members(api_client):
+    """
+    Сценарий: Пул каналов возвращает канал в исходный состав участников.
+    Шаги:
+        1. Взять канал из отдельного пула без заранее созданных каналов.
+        2. Удалить из канала исходного участника (создателя) и добавить OTHER_USER_ID.
+        3. Вернуть канал в пул и взять его снова.
+    Ожидаемый результат: Создатель снова в канале, OTHER_USER_ID в нем нет.
     """
-    assert test_channel is not None, "Данные канала не должны быть None"
-    assert "id" in test_channel, "ID канала отсутствует в ответе"
-    assert "name" in test_channel and "test-auto-" in test_channel["name"], "Имя канала некорректно"
-    assert test_channel.get("team_id") == TEAM_ID, "ID команды в созданном канале не совпадает"
-    print(f"Тест успешного создания канала (ID: {test_channel['id']}) пройден.")
+    pool = ChannelPool(api_client, BASE_URL, TEAM_ID, size=0, name_prefix=worker_prefix(CHANNEL_NAME_PREFIX),
+                       watched_user_ids=[OTHER_USER_ID])
+    try:
+        channel_id = pool.acquire()["id"]
+        me = api_client.get(f"{BASE_URL}/api/v4/users/me", timeout=10).json()["id"]
+        add_members(api_client, BASE_URL, channel_id, [OTHER_USER_ID])
+        remove_members(api_client, BASE_URL, channel_id, [me])
+
+        pool.release({"id": channel_id})
+        assert pool.acquire()["id"] == channel_id, "Пул выдал не возвращенный в него канал"
+        found = member_ids_among(api_client, BASE_URL, channel_id, [me, OTHER_USER_ID])
+        assert found == {me}, f"Состав участников после возврата в пул не исходный: {found}"
+    finally:
+        pool.close()
 
 
-def test_create_channel_duplicate_name(headers):
+def test_create_channel_duplicate_name(api_client):
     """
     Сценарий: Проверка обработки ошибок при создании канала с уже существующим именем.
     Шаги:
@@ -26,7 +69,7 @@ def test_create_channel_duplicate_name(headers):
         3. Удалить первый созданный канал (cleanup).
     Ожидаемый результат: Вторая попытка создания возвращает статус-код 400 Bad Request или 500 с ошибкой о дубликате.
     """
-    channel_name = f"duplicate-test-{uuid.uuid4().hex[:8]}"
+    channel_name = f"{worker_prefix(DUPLICATE_CHANNEL_PREFIX)}{uuid.uuid4().hex[:8]}"
     create_url = f"{BASE_URL}/api/v4/channels"
     payload = {
         "team_id": TEAM_ID,
@@ -39,7 +82,7 @@ def test_create_channel_duplicate_name(headers):
     try:
         # 1. Первое создание
         print(f"\nТест дубликата: Создание первого канала {channel_name}")
-        response1 = requests.post(create_url, headers=headers, json=payload, timeout=10)
+        response1 = api_client.post(create_url, json=payload, timeout=10)
         response1.raise_for_status() # Убедимся, что первый создался
         assert response1.status_code == 201, f"Первое создание канала не удалось: {response1.status_code}, {response1.text[:200]}"
         created_channel_id = response1.json()['id']
@@ -47,7 +90,7 @@ def test_create_channel_duplicate_name(headers):
 
         # 2. Второе создание с тем же именем
         print(f"Тест дубликата: Попытка создания второго канала с именем {channel_name}")
-        response2 = requests.post(create_url, headers=headers, json=payload, timeout=10)
+        response2 = api_client.post(create_url, json=payload, timeout=10)
         # Ожидаем ошибку клиента (400) или иногда сервер может вернуть 500 при такой ошибке
         assert response2.status_code in [400, 500], f"Ожидался статус 400 или 500 при создании дубликата, получен {response2.status_code}. Ответ: {response2.text[:200]}"
         # Проверяем текст ошибки (может меняться в разных версиях Mattermost)
@@ -63,8 +106,34 @@ def test_create_channel_duplicate_name(headers):
         if created_channel_id:
             delete_url = f"{BASE_URL}/api/v4/channels/{created_channel_id}"
             print(f"Тест дубликата: Удаление канала {created_channel_id}")
-            del_response = requests.delete(delete_url, headers=headers, timeout=10)
+            del_response = api_client.delete(delete_url, timeout=10)
             if del_response.status_code == 200:
                  print(f"Канал {created_channel_id} успешно удален.")
             else:
-                 print(f"Предупреждение: Не удалось удалить канал {created_channel_id} после теста дубликата. Статус: {del_response.status_code}")
\ No newline at end of file
+                 print(f"Предупреждение: Не удалось удалить канал {created_channel_id} после теста дубликата. Статус: {del_response.status_code}")
+
+
+def test_sweeper_removes_leaked_channels(api_client):
+    """
+    Сценарий: Уборка каналов, оставленных прерванным прогоном (python -m tests.sweeper).
+    Шаги:
+        1. Создать несколько каналов с уникальным префиксом и не удалять их, как при убитом прогоне.
+        2. Найти каналы команды по префиксу и удалить их параллельно.
+        3. Повторить поиск.
+    Ожидаемый результат: Находятся ровно созданные каналы, все удаляются, повторный поиск пуст.
+    """
+    prefix = f"{worker_prefix(DUPLICATE_CHANNEL_PREFIX)}sweep-{uuid.uuid4().hex[:8]}-"
+    created_ids = set()
+    for index in range(3):
+        response = api_client.post(f"{BASE_URL}/api/v4/channels", json={
+            "team_id": TEAM_ID, "name": f"{prefix}{index}", "display_name": f"Брошенный канал {prefix}{index}", "type": "O"
+        }, timeout=10)
+        assert response.status_code == 201, f"Не удалось создать канал: {response.status_code}, {response.text[:200]}"
+        created_ids.add(response.json()["id"])
+
+    leaks = find_leaks(api_client, BASE_URL, [TEAM_ID], prefixes=(prefix,))
+    assert {channel["id"] for channel in leaks} == created_ids, "Уборка нашла не те каналы, что были оставлены"
+
+    result = delete_channels(api_client, BASE_URL, leaks, workers=3)
+    assert result["deleted"] == len(created_ids) and not result["failed"], f"Не все каналы удалены: {result}"
+    assert find_leaks(api_client, BASE_URL, [TEAM_ID], prefixes=(prefix,)) == [], "После уборки остались тестовые каналы"
@@ -0,0 +1,32 @@
+import pytest
+from .conftest import BASE_URL, CASSETTE
+
+
+def test_connection_pool_reuses_connections(api_client):
+    """
+    Сценарий: Проверка, что общий HTTP-клиент переиспользует keep-alive соединения.
+    Шаги:
+        1. Запомнить счетчики соединений клиента.
+        2. Последовательно отправить несколько GET запросов на /users/me.
+    Ожидаемый результат: Все запросы успешны, новых соединений открыто не больше одного.
+    """
+    if CASSETTE is not None and not CASSETTE.record:
+        pytest.skip("При воспроизведении кассеты запросы не доходят до сети")
+    me_url = f"{BASE_URL}/api/v4/users/me"
+    requests_count = 5
+    before = api_client.connection_stats.as_dict()
+    retries_before = api_client.limiter.stats.retries if api_client.limiter else 0
+
+    print(f"\nТест: {requests_count} последовательных запросов через общий пул соединений")
+    for _ in range(requests_count):
+        response = api_client.get(me_url, timeout=10)
+        assert response.status_code == 200, f"Ожидался статус 200 для /users/me, получен {response.status_code}. Ответ: {response.text[:200]}"
+
+    after = api_client.connection_stats.as_dict()
+    opened = after["opened"] - before["opened"]
+    # Повторы после 429 (ограничение частоты) - тоже запросы через клиент
+    retries = (api_client.limiter.stats.retries if api_client.limiter else 0) - retries_before
+    sent = after["requests"] - before["requests"] - retries
+    assert sent == requests_count, f"Ожидалось {requests_count} запросов через клиент, учтено {sent}"
+    assert opened <= 1, f"Ожидалось не более одного нового соединения, открыто {opened} на {sent} запросов"
+    print(f"Открыто соединений: {opened}, переиспользовано: {sent - opened}.")
@@ -1,10 +1,12 @@
-import requests
 import pytest
-import time
 import uuid
-from .conftest import BASE_URL
+from itertools import islice
+from .conftest import BASE_URL, CASSETTE
+from .delivery import WebSocketReceiver
+from .post_reader import iter_history_pages, iter_new_pages, iter_posts
+from .waits import wait_for_post
 
-def test_send_message_success(headers, test_channel):
+def test_send_message_success(api_client, test_channel):
     """
     Сценарий: Проверка отправки сообщения в чат/канал.
     Шаги:
@@ -20,7 +22,7 @@ def test_send_message_success(headers, test_channel):
         "message": message_text
     }
     print(f"\nТест: Отправка сообщения в канал {channel_id}")
-    response = requests.post(post_url, headers=headers, json=payload, timeout=10)
+    response = api_client.post(post_url, json=payload, timeout=10)
     response.raise_for_status() # Проверка на HTTP ошибки
     assert response.status_code == 201, f"Ожидался статус 201 при отправке сообщения, получен {response.status_code}. Ответ: {response.text[:200]}"
 
@@ -31,37 +33,31 @@ def test_send_message_success(headers, test_channel):
     print(f"Сообщение (ID: {post_data['id']}) успешно отправлено.")
 
 
-def test_receive_messages_success(headers, test_channel):
+def test_receive_messages_success(api_client, test_channel, channel_pool):
     """
     Сценарий: Проверка получения сообщений из чат/канала.
     Шаги:
         1. Получить ID канала из фикстуры test_channel.
         2. Отправить тестовое сообщение в этот канал.
-        3. Подождать немного.
-        4. Отправить GET запрос на /channels/{channel_id}/posts.
+        3. Опрашивать GET /channels/{channel_id}/posts (начиная с водяного знака канала), пока сообщение не появится.
     Ожидаемый результат: Статус-код 200 OK, в ответе содержится список постов, включая отправленное сообщение.
     """
     channel_id = test_channel['id']
     post_url = f"{BASE_URL}/api/v4/posts"
-    get_posts_url = f"{BASE_URL}/api/v4/channels/{channel_id}/posts"
 
     # 2. Отправляем сообщение
     message_text = f"Сообщение для проверки получения {uuid.uuid4().hex[:8]}"
     payload = {"channel_id": channel_id, "message": message_text}
     print(f"\nТест: Отправка сообщения для проверки получения в канал {channel_id}")
-    send_response = requests.post(post_url, headers=headers, json=payload, timeout=10)
+    send_response = api_client.post(post_url, json=payload, timeout=10)
     send_response.raise_for_status()
     assert send_response.status_code == 201, "Не удалось отправить сообщение для теста получения"
     sent_post_id = send_response.json()['id']
     print(f"Сообщение для получения (ID: {sent_post_id}) отправлено.")
 
-    # 3. Ждем немного, чтобы сообщение точно обработалось сервером
-    time.sleep(2)
-
-    # 4. Получаем сообщения
+    # 3. Получаем сообщения, пока отправленное не появится в выдаче
     print(f"Тест: Получение сообщений из канала {channel_id}")
-    response = requests.get(get_posts_url, headers=headers, timeout=10)
-    response.raise_for_status()
+    response = wait_for_post(api_client, BASE_URL, channel_id, sent_post_id, since=channel_pool.watermark(channel_id))
     assert response.status_code == 200, f"Ожидался статус 200 при получении сообщений, получен {response.status_code}. Ответ: {response.text[:200]}"
 
     posts_data = response.json()
@@ -72,4 +68,71 @@ def test_receive_messages_success(headers, test_channel):
     received_post = posts_data.get("posts", {}).get(sent_post_id)
     assert received_post is not None, f"Отправленное сообщение (ID: {sent_post_id}) не найдено в списке полученных"
     assert received_post.get("message") == message_text, "Текст полученного сообщения не совпадает с отправленным"
-    print(f"Отправленное сообщение (ID: {sent_post_id}) успешно найдено в канале.")
\ No newline at end of file
+    print(f"Отправленное сообщение (ID: {sent_post_id}) успешно найдено в канале.")
+
+
+def test_read_history_by_pages(api_client, test_channel):
+    """
+    Сценарий: Проверка постраничного чтения истории канала курсорами before и after.
+    Шаги:
+        1. Отправить в канал из фикстуры test_channel несколько сообщений.
+        2. Прочитать историю от новых к старым страницами по 2 поста (курсор before).
+        3. Прочитать посты новее первого отправленного (курсор after).
+    Ожидаемый результат: Сообщения получены без пропусков и повторов в порядке чтения.
+    """
+    channel_id = test_channel['id']
+    post_url = f"{BASE_URL}/api/v4/posts"
+    sent_ids = []
+    print(f"\nТест: Отправка 5 сообщений в канал {channel_id} для чтения истории")
+    for index in range(5):
+        response = api_client.post(post_url, json={"channel_id": channel_id, "message": f"История {index}"}, timeout=10)
+        response.raise_for_status()
+        sent_ids.append(response.json()['id'])
+
+    history = [post['id'] for post in islice(iter_posts(iter_history_pages(api_client, BASE_URL, channel_id, per_page=2)), 5)]
+    assert history == sent_ids[::-1], f"История от новых к старым не совпадает с отправленными сообщениями: {history}"
+
+    newer = [post['id'] for post in iter_posts(iter_new_pages(api_client, BASE_URL, channel_id, after=sent_ids[0], per_page=2))]
+    assert newer == sent_ids[1:], f"Посты после первого сообщения не совпадают с отправленными: {newer}"
+    print("История канала прочитана страницами без пропусков и повторов.")
+
+
+def test_read_large_channel_history(api_client, seeded_dataset):
+    """
+    Сценарий: Проверка чтения полной истории большого канала из засеянного набора данных.
+    Шаги:
+        1. Выбрать в наборе канал примерно с 1000 постов.
+        2. Прочитать всю историю канала страницами по 200 постов.
+    Ожидаемый результат: Прочитано не меньше постов, чем засеяно в канал, без повторов.
+    """
+    channel = seeded_dataset.channel_with_posts(1000)
+    channel_id = seeded_dataset.channel_id(channel, api_client, BASE_URL)
+    print(f"\nТест: Чтение истории канала {channel['name']} ({channel['posts']} постов в наборе)")
+    post_ids = [post['id'] for post in iter_posts(iter_history_pages(api_client, BASE_URL, channel_id, per_page=200))]
+    assert len(post_ids) == len(set(post_ids)), "В истории канала есть повторяющиеся посты"
+    assert len(post_ids) >= channel['posts'], f"Прочитано {len(post_ids)} постов, в наборе {channel['posts']}"
+    print(f"Прочитано {len(post_ids)} постов канала {channel['name']}.")
+
+
+def test_message_delivered_via_websocket(api_client, auth_token, test_channel):
+    """
+    Сценарий: Проверка доставки нового сообщения подписчику WebSocket API.
+    Шаги:
+        1. Подключиться к /api/v4/websocket с токеном основного пользователя и дождаться события hello.
+        2. Отправить сообщение в канал test_channel.
+        3. Дождаться события posted с идентификатором отправленного поста.
+    Ожидаемый результат: Событие posted приходит не позже чем через 10 секунд после отправки.
+    """
+    if CASSETTE is not None and not CASSETTE.record:
+        pytest.skip("Кассета не записывает WebSocket-соединения")
+    receiver = WebSocketReceiver(BASE_URL, auth_token, name="test").connect()
+    try:
+        print(f"\nТест: Доставка сообщения через WebSocket в канал {test_channel['id']}")
+        response = api_client.post(f"{BASE_URL}/api/v4/posts", json={"channel_id": test_channel['id'],
+                                   "message": f"Проверка доставки {uuid.uuid4().hex[:8]}"}, timeout=10)
+        assert response.status_code == 201, f"Ожидался статус 201 при отправке сообщения, получен {response.status_code}. Ответ: {response.text[:200]}"
+        post_id = response.json()["id"]
+        assert receiver.wait_for(post_id, timeout=10) is not None, f"Событие posted для поста {post_id} не пришло за 10 секунд"
+    finally:
+        receiver.close()
+    print(f"Сообщение {post_id} доставлено через WebSocket.")
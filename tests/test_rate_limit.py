@@ -0,0 +1,154 @@
+import email.utils
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+import pytest
+import requests
+from . import rate_limit
+from .api_client import ApiClient
+from .fake_server import FakeServer
+from .metrics import MetricsRecorder
+from .rate_limit import AdaptiveLimiter, BACKOFF_BASE, BACKOFF_MAX, RATE_DECREASE_FACTOR, RATE_GROWTH, retry_delay
+
+
+def _response(status, **headers):
+    """Ответ requests с заданным статусом и заголовками (имена через подчеркивание: Retry_After)."""
+    response = requests.Response()
+    response.status_code = status
+    response.headers.update({name.replace("_", "-"): str(value) for name, value in headers.items()})
+    return response
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Ручные часы ограничителя: clock.now сдвигается тестом, реальное время не идет."""
+    state = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(rate_limit, "time", SimpleNamespace(monotonic=lambda: state.now, time=time.time))
+    return state
+
+
+def test_retry_delay_sources():
+    """
+    Сценарий: Проверка выбора паузы перед повтором запроса, получившего 429.
+    Шаги:
+        1. Retry-After в секундах и в виде HTTP-даты.
+        2. Без Retry-After - X-RateLimit-Reset.
+        3. Без заголовков - экспоненциальная пауза с ограничением сверху.
+    Ожидаемый результат: Retry-After важнее X-RateLimit-Reset, без заголовков пауза 0.5, 1, 2, ... не больше BACKOFF_MAX.
+    """
+    assert retry_delay(_response(429, Retry_After=3, X_RateLimit_Reset=7), 0) == 3
+    http_date = email.utils.formatdate(time.time() + 60, usegmt=True)
+    assert 55 < retry_delay(_response(429, Retry_After=http_date), 0) <= 60
+    assert retry_delay(_response(429, X_RateLimit_Reset=7), 0) == 7
+    assert [retry_delay(_response(429), attempt) for attempt in range(3)] == [BACKOFF_BASE, BACKOFF_BASE * 2, BACKOFF_BASE * 4]
+    assert retry_delay(_response(429), 20) == BACKOFF_MAX
+
+
+def test_window_halves_once_per_generation_and_grows_by_inverse(clock):
+    """
+    Сценарий: Проверка арифметики окна одновременных запросов.
+    Шаги:
+        1. Два запроса одного поколения получают 429.
+        2. Запросы нового поколения получают успешные ответы со свободной квотой, затем с квотой на исходе.
+    Ожидаемый результат: Окно уменьшается вдвое один раз на поколение, растет на 1/окно за успешный ответ
+    и не растет, пока X-RateLimit-Remaining не больше числа запросов в полете.
+    """
+    limiter = AdaptiveLimiter(8)
+    first, second = limiter.acquire(), limiter.acquire()
+    throttled = _response(429, X_RateLimit_Limit=10, X_RateLimit_Remaining=0, X_RateLimit_Reset=1)
+    assert limiter.release(first, throttled, 0) == 0.0, "Первый 429 запроса должен повторяться без задержки"
+    assert limiter.release(second, throttled, 0) == 0.0
+    assert limiter.window == 4, "Окно должно уменьшиться вдвое один раз на поколение"
+
+    def acquire():
+        # После 429 запросы идут по частоте: часы сдвигаются, чтобы acquire() не ждал
+        clock.now += 1.0
+        return limiter.acquire()
+
+    for _ in range(4):
+        limiter.release(acquire(), _response(200, X_RateLimit_Limit=10, X_RateLimit_Remaining=5), 0)
+    assert limiter.window == 4, "Окно 4 растет на 1/4 за успешный ответ и за 4 ответа не достигает 5"
+    limiter.release(acquire(), _response(200, X_RateLimit_Limit=10, X_RateLimit_Remaining=5), 0)
+    assert limiter.window == 5
+    window = limiter._window
+    held = acquire()
+    limiter.release(acquire(), _response(200, X_RateLimit_Limit=10, X_RateLimit_Remaining=1), 0)
+    assert limiter._window == window, "При X-RateLimit-Remaining не больше запросов в полете окно не растет"
+    limiter.release(held, None, 0)
+    assert limiter.stats.as_dict()["min_limit"] == 4
+
+
+def test_rate_estimated_from_accepted_responses(clock):
+    """
+    Сценарий: Проверка оценки частоты сервера по успешным ответам до 429.
+    Шаги:
+        1. Ответ при полной квоте начинает оценку, еще 20 успешных ответов и 429 через секунду.
+        2. Еще 11 успешных ответов и 429 через 1.2 секунды.
+        3. Успешный ответ с половиной свободной квоты через секунду.
+        4. Повторный 429 того же запроса и 429 после исчерпания повторов.
+    Ожидаемый результат: Частота - 0.9 от (ответов + 1) с начала оценки в секунду и не растет после 429,
+    а растет пропорционально свободной квоте; повторный 429 ждет 2 интервала между запросами,
+    после max_retries запрос отдается с 429.
+    """
+    limiter = AdaptiveLimiter(8, max_retries=2)
+    assert limiter.rate is None, "До первого 429 частота не ограничена"
+
+    def release(status, remaining, **headers):
+        limiter.release(limiter.acquire(), _response(status, X_RateLimit_Limit=10, X_RateLimit_Remaining=remaining, **headers), 0)
+
+    release(200, 9)
+    for _ in range(20):
+        release(200, 3)
+    clock.now += 1.0
+    release(429, 0, X_RateLimit_Reset=5, Retry_After=1)
+    # Запас квоты 9 запросов: сервер восстановил 20 - 9 = 11 за секунду, оценка сверху - 12
+    assert limiter.rate == pytest.approx(12 * RATE_DECREASE_FACTOR)
+
+    for _ in range(11):
+        clock.now += 0.1
+        release(200, 0)
+    clock.now += 0.1
+    rate = limiter.rate
+    release(429, 0, X_RateLimit_Reset=5, Retry_After=1)
+    assert limiter.rate == pytest.approx(min(rate, (22 + 1) / 2.2) * RATE_DECREASE_FACTOR)
+
+    rate = limiter.rate
+    clock.now += 1.0
+    release(200, 5)
+    assert limiter.rate == pytest.approx(rate * (1 + RATE_GROWTH * 0.5))
+
+    throttled = _response(429, X_RateLimit_Limit=10, X_RateLimit_Remaining=0, X_RateLimit_Reset=5, Retry_After=2)
+    clock.now += 1.0
+    delay = limiter.release(limiter.acquire(), throttled, 1)
+    assert delay == pytest.approx(2 / limiter.rate), "Повторный 429 запроса ждет 2 интервала между запросами"
+    clock.now += 2.0
+    assert limiter.release(limiter.acquire(), throttled, 2) is None, "После max_retries запрос отдается с 429"
+    assert limiter.stats.as_dict()["gave_up"] == 1
+
+
+def test_throttled_client_keeps_up_with_server_rate():
+    """
+    Сценарий: Проверка клиента с ограничителем против сервера с ограничением частоты.
+    Шаги:
+        1. Запустить фейковый сервер с квотой 40 запросов в секунду (запас 4).
+        2. Отправить 4 потоками 120 запросов GET /system/ping клиентом с AdaptiveLimiter и MetricsRecorder.
+    Ожидаемый результат: Все запросы успешны, частота близка к квоте сервера, а повторенные 429 учтены
+    в сводке как сдерживание, а не как ошибки.
+    """
+    recorder = MetricsRecorder()
+    limiter = AdaptiveLimiter(4)
+    with FakeServer(rate_limit=40, rate_burst=4) as server:
+        client = ApiClient(recorder=recorder, limiter=limiter)
+        try:
+            started = time.monotonic()
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                statuses = list(executor.map(lambda _: client.get(f"{server.base_url}/api/v4/system/ping").status_code, range(120)))
+            elapsed = time.monotonic() - started
+        finally:
+            client.close()
+    assert statuses == [200] * 120, f"Не все запросы успешны: {sorted(set(statuses))}"
+    stats = recorder.summary()["GET /api/v4/system/ping"]
+    throttling = limiter.stats.as_dict()
+    assert stats["count"] == 120 and stats["errors"] == 0, f"Повторенные 429 не должны считаться ошибками: {stats}"
+    assert stats["throttled"] == throttling["throttled"] > 0, f"Сервер должен был ответить 429: {throttling}"
+    assert 120 / elapsed > 40 * 0.6, f"Частота {120 / elapsed:.1f} запросов/с слишком далека от квоты 40"
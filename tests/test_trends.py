@@ -0,0 +1,98 @@
+import pytest
+from .results_store import ResultsStore
+from .trends import build_trends, find_outliers, load_runs
+
+
+def _run(run_id, value, base_url="http://mm.example.com", workers=1, version="9.11.0"):
+    """Прогон в формате load_runs с одним маршрутом и одним запросом длительностью value."""
+    return {"run": run_id, "started": run_id, "version": version, "base_url": base_url, "workers": workers,
+            "finished": True, "tests": {}, "routes": {"GET /api/v4/users/me": [value]}}
+
+
+def test_outlier_in_noisy_series():
+    """
+    Сценарий: Проверка поиска выбросов в ряду с небольшим шумом.
+    Шаги:
+        1. Ряд из 12 значений около 100 мс с одним всплеском до 200 мс.
+    Ожидаемый результат: Выбросом отмечен только всплеск, медиана окна - около 100 мс.
+    """
+    values = [0.100, 0.102, 0.098, 0.101, 0.099, 0.103, 0.100, 0.200, 0.101, 0.099, 0.102, 0.100]
+    outliers = find_outliers(values)
+    assert [index for index, _ in outliers] == [7], f"Ожидался один выброс на всплеске: {outliers}"
+    assert outliers[0][1] == pytest.approx(0.1)
+
+
+def test_flat_series_with_zero_mad():
+    """
+    Сценарий: Проверка ряда из одинаковых значений (MAD = 0).
+    Шаги:
+        1. Постоянный ряд 100 мс, затем значения на 5% и на 50% выше.
+        2. Всплеск в первых MIN_HISTORY значениях.
+    Ожидаемый результат: При MAD = 0 выбросом считается любое отклонение больше --min-change и --min-delta-ms:
+    +50% - выброс, +5% - нет; первые значения не проверяются - сравнивать их не с чем.
+    """
+    assert find_outliers([0.1] * 8 + [0.105]) == []
+    assert find_outliers([0.1] * 8 + [0.15]) == [(8, 0.1)]
+    assert find_outliers([0.1, 0.1, 0.5, 0.1, 0.1]) == []
+
+
+def test_min_change_and_min_delta_gate_outliers():
+    """
+    Сценарий: Проверка порогов --min-change и --min-delta-ms.
+    Шаги:
+        1. Ряд миллисекундного маршрута (1 мс), затем 1.8 мс.
+        2. Тот же ряд с min_delta 0.5 мс и с min_change 1.0.
+    Ожидаемый результат: Рост на 0.8 мс меньше порога по умолчанию в 1 мс и не выброс; при min_delta 0.5 мс -
+    выброс, а min_change 1.0 (вдвое) снова его отсекает.
+    """
+    values = [0.001] * 6 + [0.0018]
+    assert find_outliers(values) == []
+    assert [index for index, _ in find_outliers(values, min_delta=0.0005)] == [6]
+    assert find_outliers(values, min_delta=0.0005, min_change=1.0) == []
+
+
+def test_environments_do_not_share_baseline():
+    """
+    Сценарий: Проверка раздельных трендов для разных серверов и числа воркеров.
+    Шаги:
+        1. Чередовать прогоны против настоящего сервера (100 мс) и фейкового под xdist (2 мс).
+        2. Последний прогон настоящего сервера - 300 мс.
+    Ожидаемый результат: По строке тренда на каждую пару (base_url, workers) с собственной медианой;
+    выброс в последнем прогоне только у настоящего сервера, фейковый ряд без выбросов.
+    """
+    runs = []
+    for index in range(8):
+        runs.append(_run(f"{index:02d}a", 0.3 if index == 7 else 0.1))
+        runs.append(_run(f"{index:02d}b", 0.002, base_url="http://127.0.0.1:8065", workers=3))
+    rows = {(row["base_url"], row["workers"]): row for row in build_trends(runs)}
+    assert set(rows) == {("http://mm.example.com", 1), ("http://127.0.0.1:8065", 3)}
+    real, fake = rows["http://mm.example.com", 1], rows["http://127.0.0.1:8065", 3]
+    assert real["runs"] == fake["runs"] == 8
+    assert real["baseline"] == pytest.approx(0.1) and fake["baseline"] == pytest.approx(0.002)
+    assert real["last_outlier"] and [outlier["run"] for outlier in real["outliers"]] == ["07a"]
+    assert fake["outliers"] == [] and not fake["last_outlier"]
+
+
+def test_load_runs_keeps_interrupted_run(tmp_path):
+    """
+    Сценарий: Проверка чтения хранилища с прерванным прогоном.
+    Шаги:
+        1. Записать в хранилище завершенный прогон и прогон без записи run_end.
+    Ожидаемый результат: Оба прогона прочитаны по порядку начала, с сервером и числом воркеров;
+    прерванный отмечен незавершенным, но его тесты и запросы на месте.
+    """
+    store = ResultsStore(str(tmp_path / "results.jsonl"))
+    requests = {"GET /api/v4/users/me": {"durations": [0.01, 0.02], "errors": 0}}
+    for run_id, started in (("r2", "2026-10-17T10:00:00+00:00"), ("r1", "2026-10-17T09:00:00+00:00")):
+        store.append({"type": "run", "run": run_id, "started": started, "version": "9.11.0",
+                      "base_url": "http://mm.example.com", "workers": 2})
+        store.append({"type": "test", "run": run_id, "test": "tests/test_users.py::test_me", "outcome": "passed",
+                      "duration": 0.05, "requests": requests})
+    store.append({"type": "run_end", "run": "r1", "finished": "2026-10-17T09:01:00+00:00", "duration": 60.0, "exitstatus": 0})
+    runs = load_runs(store.path)
+    assert [run["run"] for run in runs] == ["r1", "r2"]
+    assert [run["finished"] for run in runs] == [True, False]
+    interrupted = runs[1]
+    assert (interrupted["base_url"], interrupted["workers"]) == ("http://mm.example.com", 2)
+    assert interrupted["routes"] == {"GET /api/v4/users/me": [0.01, 0.02]}
+    assert interrupted["tests"]["tests/test_users.py::test_me"]["outcome"] == "passed"
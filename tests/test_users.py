@@ -1,16 +1,16 @@
-import requests
 import pytest
-import time
-from .conftest import BASE_URL, OTHER_USER_ID
+from .conftest import BASE_URL, TEAM_ID, OTHER_USER_ID
+from .members import add_members, is_member, member_ids_among, remove_members, team_user_ids
+from .waits import wait_for_membership
 
 # Пропускаем все тесты в этом файле, если ID другого пользователя не задан
 pytestmark = pytest.mark.skipif(not OTHER_USER_ID, reason="Не задана переменная окружения MATTERMOST_OTHER_USER_ID для тестов управления пользователями")
 
-def _ensure_user_not_in_channel(headers, channel_id, user_id):
+def _ensure_user_not_in_channel(api_client, channel_id, user_id):
     """Вспомогательная функция: удаляет пользователя из канала, если он там есть."""
     delete_user_url = f"{BASE_URL}/api/v4/channels/{channel_id}/members/{user_id}"
     print(f"Проверка/удаление пользователя {user_id} из канала {channel_id} перед тестом.")
-    response = requests.delete(delete_user_url, headers=headers, timeout=10)
+    response = api_client.delete(delete_user_url, timeout=10)
     if response.status_code == 200:
         print(f"Пользователь {user_id} удален из канала {channel_id}.")
     elif response.status_code == 404 or (response.status_code == 403 and "manage_channel_members" in response.text):
@@ -18,14 +18,15 @@ def _ensure_user_not_in_channel(headers, channel_id, user_id):
          print(f"Пользователь {user_id} не найден в канале {channel_id} или нет прав на удаление (статус {response.status_code}).")
     else:
         print(f"Предупреждение: Не удалось проверить/удалить пользователя {user_id} из канала {channel_id} перед тестом. Статус: {response.status_code}")
-    time.sleep(1) # Небольшая пауза после удаления
+    # Ждем, пока сервер подтвердит отсутствие пользователя в канале
+    wait_for_membership(api_client, BASE_URL, channel_id, user_id, present=False)
 
-def _ensure_user_in_channel(headers, channel_id, user_id):
+def _ensure_user_in_channel(api_client, channel_id, user_id):
     """Вспомогательная функция: добавляет пользователя в канал, если его там нет."""
     add_user_url = f"{BASE_URL}/api/v4/channels/{channel_id}/members"
     payload = {"user_id": user_id}
     print(f"Проверка/добавление пользователя {user_id} в канал {channel_id} перед тестом.")
-    response = requests.post(add_user_url, headers=headers, json=payload, timeout=10)
+    response = api_client.post(add_user_url, json=payload, timeout=10)
     if response.status_code == 201:
         print(f"Пользователь {user_id} добавлен в канал {channel_id}.")
     elif response.status_code == 400 and "already a member" in response.text.lower():
@@ -33,40 +34,37 @@ def _ensure_user_in_channel(headers, channel_id, user_id):
     elif response.status_code == 403:
          pytest.fail(f"Ошибка прав доступа: не удалось добавить пользователя {user_id} в канал {channel_id}. Проверьте права основного пользователя.", pytrace=False)
     else:
-        # Пробуем получить список участников, чтобы убедиться, что он там
-        get_members_url = f"{BASE_URL}/api/v4/channels/{channel_id}/members"
-        get_resp = requests.get(get_members_url, headers=headers, timeout=10)
-        if get_resp.status_code == 200:
-             members = get_resp.json()
-             if any(member['user_id'] == user_id for member in members):
-                 print(f"Пользователь {user_id} уже был в канале {channel_id} (проверено через список).")
-                 return # Все ок, он там
+        # Проверяем членство точечным запросом, не выгружая список участников
+        if is_member(api_client, BASE_URL, channel_id, user_id):
+            print(f"Пользователь {user_id} уже был в канале {channel_id} (проверено запросом участника).")
+            return # Все ок, он там
         # Если не удалось добавить и не удалось подтвердить наличие - ошибка
         pytest.fail(f"Не удалось добавить пользователя {user_id} в канал {channel_id}. Статус: {response.status_code}, Ответ: {response.text[:200]}", pytrace=False)
-    time.sleep(1) # Небольшая пауза после добавления
+    # Ждем, пока сервер подтвердит членство пользователя в канале
+    wait_for_membership(api_client, BASE_URL, channel_id, user_id, present=True)
 
 
-def test_add_user_to_channel_success(headers, test_channel):
+def test_add_user_to_channel_success(api_client, test_channel):
     """
     Сценарий: Проверка добавления пользователя в чат/канал.
     Шаги:
         1. Получить ID канала из фикстуры test_channel.
         2. Убедиться, что пользователя OTHER_USER_ID нет в канале (удалить, если есть).
         3. Отправить POST запрос на /channels/{channel_id}/members с user_id=OTHER_USER_ID.
-        4. (Опционально) Проверить список участников канала.
+        4. Проверить членство пользователя запросом GET /channels/{channel_id}/members/{user_id}.
     Ожидаемый результат: Статус-код 201 Created, пользователь добавлен в канал.
     """
     channel_id = test_channel['id']
     user_to_add = OTHER_USER_ID
 
     # 2. Убедиться, что пользователя нет
-    _ensure_user_not_in_channel(headers, channel_id, user_to_add)
+    _ensure_user_not_in_channel(api_client, channel_id, user_to_add)
 
     # 3. Добавляем пользователя
     add_user_url = f"{BASE_URL}/api/v4/channels/{channel_id}/members"
     payload = {"user_id": user_to_add}
     print(f"\nТест: Добавление пользователя {user_to_add} в канал {channel_id}")
-    response = requests.post(add_user_url, headers=headers, json=payload, timeout=10)
+    response = api_client.post(add_user_url, json=payload, timeout=10)
     response.raise_for_status()
     assert response.status_code == 201, f"Ожидался статус 201 при добавлении пользователя, получен {response.status_code}. Ответ: {response.text[:200]}"
 
@@ -75,35 +73,31 @@ def test_add_user_to_channel_success(headers, test_channel):
     assert member_data.get("channel_id") == channel_id, "ID канала в ответе не совпадает"
     print(f"Пользователь {user_to_add} успешно добавлен в канал {channel_id}.")
 
-    # 4. Проверка списка участников (опционально, но полезно)
-    get_members_url = f"{BASE_URL}/api/v4/channels/{channel_id}/members"
-    get_response = requests.get(get_members_url, headers=headers, timeout=10)
-    assert get_response.status_code == 200, "Не удалось получить список участников для проверки"
-    members = get_response.json()
-    assert any(member['user_id'] == user_to_add for member in members), f"Пользователь {user_to_add} не найден в списке участников после добавления"
-    print(f"Пользователь {user_to_add} подтвержден в списке участников канала {channel_id}.")
+    # 4. Проверка членства одним запросом (не зависит от числа участников канала)
+    assert is_member(api_client, BASE_URL, channel_id, user_to_add), f"Пользователь {user_to_add} не найден среди участников после добавления"
+    print(f"Пользователь {user_to_add} подтвержден среди участников канала {channel_id}.")
 
 
-def test_remove_user_from_channel_success(headers, test_channel):
+def test_remove_user_from_channel_success(api_client, test_channel):
     """
     Сценарий: Проверка удаления пользователя из чата/канала.
     Шаги:
         1. Получить ID канала из фикстуры test_channel.
         2. Убедиться, что пользователь OTHER_USER_ID есть в канале (добавить, если нет).
         3. Отправить DELETE запрос на /channels/{channel_id}/members/{user_id} с user_id=OTHER_USER_ID.
-        4. (Опционально) Проверить список участников канала.
+        4. Проверить отсутствие пользователя запросом GET /channels/{channel_id}/members/{user_id}.
     Ожидаемый результат: Статус-код 200 OK, пользователь удален из канала.
     """
     channel_id = test_channel['id']
     user_to_remove = OTHER_USER_ID
 
     # 2. Убедиться, что пользователь есть в канале
-    _ensure_user_in_channel(headers, channel_id, user_to_remove)
+    _ensure_user_in_channel(api_client, channel_id, user_to_remove)
 
     # 3. Удаляем пользователя
     delete_user_url = f"{BASE_URL}/api/v4/channels/{channel_id}/members/{user_to_remove}"
     print(f"\nТест: Удаление пользователя {user_to_remove} из канала {channel_id}")
-    response = requests.delete(delete_user_url, headers=headers, timeout=10)
+    response = api_client.delete(delete_user_url, timeout=10)
     response.raise_for_status()
     assert response.status_code == 200, f"Ожидался статус 200 при удалении пользователя, получен {response.status_code}. Ответ: {response.text[:200]}"
 
@@ -112,10 +106,35 @@ def test_remove_user_from_channel_success(headers, test_channel):
     assert result is not None, "Ответ при удалении пользователя не должен быть пустым (если ожидается JSON)"
     print(f"Пользователь {user_to_remove} успешно удален из канала {channel_id}.")
 
-    # 4. Проверка списка участников (опционально)
-    get_members_url = f"{BASE_URL}/api/v4/channels/{channel_id}/members"
-    get_response = requests.get(get_members_url, headers=headers, timeout=10)
-    assert get_response.status_code == 200, "Не удалось получить список участников для проверки после удаления"
-    members = get_response.json()
-    assert not any(member['user_id'] == user_to_remove for member in members), f"Пользователь {user_to_remove} все еще найден в списке участников после удаления"
-    print(f"Пользователь {user_to_remove} не найден в списке участников канала {channel_id} (как и ожидалось).")
\ No newline at end of file
+    # 4. Проверка членства одним запросом (404 - пользователя в канале нет)
+    assert not is_member(api_client, BASE_URL, channel_id, user_to_remove), f"Пользователь {user_to_remove} все еще найден среди участников после удаления"
+    print(f"Пользователь {user_to_remove} не найден среди участников канала {channel_id} (как и ожидалось).")
+
+
+def test_add_and_remove_users_batch(api_client, test_channel, channel_pool):
+    """
+    Сценарий: Проверка пакетного добавления и удаления участников канала.
+    Шаги:
+        1. Взять до трех пользователей команды (кроме основного); меньше двух - тест пропускается.
+        2. Добавить их пачками меньше их числа (несколько запросов POST /channels/{channel_id}/members с user_ids).
+        3. Проверить членство всей пачки одним запросом POST /channels/{channel_id}/members/ids.
+        4. Удалить первого пользователя, затем всю пачку: отсутствующий в канале (404) пропускается.
+    Ожидаемый результат: Все пользователи пачки состоят в канале после добавления и отсутствуют после удаления.
+    """
+    channel_id = test_channel['id']
+    me = api_client.get(f"{BASE_URL}/api/v4/users/me", timeout=10).json()["id"]
+    user_ids = team_user_ids(api_client, BASE_URL, TEAM_ID, 3, exclude={me})
+    if len(user_ids) < 2:
+        pytest.skip(f"В команде меньше двух пользователей кроме основного: {len(user_ids)}")
+    channel_pool.touch(channel_id, user_ids)
+
+    print(f"\nТест: Пакетное добавление пользователей {user_ids} в канал {channel_id}")
+    add_members(api_client, BASE_URL, channel_id, user_ids, batch_size=len(user_ids) - 1)
+    found = member_ids_among(api_client, BASE_URL, channel_id, user_ids)
+    assert found == set(user_ids), f"После пакетного добавления в канале найдены не все пользователи: {found}"
+
+    remove_members(api_client, BASE_URL, channel_id, user_ids[:1])
+    remove_members(api_client, BASE_URL, channel_id, user_ids)
+    found = member_ids_among(api_client, BASE_URL, channel_id, user_ids)
+    assert not found, f"После пакетного удаления в канале остались пользователи: {found}"
+    print(f"Пакет пользователей добавлен и удален из канала {channel_id}.")
@@ -0,0 +1,108 @@
+"""
+Кэш токенов авторизации на диске, общий для прогонов.
+
+Логин - один из самых дорогих для сервера запросов (проверка хэша пароля), поэтому токен
+основного пользователя сохраняется в файл и переиспользуется следующими прогонами.
+Перед использованием токен проверяется дешевым GET /users/me: 200 - токен действует,
+401 - сессия истекла или отозвана, и только тогда выполняется новый логин.
+
+Файл кэша задается MATTERMOST_TOKEN_CACHE (по умолчанию ~/.cache/test-the-matter/tokens.json),
+MATTERMOST_TOKEN_CACHE=off отключает кэш. Файл содержит токены, поэтому доступен только владельцу.
+"""
+import json
+import os
+import time
+import requests
+from .api_client import auth_headers, login
+from .parallel import file_lock
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "test-the-matter", "tokens.json")
+DISABLED_VALUES = ("", "0", "off", "false", "no")
+
+
+def cache_path_from_env():
+    """Путь файла кэша из MATTERMOST_TOKEN_CACHE или None, если кэш отключен."""
+    path = os.getenv("MATTERMOST_TOKEN_CACHE", DEFAULT_CACHE_PATH)
+    return None if path.strip().lower() in DISABLED_VALUES else path
+
+
+def is_token_valid(client, base_url, token, timeout=10):
+    """Действует ли токен: GET /users/me - 200 да, 401 нет, остальное - исключение HTTPError."""
+    response = client.get(f"{base_url}/api/v4/users/me", headers=auth_headers(token), timeout=timeout)
+    if response.status_code == 401:
+        return False
+    response.raise_for_status()
+    return True
+
+
+class TokenCache:
+    """Токены по ключу (адрес сервера, логин) в JSON-файле; запись атомарная и под межпроцессной блокировкой."""
+
+    def __init__(self, path):
+        self.path = path
+
+    @staticmethod
+    def _key(base_url, login_id):
+        return f"{base_url.rstrip('/')}|{login_id}"
+
+    def _read(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except ValueError:
+            # Поврежденный кэш не должен ломать прогон: он просто будет перезаписан
+            return {}
+
+    def _write(self, entries):
+        tmp_path = f"{self.path}.tmp"
+        with os.fdopen(os.open(tmp_path, os.O_CREAT | os.O_WRONLY | os.O_TRUNC, 0o600), "w", encoding="utf-8") as f:
+            json.dump(entries, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def get(self, base_url, login_id):
+        """Сохраненный токен или None."""
+        entry = self._read().get(self._key(base_url, login_id))
+        return entry["token"] if entry else None
+
+    def put(self, base_url, login_id, token):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with file_lock(self.path):
+            entries = self._read()
+            entries[self._key(base_url, login_id)] = {"token": token, "saved_at": time.time()}
+            self._write(entries)
+
+    def login(self, client, base_url, login_id, password, login_func=login):
+        """
+        Токен из кэша, если он еще действует, иначе новый логин через login_func с сохранением токена.
+        Возвращает (токен, "cached" | "login").
+        """
+        token = self.get(base_url, login_id)
+        if token and is_token_valid(client, base_url, token):
+            return token, "cached"
+        token = login_func(client, base_url, login_id, password)
+        self.put(base_url, login_id, token)
+        return token, "login"
+
+
+def session_token(client, base_url, login_id, password):
+    """Токен для служебной сессии инструментов: через кэш MATTERMOST_TOKEN_CACHE, если он включен, иначе логин."""
+    path = cache_path_from_env()
+    if path is None:
+        return login(client, base_url, login_id, password)
+    return TokenCache(path).login(client, base_url, login_id, password)[0]
+
+
+def end_session(client, base_url):
+    """
+    Завершает служебную сессию клиента, открытую через session_token, если токен не из кэша.
+    Токен из кэша общий для прогонов pytest, воркеров xdist и других инструментов:
+    его logout вызвал бы у них 401 посреди работы и лишний логин в следующем прогоне.
+    Вызывается из finally: клиент без токена пропускается, а ошибка logout только печатается.
+    """
+    if cache_path_from_env() is None and client.headers.get("Authorization"):
+        try:
+            client.post(f"{base_url}/api/v4/users/logout", timeout=10)
+        except requests.exceptions.RequestException as e:
+            print(f"Предупреждение: Не удалось завершить сессию: {e}")
@@ -0,0 +1,240 @@
+"""
+Тренды задержек по прогонам из хранилища результатов (tests/results_store.py) с отметкой выбросов.
+
+Запуск:
+    python -m tests.trends                                       # маршруты API, p50 по прогонам
+    python -m tests.trends --by test --last 30
+    python -m tests.trends --metric p95 --key "POST /api/v4/posts" "POST /api/v4/channels"
+    python -m tests.trends --base-url https://mm.example.com --workers 1
+    python -m tests.trends --fail-on-outlier                     # выход 1, если последний прогон стал медленнее
+
+Прогоны разных серверов (base_url) и с разным числом воркеров xdist несравнимы, поэтому ряды, медианы
+и выбросы строятся отдельно для каждой пары (base_url, workers); --base-url и --workers оставляют только нужные.
+Значение прогона для маршрута - p50/p95/среднее всех его запросов за прогон (--metric), для теста -
+длительность фазы call (только пройденные тесты). Значение считается выбросом, если оно отличается от медианы
+предыдущих --window прогонов больше чем на --threshold масштабированных MAD (робастный z-score) и при этом
+больше чем на --min-change от медианы и на --min-delta-ms: шум миллисекундных маршрутов не дает ложных тревог.
+Медленный дрейф виден по столбцу изменения последнего прогона относительно медианы окна, по спарклайну
+и по медианам для каждой версии сервера (X-Version-Id) в порядке их появления.
+"""
+import argparse
+import json
+import statistics
+import sys
+from .metrics import percentile
+from .results_store import DEFAULT_STORE_PATH, ResultsStore, store_path_from_env
+
+METRICS = ("p50", "p95", "mean")
+DEFAULT_WINDOW = 20
+DEFAULT_THRESHOLD = 3.5
+DEFAULT_MIN_CHANGE = 0.2
+DEFAULT_MIN_DELTA_MS = 1.0
+# Сколько предыдущих прогонов нужно, чтобы судить о выбросе
+MIN_HISTORY = 5
+# Коэффициент, приводящий MAD к стандартному отклонению нормального распределения
+MAD_SCALE = 1.4826
+SPARK_CHARS = "▁▂▃▄▅▆▇█"
+
+
+def load_runs(path):
+    """
+    Прогоны из хранилища в порядке начала: {"run", "started", "version", "base_url", "workers", "finished",
+    "tests": {тест: {"outcome", "duration"}}, "routes": {маршрут: [длительности]}}.
+    Прогон без записи run_end (прерванный) тоже попадает в список - с завершенными тестами.
+    """
+    runs = {}
+
+    def run(run_id):
+        return runs.setdefault(run_id, {"run": run_id, "started": None, "version": None, "base_url": None, "workers": None,
+                                        "finished": False, "tests": {}, "routes": {}})
+
+    for record in ResultsStore(path).records():
+        entry = run(record.get("run"))
+        if record.get("type") == "run":
+            entry.update(started=record.get("started"), version=record.get("version"), base_url=record.get("base_url"),
+                         workers=record.get("workers"))
+        elif record.get("type") == "run_end":
+            entry["finished"] = True
+        elif record.get("type") == "test":
+            entry["tests"][record["test"]] = {"outcome": record["outcome"], "duration": record["duration"]}
+            for route, data in record.get("requests", {}).items():
+                entry["routes"].setdefault(route, []).extend(data["durations"])
+    return sorted(runs.values(), key=lambda entry: (entry["started"] or "", entry["run"] or ""))
+
+
+def run_values(run, by="route", metric="p50"):
+    """Значение метрики прогона для каждого маршрута или теста, в секундах."""
+    if by == "test":
+        return {test: data["duration"] for test, data in run["tests"].items() if data["outcome"] == "passed"}
+    values = {}
+    for route, durations in run["routes"].items():
+        if metric == "mean":
+            values[route] = sum(durations) / len(durations)
+        else:
+            values[route] = percentile(sorted(durations), int(metric[1:]))
+    return values
+
+
+def find_outliers(values, window=DEFAULT_WINDOW, threshold=DEFAULT_THRESHOLD, min_change=DEFAULT_MIN_CHANGE,
+                  min_delta=DEFAULT_MIN_DELTA_MS / 1000):
+    """
+    Индексы значений-выбросов относительно предыдущих window значений: [(индекс, медиана окна)].
+    Первые MIN_HISTORY значений не проверяются - сравнивать их не с чем.
+    """
+    outliers = []
+    for index in range(MIN_HISTORY, len(values)):
+        history = values[max(0, index - window):index]
+        median = statistics.median(history)
+        mad = statistics.median(abs(value - median) for value in history) * MAD_SCALE
+        delta = values[index] - median
+        if abs(delta) < max(min_change * median, min_delta):
+            continue
+        if mad == 0 or abs(delta) / mad > threshold:
+            outliers.append((index, median))
+    return outliers
+
+
+def sparkline(values):
+    if not values:
+        return ""
+    low, high = min(values), max(values)
+    span = high - low or 1
+    return "".join(SPARK_CHARS[min(int((value - low) / span * len(SPARK_CHARS)), len(SPARK_CHARS) - 1)] for value in values)
+
+
+def run_environment(run):
+    """Условия прогона, при которых его задержки сравнимы с другими: (base_url, workers)."""
+    return run["base_url"] or "-", run["workers"] or 1
+
+
+def build_trends(runs, by="route", metric="p50", keys=None, window=DEFAULT_WINDOW, threshold=DEFAULT_THRESHOLD,
+                 min_change=DEFAULT_MIN_CHANGE, min_delta=DEFAULT_MIN_DELTA_MS / 1000):
+    """
+    Строка тренда для каждого маршрута или теста в каждых условиях прогона (base_url, workers): значения
+    по прогонам, медианы по версиям, изменение последнего прогона относительно медианы предыдущих window
+    и найденные выбросы. Прогоны с другим сервером или числом воркеров в ряд и в базу не попадают.
+    """
+    groups = {}
+    for run in runs:
+        groups.setdefault(run_environment(run), []).append(run)
+    rows = []
+    for (base_url, workers), group in groups.items():
+        per_run = [run_values(run, by, metric) for run in group]
+        all_keys = sorted({key for values in per_run for key in values})
+        for key in all_keys:
+            if keys and key not in keys:
+                continue
+            points = [(run, values[key]) for run, values in zip(group, per_run) if key in values]
+            series = [value for _, value in points]
+            by_version = {}
+            for run, value in points:
+                by_version.setdefault(run["version"] or "-", []).append(value)
+            history = series[-window - 1:-1]
+            baseline = statistics.median(history) if history else None
+            outliers = [{"run": points[index][0]["run"], "version": points[index][0]["version"], "value": series[index],
+                         "baseline": median, "change": series[index] / median - 1 if median else None}
+                        for index, median in find_outliers(series, window, threshold, min_change, min_delta)]
+            rows.append({
+                "key": key, "base_url": base_url, "workers": workers, "runs": len(series), "values": series,
+                "last": series[-1], "baseline": baseline, "change": series[-1] / baseline - 1 if baseline else None,
+                "by_version": {version: statistics.median(values) for version, values in by_version.items()},
+                "outliers": outliers,
+                "last_outlier": bool(outliers) and outliers[-1]["run"] == group[-1]["run"],
+            })
+    return rows
+
+
+def _ms(value):
+    return f"{value * 1000:9.1f}" if value is not None else f"{'-':>9}"
+
+
+def _format_group(rows, runs, by, width, spark_width):
+    """Таблица трендов и медианы по версиям (если версий больше одной) для одних условий прогона."""
+    title = "Маршрут" if by == "route" else "Тест"
+    header = f"{title:<{width}} {'Прогонов':>8} {'Медиана мс':>10} {'Послед. мс':>10} {'Изм.':>7} {'Тренд':<{spark_width}} {'Выбросов':>8}"
+    lines = [header, "-" * len(header)]
+    for row in rows:
+        change = f"{row['change']:+7.0%}" if row["change"] is not None else f"{'-':>7}"
+        mark = " !" if row["last_outlier"] else ""
+        lines.append(f"{row['key'][:width]:<{width}} {row['runs']:>8} {_ms(row['baseline']):>10} {_ms(row['last']):>10} {change} "
+                     f"{sparkline(row['values'][-spark_width:]):<{spark_width}} {len(row['outliers']):>8}{mark}")
+
+    versions = list(dict.fromkeys(run["version"] or "-" for run in runs))
+    if len(versions) > 1:
+        lines += ["", "Медиана по версиям сервера, мс:"]
+        header = f"{title:<{width}} " + " ".join(f"{version[:12]:>12}" for version in versions)
+        lines += [header, "-" * len(header)]
+        for row in rows:
+            cells = " ".join(f"{_ms(row['by_version'].get(version)):>12}" for version in versions)
+            lines.append(f"{row['key'][:width]:<{width}} {cells}")
+    return lines
+
+
+def format_trends(rows, runs, by="route", metric="p50", spark_width=DEFAULT_WINDOW):
+    """Таблицы трендов по условиям прогона (base_url, workers) и список выбросов."""
+    if not rows:
+        return "В хранилище нет данных для трендов"
+    width = min(max(len(row["key"]) for row in rows), 72)
+    lines = [f"Метрика: {metric if by == 'route' else 'длительность теста'}, прогонов в хранилище: {len(runs)}"]
+    environments = list(dict.fromkeys((row["base_url"], row["workers"]) for row in rows))
+    for base_url, workers in environments:
+        group = [run for run in runs if run_environment(run) == (base_url, workers)]
+        lines += ["", f"Сервер {base_url}, воркеров: {workers}, прогонов: {len(group)}"]
+        lines += _format_group([row for row in rows if (row["base_url"], row["workers"]) == (base_url, workers)],
+                               group, by, width, spark_width)
+
+    outliers = [(row, outlier) for row in rows for outlier in row["outliers"]]
+    if outliers:
+        lines += ["", "Выбросы (! в таблице - выброс в последнем прогоне тех же условий):"]
+        for row, outlier in outliers:
+            change = f" ({outlier['change']:+.0%})" if outlier["change"] is not None else ""
+            lines.append(f"  {row['key']} [{row['base_url']}, воркеров: {row['workers']}]: прогон {outlier['run']} "
+                         f"(версия {outlier['version'] or '-'}) {outlier['value'] * 1000:.1f} мс при медиане "
+                         f"{outlier['baseline'] * 1000:.1f} мс{change}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Тренды задержек по прогонам и версиям сервера с отметкой выбросов")
+    parser.add_argument("--store", default=store_path_from_env() or DEFAULT_STORE_PATH, help="файл хранилища результатов (JSONL)")
+    parser.add_argument("--by", choices=("route", "test"), default="route", help="тренды по маршрутам API или по тестам")
+    parser.add_argument("--metric", choices=METRICS, default="p50", help="метрика маршрута за прогон")
+    parser.add_argument("--key", nargs="+", help="только эти маршруты или тесты")
+    parser.add_argument("--last", type=int, help="только последние N прогонов")
+    parser.add_argument("--version", nargs="+", help="только прогоны этих версий сервера")
+    parser.add_argument("--base-url", nargs="+", help="только прогоны против этих серверов (MATTERMOST_BASE_URL прогона)")
+    parser.add_argument("--workers", type=int, nargs="+", help="только прогоны с этим числом воркеров xdist (1 - без xdist)")
+    parser.add_argument("--window", type=int, default=DEFAULT_WINDOW, help="сколько предыдущих прогонов служат базой")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="порог робастного z-score выброса")
+    parser.add_argument("--min-change", type=float, default=DEFAULT_MIN_CHANGE, help="минимальное относительное отклонение выброса")
+    parser.add_argument("--min-delta-ms", type=float, default=DEFAULT_MIN_DELTA_MS, help="минимальное абсолютное отклонение выброса, мс")
+    parser.add_argument("--fail-on-outlier", action="store_true", help="выход с кодом 1, если последний прогон медленнее нормы")
+    parser.add_argument("--output", help="сохранить тренды в JSON-файл")
+    args = parser.parse_args(argv)
+    if args.window < 1 or (args.last is not None and args.last < 1):
+        parser.error("--window и --last должны быть положительными")
+
+    runs = load_runs(args.store)
+    if args.version:
+        runs = [run for run in runs if run["version"] in args.version]
+    if args.base_url:
+        base_urls = {base_url.rstrip("/") for base_url in args.base_url}
+        runs = [run for run in runs if (run["base_url"] or "").rstrip("/") in base_urls]
+    if args.workers:
+        runs = [run for run in runs if run_environment(run)[1] in args.workers]
+    if args.last:
+        runs = runs[-args.last:]
+    rows = build_trends(runs, by=args.by, metric=args.metric, keys=set(args.key or ()), window=args.window,
+                        threshold=args.threshold, min_change=args.min_change, min_delta=args.min_delta_ms / 1000)
+    print(format_trends(rows, runs, by=args.by, metric=args.metric))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"by": args.by, "metric": args.metric, "runs": [run["run"] for run in runs], "trends": rows},
+                      f, ensure_ascii=False, indent=2)
+        print(f"Результаты сохранены в {args.output}")
+    slower = [row["key"] for row in rows if row["last_outlier"] and row["outliers"][-1]["change"] and row["outliers"][-1]["change"] > 0]
+    return 1 if args.fail_on_outlier and slower else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
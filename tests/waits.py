@@ -0,0 +1,67 @@
+import time
+import requests
+
+# Параметры ожидания по умолчанию: общий дедлайн, первый интервал опроса, множитель и предел интервала
+DEFAULT_WAIT_TIMEOUT = 10
+DEFAULT_POLL_INTERVAL = 0.05
+DEFAULT_BACKOFF = 2
+DEFAULT_MAX_INTERVAL = 1
+
+
+class WaitTimeoutError(AssertionError):
+    """Ожидаемое состояние не наступило до дедлайна."""
+
+
+def wait_until(condition, timeout=DEFAULT_WAIT_TIMEOUT, interval=DEFAULT_POLL_INTERVAL, backoff=DEFAULT_BACKOFF,
+               max_interval=DEFAULT_MAX_INTERVAL, description="ожидаемое состояние"):
+    """
+    Опрашивает condition() с экспоненциально растущим интервалом, пока она не вернет истинное значение.
+    Возвращает это значение сразу, как только состояние наступило.
+    Сетевые ошибки requests при опросе не прерывают ожидание, но попадают в сообщение об ошибке.
+    Если до дедлайна состояние не наступило - WaitTimeoutError с описанием и последним результатом.
+    """
+    deadline = time.monotonic() + timeout
+    attempts = 0
+    last_result, last_error = None, None
+    while True:
+        attempts += 1
+        try:
+            last_result = condition()
+            last_error = None
+            if last_result:
+                return last_result
+        except requests.exceptions.RequestException as e:
+            last_error = e
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            details = f"ошибка: {last_error}" if last_error else f"последний результат: {last_result!r}"
+            raise WaitTimeoutError(f"Не дождались: {description} за {timeout} с ({attempts} попыток, {details})")
+        time.sleep(min(interval, remaining))
+        interval = min(interval * backoff, max_interval)
+
+
+def wait_for_membership(api_client, base_url, channel_id, user_id, present=True, timeout=DEFAULT_WAIT_TIMEOUT):
+    """Ждет, пока пользователь появится в канале (present=True) или исчезнет из него (present=False)."""
+    member_url = f"{base_url}/api/v4/channels/{channel_id}/members/{user_id}"
+    expected_status = 200 if present else 404
+    state = "появится в" if present else "исчезнет из"
+    wait_until(lambda: api_client.get(member_url, timeout=10).status_code == expected_status,
+               timeout=timeout, description=f"пользователь {user_id} {state} канала {channel_id}")
+
+
+def wait_for_post(api_client, base_url, channel_id, post_id, since=None, timeout=DEFAULT_WAIT_TIMEOUT):
+    """
+    Ждет, пока пост появится в выдаче GET /channels/{channel_id}/posts.
+    since (мс) ограничивает выдачу постами не старше этого момента.
+    Возвращает ответ, в котором пост найден.
+    """
+    posts_url = f"{base_url}/api/v4/channels/{channel_id}/posts"
+    params = {"since": since} if since is not None else None
+
+    def post_visible():
+        response = api_client.get(posts_url, params=params, timeout=10)
+        if response.status_code == 200 and post_id in response.json().get("posts", {}):
+            return response
+        return None
+
+    return wait_until(post_visible, timeout=timeout, description=f"сообщение {post_id} в канале {channel_id}")